@@ -0,0 +1,71 @@
+"""
+Adaptive retrieval depth from the query's distance distribution
+A fixed top_k_retrieve makes every query pay for the same number of rerank pairs,
+even when the distances show a sharp cliff after a handful of close hits. In adaptive
+mode RagQueryEngine first fetches only (id, distance) for the ceiling depth, picks the
+rerank pool size here, and fetches payloads just for that many rows.
+
+choose_depth() looks at the sorted distances inside [floor, ceiling]:
+    "gap"   - a jump between neighbours is over gap_ratio x the mean (non-zero) jump among
+              the rows before it: cut right before it (rows past a cliff are off-topic)
+    "knee"  - otherwise the knee of the rank/distance curve (Kneedle: the point
+              farthest above the chord between the first and last distance), where
+              distances stop rising quickly and the undistinguished bulk begins
+    "flat"  - no clear knee (nearly linear curve, or all distances tied): keep the ceiling
+    "all"   - fewer rows than the floor
+"""
+import os
+from typing import Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_ADAPTIVE_DEPTH = os.getenv("RAG_ADAPTIVE_DEPTH", "false").lower() == "true"
+DEFAULT_DEPTH_FLOOR = int(os.getenv("RAG_ADAPTIVE_DEPTH_MIN", "10"))
+# 0 = the engine's top_k_retrieve
+DEFAULT_DEPTH_CEILING = int(os.getenv("RAG_ADAPTIVE_DEPTH_MAX", "0"))
+DEFAULT_GAP_RATIO = float(os.getenv("RAG_ADAPTIVE_GAP_RATIO", "4.0"))
+# Normalized height of the knee above the chord below which the curve counts as flat
+MIN_KNEE_STRENGTH = 0.1
+
+
+def choose_depth(
+    distances: Sequence[float],
+    floor: int = DEFAULT_DEPTH_FLOOR,
+    ceiling: int = 50,
+    gap_ratio: float = DEFAULT_GAP_RATIO,
+) -> Tuple[int, str]:
+    """
+    Number of nearest rows to keep, given their distances in ascending order.
+    Returns (depth, method), with floor <= depth <= ceiling whenever enough rows exist.
+    """
+    floor = max(1, floor)
+    d = np.asarray(distances, dtype=np.float64)[:ceiling]
+    n = d.shape[0]
+    if n <= floor:
+        return n, "all"
+
+    # Cutting at depth k drops the jump gaps[k - 1] (between rows k - 1 and k); it is a
+    # cliff when it dwarfs the mean jump among the k rows kept (not just the flat tail)
+    gaps = np.diff(d)
+    if gaps.max() <= 0:
+        return n, "flat"  # All tied: nothing to tell the rows apart
+    depths = np.arange(floor, n)
+    kept_gaps = depths - 1
+    # Mean over the non-zero jumps: exact ties (duplicate chunks) would shrink it and make
+    # any ordinary jump after them look like a cliff. Kept rows all tied: no scale, no cut
+    kept_sum = np.where(kept_gaps > 0, np.cumsum(gaps)[kept_gaps - 1], 0.0)
+    kept_jumps = np.where(kept_gaps > 0, np.cumsum(gaps > 0)[kept_gaps - 1], 0)
+    ratios = np.divide(gaps[depths - 1], kept_sum, out=np.zeros(len(depths)), where=kept_sum > 0) * kept_jumps
+    i = int(np.argmax(ratios))
+    if ratios[i] > gap_ratio:
+        return int(depths[i]), "gap"
+
+    span = d[-1] - d[0]
+    if span <= 0:
+        return n, "flat"
+    x = np.arange(n) / (n - 1)
+    y = (d - d[0]) / span
+    knee = int(np.argmax(y - x))
+    if y[knee] - x[knee] < MIN_KNEE_STRENGTH:
+        return n, "flat"
+    return min(max(knee + 1, floor), n), "knee"
@@ -0,0 +1,86 @@
+"""
+Length-aware dynamic batching for cross-encoder scoring
+predict(pairs, batch_size=32) in candidate order pads every batch to its longest
+member; with chunks between ~200 and 2000 chars most of that compute is padding.
+
+predict_pairs sorts pairs by tokenized length, packs batches under a token budget
+(batch count x longest member, i.e. what the padded batch actually costs) and
+restores the original order of the scores.
+"""
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+# Padded tokens per batch (count x longest pair)
+DEFAULT_TOKEN_BUDGET = int(os.getenv("RAG_RERANK_TOKEN_BUDGET", "8192"))
+DEFAULT_MAX_BATCH_SIZE = 64
+
+
+def _max_length(model) -> int:
+    max_length = getattr(model, "max_length", None)
+    if not max_length:
+        tokenizer = getattr(model, "tokenizer", None)
+        max_length = getattr(tokenizer, "model_max_length", None)
+    # Tokenizers without a limit report a huge sentinel value
+    return max_length if max_length and max_length < 100_000 else 512
+
+
+def pair_lengths(model, pairs: Sequence[Sequence[str]]) -> np.ndarray:
+    """Tokenized length of each [query, text] pair (capped at the model's max length)"""
+    max_length = _max_length(model)
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        # No tokenizer (e.g. a stub): ~4 chars per token is close enough for ordering
+        return np.minimum([(len(q) + len(t)) // 4 + 3 for q, t in pairs], max_length)
+    encoded = tokenizer(
+        [q for q, _ in pairs],
+        [t for _, t in pairs],
+        truncation=True,
+        max_length=max_length,
+    )
+    return np.array([len(ids) for ids in encoded["input_ids"]])
+
+
+def make_batches(
+    lengths: np.ndarray,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+) -> List[np.ndarray]:
+    """Group indices (shortest first) so each batch's padded size stays under token_budget"""
+    order = np.argsort(lengths, kind="stable")
+    batches, current = [], []
+    for idx in order:
+        # Sorted ascending: adding idx makes it the longest member of the batch
+        padded = (len(current) + 1) * int(lengths[idx])
+        if current and (padded > token_budget or len(current) >= max_batch_size):
+            batches.append(np.array(current))
+            current = []
+        current.append(idx)
+    if current:
+        batches.append(np.array(current))
+    return batches
+
+
+def predict_pairs(
+    model,
+    pairs: Sequence[Sequence[str]],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    show_progress: bool = False,
+) -> np.ndarray:
+    """Scores for pairs in input order, computed in length-sorted, token-budgeted batches"""
+    if len(pairs) == 0:
+        return np.zeros(0, dtype=np.float32)
+    if hasattr(model, "predict_pairs"):
+        # Scorers that batch (and shard) themselves, e.g. rag.rerank_pool.RerankProcessPool
+        return model.predict_pairs(pairs, token_budget, max_batch_size, show_progress)
+    scores = np.zeros(len(pairs), dtype=np.float32)
+    for batch in make_batches(pair_lengths(model, pairs), token_budget, max_batch_size):
+        batch_scores = model.predict(
+            [pairs[i] for i in batch],
+            show_progress_bar=show_progress,
+            batch_size=len(batch),
+        )
+        scores[batch] = np.asarray(batch_scores, dtype=np.float32).reshape(len(batch))
+    return scores
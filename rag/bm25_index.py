@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+In-memory BM25 index over chunk texts with light Hebrew normalization
+Hebrew glues prefixes (ו, ה, ב, ל, מ, ש, כ) onto words, so "במעגל" never matches
+"מעגל" with plain whitespace splitting. analyze() normalizes each word (niqqud and
+geresh/gershayim removed, final letters unified) and emits the word plus its
+prefix-stripped forms. Both documents and queries get the same variants, so
+"במעגל" / "מהמעגל" / "מעגל" share the term "מעגל" (a word whose first letter only
+looks like a prefix still keeps its full form, which scores highest).
+
+Postings are CSR numpy arrays (offsets / doc ids / term frequencies per term id);
+a query is a handful of vectorized adds over the postings of its terms.
+
+Persisted layout (np.load with mmap, so loading is near-instant), one directory per
+generation with CURRENT naming the live one, as in rag/local_index.py:
+    <dir>/CURRENT
+    <dir>/gen-<ns>/offsets.npy doc_ids.npy tfs.npy doc_lengths.npy  (idf is recomputed from offsets)
+    <dir>/gen-<ns>/vocab.json (terms in id order), docs.json (id, text, metadata, source, order), meta.json
+
+Usage:
+    python -m rag.bm25_index --from files                      # master_rag/chunks -> data/bm25_index
+    python -m rag.bm25_index --from db --query "מה זה מעגל התודעה?"
+"""
+import os
+import re
+import json
+import glob
+import time
+import shutil
+import argparse
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_BM25_INDEX_DIR = os.getenv(
+    "RAG_BM25_INDEX_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "bm25_index")
+)
+DEFAULT_CHUNKS_DIR = os.path.join(os.path.dirname(__file__), "..", "master_rag", "chunks")
+
+# BM25 parameters (Robertson defaults)
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+
+# === HEBREW NORMALIZATION ===
+
+_NIQQUD_RE = re.compile("[֑-ׇ]")
+# Punctuation inside that block, split on before the strip: maqaf joins words ("בית־ספר"),
+# paseq / sof pasuq / nun hafukha separate them
+_HEBREW_PUNCTUATION = str.maketrans({"־": " ", "׀": " ", "׃": " ", "׆": " "})
+# Geresh / gershayim inside abbreviations (עו"ד, צ'יק) - dropped, not split on
+_GERESH_RE = re.compile("(?<=[א-ת])[\"'׳״](?=[א-ת])")
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+_WORD_RE = re.compile(r"\w+")
+
+HEBREW_PREFIX_LETTERS = set("והבלמשכ")
+# At most this many prefix letters are stripped ("וכשה..."), leaving at least MIN_STEM_LENGTH.
+# Three-letter stems are mostly junk ("השאלה" -> "אלה", "שלום" -> "לומ") shared by unrelated words
+MAX_PREFIX_LENGTH = 3
+MIN_STEM_LENGTH = 4
+
+
+def normalize_hebrew(text: str) -> str:
+    """Lowercase, drop niqqud and geresh/gershayim, split on maqaf, map final letters to their regular form"""
+    text = _NIQQUD_RE.sub("", text.lower().translate(_HEBREW_PUNCTUATION))
+    text = _GERESH_RE.sub("", text)
+    return text.translate(_FINAL_LETTERS)
+
+
+def token_variants(token: str) -> List[str]:
+    """The token plus each prefix-stripped form: "ובמעגל" -> ["ובמעגל", "במעגל", "מעגל"]"""
+    variants = [token]
+    for i in range(1, min(MAX_PREFIX_LENGTH, len(token) - MIN_STEM_LENGTH) + 1):
+        if token[i - 1] not in HEBREW_PREFIX_LETTERS:
+            break
+        variants.append(token[i:])
+    return variants
+
+
+def analyze(text: str) -> List[str]:
+    """Index / query terms of a text (every word with its prefix-stripped variants)"""
+    terms = []
+    for token in _WORD_RE.findall(normalize_hebrew(text)):
+        terms.extend(token_variants(token))
+    return terms
+
+
+# === INDEX ===
+
+class BM25Index:
+    """Okapi BM25 over a fixed document list; search() returns chunk dicts with "bm25_score" """
+
+    def __init__(
+        self,
+        docs: List[Dict],
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+    ):
+        self.docs = docs
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        n = len(docs)
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_lengths.mean()) if n else 1.0
+        # Per-document length normalization, precomputed once: k1 * (1 - b + b * dl / avgdl)
+        self._norm = (k1 * (1 - b + b * doc_lengths / max(avgdl, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def from_documents(cls, docs: List[Dict], k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> "BM25Index":
+        """Build from dicts with at least "id" and "text" (other keys are returned by search)"""
+        vocab: Dict[str, int] = {}
+        term_ids, posting_docs, posting_tfs = [], [], []
+        doc_lengths = np.zeros(len(docs), dtype=np.float32)
+        for doc_idx, doc in enumerate(docs):
+            counts = Counter(analyze(doc.get("text", "")))
+            doc_lengths[doc_idx] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                posting_docs.append(doc_idx)
+                posting_tfs.append(tf)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocab)))
+        return cls(
+            docs,
+            vocab,
+            offsets,
+            np.array(posting_docs, dtype=np.int32)[order],
+            np.array(posting_tfs, dtype=np.float32)[order],
+            doc_lengths,
+            k1,
+            b,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query (each distinct term counted once)"""
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(analyze(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = 50) -> List[Dict]:
+        """Top-k documents (copies) with "bm25_score", best first; documents scoring 0 are skipped"""
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{**self.docs[i], "bm25_score": float(scores[i])} for i in top]
+
+    # === PERSISTENCE ===
+
+    def save(self, directory: str):
+        """
+        Write the index as a new generation and point CURRENT at it. A process loading
+        while the index is rebuilt sees the old or the new generation, never a half-written
+        or missing one; the previous generation is kept for loads that resolved CURRENT just before.
+        """
+        generation = f"gen-{time.time_ns()}"
+        path = os.path.join(directory, generation)
+        os.makedirs(path)
+        for name in ("offsets", "doc_ids", "tfs", "doc_lengths"):
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": len(self.docs), "terms": len(self.vocab), "k1": self.k1, "b": self.b}, f)
+
+        previous = _read_current(directory)
+        current_tmp = os.path.join(directory, "CURRENT.tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(current_tmp, os.path.join(directory, "CURRENT"))
+        for name in os.listdir(directory):
+            if name.startswith("gen-") and name not in (generation, previous):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """Open the generation CURRENT points at (postings are memory-mapped)"""
+        generation = _read_current(directory)
+        if generation is None:
+            raise FileNotFoundError(f"No BM25 index in {directory} (build it with python -m rag.bm25_index)")
+        path = os.path.join(directory, generation)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            vocab = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(path, "docs.json"), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("offsets", "doc_ids", "tfs", "doc_lengths")
+        }
+        return cls(docs, vocab, k1=meta["k1"], b=meta["b"], **arrays)
+
+
+def _read_current(directory: str) -> Optional[str]:
+    """Generation name CURRENT points at (None before the first save)"""
+    try:
+        with open(os.path.join(directory, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[List[Dict]], k: int = 60, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Fuse ranked chunk lists (e.g. BM25 + vector candidates) by id:
+    rrf_score = sum of 1 / (k + rank) over the lists a chunk appears in.
+    Keys from earlier lists win when a chunk appears in several.
+    """
+    fused: Dict[str, Dict] = {}
+    for ranked in ranked_lists:
+        for rank, chunk in enumerate(ranked, start=1):
+            entry = fused.get(chunk["id"])
+            if entry is None:
+                entry = fused[chunk["id"]] = {**chunk, "rrf_score": 0.0}
+            else:
+                for key, value in chunk.items():
+                    entry.setdefault(key, value)
+            entry["rrf_score"] += 1.0 / (k + rank)
+    result = sorted(fused.values(), key=lambda c: c["rrf_score"], reverse=True)
+    return result[:limit] if limit is not None else result
+
+
+# === DOCUMENT SOURCES ===
+
+def load_documents_from_db(pool) -> List[Dict]:
+    def fetch(conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, text, metadata, source, "order" FROM knowledge_chunks')
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    docs = []
+    for id, text, metadata, source, order in pool.run(fetch):
+        metadata = metadata if isinstance(metadata, dict) else json.loads(metadata) if metadata else {}
+        docs.append({
+            "id": id,
+            "text": text,
+            "metadata": metadata,
+            "source": source or "unknown",
+            "chunk_index": order or 0,
+            "order": order or 0,
+        })
+    return docs
+
+
+def _parse_front_matter(block: str) -> Dict:
+    """Flat `key: value` front matter as written by scripts/build_master_rag.py"""
+    meta = {}
+    key = None
+    for line in block.splitlines():
+        match = re.match(r"^(\w+):\s*(.*)$", line)
+        if match:
+            key, value = match.groups()
+            meta[key] = value
+        elif key:
+            meta[key] += "\n" + line  # wrapped value
+    for key, value in meta.items():
+        value = value.strip()
+        if value.startswith("["):
+            try:
+                meta[key] = json.loads(value)
+                continue
+            except json.JSONDecodeError:
+                pass
+        meta[key] = value.strip('"')
+    return meta
+
+
+def load_documents_from_files(chunks_dir: str = DEFAULT_CHUNKS_DIR) -> List[Dict]:
+    docs = []
+    for order, path in enumerate(sorted(glob.glob(os.path.join(chunks_dir, "*.md")))):
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        meta: Dict = {}
+        parts = content.split("---", 2) if content.startswith("---") else []
+        # Unclosed front-matter fence: index the whole file as body
+        if len(parts) == 3:
+            _, block, content = parts
+            meta = _parse_front_matter(block)
+        docs.append({
+            "id": meta.pop("id", None) or os.path.splitext(os.path.basename(path))[0],
+            "text": content.strip(),
+            "metadata": meta,
+            "source": meta.get("source") or os.path.basename(path),
+            "chunk_index": order,
+            "order": order,
+        })
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Hebrew BM25 index")
+    parser.add_argument("--from", dest="source", choices=["files", "db"], default="files",
+                        help="Chunk source: master_rag/chunks or knowledge_chunks")
+    parser.add_argument("--chunks-dir", default=DEFAULT_CHUNKS_DIR)
+    parser.add_argument("--dir", default=DEFAULT_BM25_INDEX_DIR, help="Output directory")
+    parser.add_argument("--query", help="Run a test query against the saved index")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.source == "db":
+        from rag.db import DATABASE_URL, get_pool
+        docs = load_documents_from_db(get_pool(DATABASE_URL))
+    else:
+        docs = load_documents_from_files(args.chunks_dir)
+    print(f"📥 {len(docs)} chunks from {args.source}")
+
+    start = time.time()
+    index = BM25Index.from_documents(docs)
+    print(f"✅ Indexed {len(index.vocab)} terms in {time.time() - start:.2f}s")
+    index.save(args.dir)
+    print(f"💾 Saved to {args.dir}")
+
+    if args.query:
+        start = time.time()
+        loaded = BM25Index.load(args.dir)
+        load_time = time.time() - start
+        start = time.time()
+        results = loaded.search(args.query, args.k)
+        print(f"🔍 load {load_time * 1000:.1f} ms, search {(time.time() - start) * 1000:.1f} ms")
+        for i, doc in enumerate(results, start=1):
+            print(f"[{i}] {doc['bm25_score']:.3f} {doc['id']} | {doc['text'][:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Process-wide PostgreSQL connection pool
+Thread-safe checkout with validation, transparent reconnect of dropped connections,
+per-query statement_timeout and server-side prepared statements per connection.
+Shared by RagQueryEngine and the ingest scripts.
+"""
+import os
+import re
+import time
+import hashlib
+import weakref
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2 import extensions as pg_extensions
+
+# Remove schema parameter from DATABASE_URL as psycopg2 doesn't support it
+_raw_database_url = os.getenv("DATABASE_URL", "postgresql://tzahimoyal@localhost:5432/talbashanai")
+# Remove ?schema=... from URL if present
+if "?schema=" in _raw_database_url:
+    DATABASE_URL = _raw_database_url.split("?schema=")[0]
+else:
+    DATABASE_URL = _raw_database_url
+
+DEFAULT_POOL_MIN_SIZE = int(os.getenv("RAG_DB_POOL_MIN", "1"))
+DEFAULT_POOL_MAX_SIZE = int(os.getenv("RAG_DB_POOL_MAX", "10"))
+# How long to wait for a free connection before giving up (seconds)
+DEFAULT_CHECKOUT_TIMEOUT = 30.0
+# Connections idle longer than this are pinged with SELECT 1 before reuse (seconds)
+DEFAULT_VALIDATE_AFTER_IDLE = 30.0
+
+# Errors that mean the connection itself is gone (server restart, network drop, ...)
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def is_connection_lost(error: BaseException) -> bool:
+    """True for dropped connections; statement timeouts and deadlocks are OperationalErrors too"""
+    if isinstance(error, (pg_extensions.QueryCanceledError, pg_extensions.TransactionRollbackError)):
+        return False
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no connection became free within the checkout timeout"""
+
+
+class PoolClosedError(RuntimeError):
+    """Raised on checkout from a pool that was closed"""
+
+
+_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+_PLANNING_TIME = re.compile(r"Planning Time: ([\d.]+) ms")
+
+
+@lru_cache(maxsize=256)
+def prepared_form(sql: str) -> Tuple[str, str, Tuple[str, ...]]:
+    """
+    (statement name, PREPARE-able text, parameter names) for a query with %(name)s
+    placeholders. Each distinct name becomes one $n; the name is a hash of the text,
+    so engines issuing the same SQL share the prepared statement on a connection.
+    """
+    names: List[str] = []
+
+    def positional(match) -> str:
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    text = _NAMED_PARAM.sub(positional, sql)
+    name = "rag_" + hashlib.blake2b(sql.encode("utf-8"), digest_size=8).hexdigest()
+    return name, text, tuple(names)
+
+
+def planning_ms(explain_rows) -> float:
+    """Planning time from EXPLAIN (SUMMARY) output rows"""
+    for (line,) in explain_rows:
+        match = _PLANNING_TIME.search(line)
+        if match:
+            return float(match.group(1))
+    return 0.0
+
+
+class ConnectionPool:
+    """
+    Blocking, thread-safe pool of psycopg2 connections.
+    min_size connections are opened up front, more on demand up to max_size; released
+    connections stay open in the idle list for reuse (prepared statements included).
+
+    Use `with pool.connection(statement_timeout_ms=...) as conn:` - the transaction is
+    committed on success and rolled back on error; broken connections are discarded
+    and replaced on the next checkout.
+    """
+
+    def __init__(
+        self,
+        database_url: str = DATABASE_URL,
+        min_size: int = DEFAULT_POOL_MIN_SIZE,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT,
+        validate_after_idle: float = DEFAULT_VALIDATE_AFTER_IDLE,
+    ):
+        self.database_url = database_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.validate_after_idle = validate_after_idle
+
+        # Checkout blocks on the semaphore once max_size connections are checked out
+        self._slots = threading.BoundedSemaphore(max_size)
+        # Released connections, most recently used last (reused first, so the rest can
+        # go idle long enough to be validated); _open counts idle + checked out
+        self._idle: List = []
+        self._open = 0
+        self._closed = False
+        # Per-connection bookkeeping: last release time, current statement_timeout.
+        # Weak keys, not id(conn): a new connection at a closed one's address must not
+        # inherit its entries (e.g. skip its SET statement_timeout)
+        self._last_used: "weakref.WeakKeyDictionary[object, float]" = weakref.WeakKeyDictionary()
+        self._timeouts: "weakref.WeakKeyDictionary[object, Optional[int]]" = weakref.WeakKeyDictionary()
+        # Statements PREPAREd on each connection (they live as long as the connection, which
+        # stays open in the idle list between checkouts). Weak keys for the same reason:
+        # a reconnected slot starts with no prepared statements.
+        self._prepared: "weakref.WeakKeyDictionary[object, Set[str]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        self.stats = {"checkouts": 0, "reconnects": 0, "waits": 0, "prepares": 0, "prepared_executes": 0}
+        for _ in range(min_size):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(self.database_url)
+        with self._lock:
+            self._open += 1
+            # Just opened: no need for a SELECT 1 before its first use
+            self._last_used[conn] = time.monotonic()
+        return conn
+
+    def _is_usable(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == pg_extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        idle = time.monotonic() - self._last_used.get(conn, 0.0)
+        if idle < self.validate_after_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._last_used.pop(conn, None)
+            self._timeouts.pop(conn, None)
+            self._prepared.pop(conn, None)
+            self._open -= 1
+        try:
+            conn.close()
+        except CONNECTION_ERRORS:
+            pass
+
+    def _getconn(self):
+        """An idle connection, or a new one (a free slot means max_size is not reached)"""
+        with self._lock:
+            if self._closed:
+                raise PoolClosedError("Connection pool is closed")
+            conn = self._idle.pop() if self._idle else None
+        return conn if conn is not None else self._connect()
+
+    def _putconn(self, conn):
+        with self._lock:
+            if not self._closed:
+                self._last_used[conn] = time.monotonic()
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def _checkout(self):
+        """Get a validated connection, reconnecting if the pooled one is dead"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["waits"] += 1
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                raise PoolExhaustedError(
+                    f"No database connection available after {self.checkout_timeout}s "
+                    f"(max_size={self.max_size})"
+                )
+        try:
+            # One retry: a stale connection is replaced by a fresh one from the pool
+            for _ in range(2):
+                conn = self._getconn()
+                if self._is_usable(conn):
+                    break
+                self._discard(conn)
+                with self._lock:
+                    self.stats["reconnects"] += 1
+            else:
+                raise psycopg2.OperationalError("Could not obtain a working database connection")
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.stats["checkouts"] += 1
+        return conn
+
+    def _set_statement_timeout(self, conn, statement_timeout_ms: Optional[int]):
+        # Only round-trip when the value actually changes for this connection
+        if self._timeouts.get(conn) == statement_timeout_ms:
+            return
+        with conn.cursor() as cursor:
+            if statement_timeout_ms is None:
+                cursor.execute("SET statement_timeout TO DEFAULT")
+            else:
+                cursor.execute("SET statement_timeout = %s", (int(statement_timeout_ms),))
+        conn.commit()
+        with self._lock:
+            self._timeouts[conn] = statement_timeout_ms
+
+    @contextmanager
+    def connection(self, statement_timeout_ms: Optional[int] = None):
+        """
+        Check out a connection for the duration of the block.
+
+        Args:
+            statement_timeout_ms: statement_timeout applied to queries in this block
+                                  (None = server default)
+        """
+        conn = self._checkout()
+        broken = False
+        try:
+            self._set_statement_timeout(conn, statement_timeout_ms)
+            yield conn
+            conn.commit()
+        except Exception as e:
+            broken = is_connection_lost(e) or bool(conn.closed)
+            if not broken:
+                try:
+                    conn.rollback()
+                except CONNECTION_ERRORS:
+                    broken = True
+            raise
+        finally:
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                self._putconn(conn)
+            self._slots.release()
+
+    def execute(
+        self,
+        cursor,
+        sql: str,
+        params: Dict,
+        prefix: str = "",
+        prepare: bool = True,
+        plan_times: Optional[List[float]] = None,
+    ):
+        """
+        cursor.execute(prefix + sql, params) on a pooled connection's cursor.
+
+        Args:
+            prepare: run it as EXECUTE of a server-side prepared statement, PREPAREd on
+                     first use per connection and reused until the connection is dropped
+                     (the plan is cached by the server instead of re-planned every call)
+            prefix: statements sent in the same round trip (e.g. SET LOCAL ...)
+            plan_times: append the statement's planning time in ms (costs an extra
+                        EXPLAIN round trip, so only for profiling)
+        """
+        statement = sql
+        if prefix:
+            prefix += " "
+        if prepare:
+            name, text, names = prepared_form(sql)
+            conn = cursor.connection
+            with self._lock:
+                prepared = self._prepared.setdefault(conn, set())
+            if name not in prepared:
+                cursor.execute(f"PREPARE {name} AS {text}")
+                prepared.add(name)
+                with self._lock:
+                    self.stats["prepares"] += 1
+            statement = f"EXECUTE {name}" + (f"({', '.join(f'%({n})s' for n in names)})" if names else "")
+            with self._lock:
+                self.stats["prepared_executes"] += 1
+        if plan_times is not None:
+            cursor.execute(prefix + "EXPLAIN (SUMMARY ON, COSTS OFF) " + statement, params)
+            plan_times.append(planning_ms(cursor.fetchall()))
+        cursor.execute(prefix + statement, params)
+
+    def run(self, func, statement_timeout_ms: Optional[int] = None, retries: int = 1):
+        """
+        Call func(conn) on a pooled connection and return its result.
+        If the connection drops mid-call, retry on a fresh one (only for idempotent work).
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.connection(statement_timeout_ms=statement_timeout_ms) as conn:
+                    return func(conn)
+            except CONNECTION_ERRORS as e:
+                if attempt >= retries or not is_connection_lost(e):
+                    raise
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                print("⚠️  Database connection lost, retrying on a fresh connection...")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "prepared_statements": sum(len(names) for names in self._prepared.values()),
+            }
+
+    def close(self):
+        """
+        Close every connection in the pool (checked-out ones as they are returned).
+        Later checkouts raise PoolClosedError; get_pool opens a new pool after close_all_pools.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            try:
+                conn.close()
+            except CONNECTION_ERRORS:
+                pass
+        self._last_used.clear()
+        self._timeouts.clear()
+        self._prepared.clear()
+
+
+# === PROCESS-WIDE POOLS ===
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    database_url: str = DATABASE_URL,
+    min_size: int = DEFAULT_POOL_MIN_SIZE,
+    max_size: int = DEFAULT_POOL_MAX_SIZE,
+) -> ConnectionPool:
+    """Get the process-wide pool for a database URL (created on first use)"""
+    with _pools_lock:
+        pool = _pools.get(database_url)
+        if pool is None:
+            print(f"📥 Opening PostgreSQL connection pool (min={min_size}, max={max_size})...")
+            pool = ConnectionPool(database_url, min_size=min_size, max_size=max_size)
+            _pools[database_url] = pool
+            print("✅ Connection pool ready")
+        return pool
+
+
+def get_pool_stats() -> Dict[str, Dict]:
+    """Stats of every process-wide pool, keyed by host/database (no credentials)"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {database_url.rsplit("@", 1)[-1]: pool.get_stats() for database_url, pool in pools}
+
+
+def close_all_pools():
+    """Close every process-wide pool (e.g. on worker shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,196 @@
+"""
+Two-tier cache for query embeddings
+Repeated questions (retries, FAQ, canned test questions) skip the embedding model.
+
+Tier 1: in-memory LRU keyed by (model name, normalized query); the normalized query is also what gets encoded
+Tier 2 (optional): on-disk store per model - a memory-mapped float16 matrix plus an
+append-only JSONL index (key -> row), so the cache survives restarts.
+The disk tier assumes a single writer process (e.g. the RAG worker).
+"""
+import os
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MEMORY_ENTRIES = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+# Directory for the on-disk tier; unset = memory only
+DEFAULT_DISK_DIR = os.getenv("RAG_QUERY_CACHE_DIR") or None
+DEFAULT_DISK_CAPACITY = int(os.getenv("RAG_QUERY_CACHE_DISK_CAPACITY", "100000"))
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query (Unicode NFC, collapsed whitespace).
+    Case is kept: the embedding models are case-sensitive, and the cache key must be
+    exactly the text that gets encoded."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class _DiskEmbeddingStore:
+    """Memory-mapped float16 vectors for one model + a JSONL index of key -> row"""
+
+    def __init__(self, directory: str, capacity: int):
+        self.directory = directory
+        self.capacity = capacity
+        self.vectors_path = os.path.join(directory, "vectors.f16")
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.rows: Dict[str, int] = {}
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._full_warned = False
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._open(meta["dim"], meta["capacity"], mode="r+")
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # Torn last line after a crash
+                        self.rows[entry["key"]] = entry["row"]
+
+    def _open(self, dim: int, capacity: int, mode: str):
+        self.dim = dim
+        self.capacity = capacity
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode=mode, shape=(capacity, dim))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None or self._vectors is None:
+            return None
+        return np.asarray(self._vectors[row], dtype=np.float32)
+
+    def put(self, key: str, vector: np.ndarray):
+        if key in self.rows:
+            return
+        if self._vectors is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._open(int(vector.shape[0]), self.capacity, mode="w+")
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "capacity": self.capacity}, f)
+        if vector.shape[0] != self.dim:
+            return
+        row = len(self.rows)
+        if row >= self.capacity:
+            if not self._full_warned:
+                print(f"⚠️  Query embedding disk cache is full ({self.capacity} entries): {self.directory}")
+                self._full_warned = True
+            return
+        self._vectors[row] = vector.astype(np.float16)
+        self._vectors.flush()
+        # Index line is written after the vector, so a crash never indexes a missing row
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "row": row}) + "\n")
+        self.rows[key] = row
+
+
+class QueryEmbeddingCache:
+    """Thread-safe two-tier (memory LRU + optional mmap disk) query embedding cache"""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MEMORY_ENTRIES,
+        disk_dir: Optional[str] = DEFAULT_DISK_DIR,
+        disk_capacity: int = DEFAULT_DISK_CAPACITY,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_capacity = disk_capacity
+        self._memory: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._disk: Dict[str, _DiskEmbeddingStore] = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _disk_store(self, model_name: str) -> Optional[_DiskEmbeddingStore]:
+        if not self.disk_dir:
+            return None
+        store = self._disk.get(model_name)
+        if store is None:
+            safe_name = model_name.replace("/", "__")
+            store = _DiskEmbeddingStore(os.path.join(self.disk_dir, safe_name), self.disk_capacity)
+            self._disk[model_name] = store
+        return store
+
+    @staticmethod
+    def _disk_key(query: str) -> str:
+        # "v2:" - v1 keys were lowercased and may hold vectors of differently-cased text
+        return hashlib.sha256(("v2:" + query).encode("utf-8")).hexdigest()
+
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        key = (model_name, normalize_query(query))
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector
+            store = self._disk_store(model_name)
+            vector = store.get(self._disk_key(key[1])) if store else None
+            if vector is not None:
+                vector.flags.writeable = False
+                self._remember(key, vector)
+                self.stats["disk_hits"] += 1
+                return vector
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, model_name: str, query: str, vector: np.ndarray) -> np.ndarray:
+        """Cache an embedding; returns the cached (read-only) copy"""
+        key = (model_name, normalize_query(query))
+        # Own copy, read-only: cached arrays are shared between callers
+        vector = np.array(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        with self._lock:
+            self._remember(key, vector)
+            store = self._disk_store(model_name)
+            if store:
+                store.put(self._disk_key(key[1]), vector)
+        return vector
+
+    def get_or_compute(self, model_name: str, query: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        """Return the cached embedding, or compute it from the normalized query and cache it"""
+        vector = self.get(model_name, query)
+        if vector is None:
+            vector = self.put(model_name, query, compute(normalize_query(query)))
+        return vector
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = sum(self.stats.values())
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "memory_entries": len(self._memory),
+                "disk_entries": sum(len(s.rows) for s in self._disk.values()),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop the memory tier (the disk tier is kept)"""
+        with self._lock:
+            self._memory.clear()
+
+
+# Process-wide cache shared by every RagQueryEngine
+_query_embedding_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    global _query_embedding_cache
+    if _query_embedding_cache is None:
+        _query_embedding_cache = QueryEmbeddingCache()
+    return _query_embedding_cache
@@ -5,6 +5,8 @@ These examples help the model understand the style and approach
 import os
 import json
 
+from rag.bm25_index import MIN_STEM_LENGTH, analyze
+
 # Load FAQ examples
 FAQ_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "טל-בשן_FAQ_פרקים_1-2-4-5-6-7-8-9 (1).md")
 QNA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "rag", "qna.jsonl")
@@ -100,28 +102,36 @@ def get_relevant_examples(question: str, max_examples: int = 3) -> str:
     Combines FAQ examples and QNA examples for better coverage
     """
     question_lower = question.lower()
+    # Hebrew-normalized terms with prefixes stripped ("במעגל" matches "מעגל"); shorter words
+    # ("איך", "אני", "זה") appear in nearly every example and are noise
+    question_words = {term for term in analyze(question) if len(term) >= MIN_STEM_LENGTH}
+    # Raw longer words for the substring fallback (catches inflections prefix stripping misses)
+    long_words = [word for word in question_lower.split() if len(word) > 3]
     
     # First, try to find relevant QNA examples
     qna_examples = load_qna_examples()
     relevant_qna = []
     
     if qna_examples:
-        # Simple keyword matching for QNA
-        for example in qna_examples:
+        # Keyword matching for QNA, best overlap first
+        scored = []
+        for position, example in enumerate(qna_examples):
             question_text = example.get('question', '').lower()
             answer_text = example.get('answer_style', '').lower()
             metadata = example.get('metadata', {})
             key_terms = metadata.get('key_term', '').lower()
             
             # Check if question or answer contains keywords from user question
-            question_words = set(question_lower.split())
-            example_words = set((question_text + ' ' + answer_text + ' ' + key_terms).split())
+            example_words = set(analyze(question_text + ' ' + answer_text + ' ' + key_terms))
             
-            # Simple overlap check
-            if question_words & example_words or any(word in question_text for word in question_words if len(word) > 3):
-                relevant_qna.append(example)
-                if len(relevant_qna) >= max_examples:
-                    break
+            # Shared terms plus raw words found inside the example question
+            overlap = len(question_words & example_words) + sum(1 for word in long_words if word in question_text)
+            if overlap:
+                scored.append((-overlap, position, example))
+        
+        # Ties keep file order
+        scored.sort(key=lambda item: item[:2])
+        relevant_qna = [example for _, _, example in scored[:max_examples]]
     
     # Format QNA examples
     qna_formatted = format_qna_examples(relevant_qna, max_examples=max_examples)
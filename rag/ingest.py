@@ -4,8 +4,6 @@ from typing import List, Dict
 
 import numpy as np
 from docx import Document
-import faiss
-from sentence_transformers import SentenceTransformer
 
 from .config import DOCS_DIR, INDEX_PATH, METADATA_PATH, EMBEDDING_MODEL_NAME
 
@@ -46,6 +44,10 @@ def chunk_text(text: str, max_chars: int = 1000, overlap: int = 200) -> List[str
 
 
 def build_index():
+    # Heavy imports (torch, faiss) only when actually building
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
     docs = load_word_docs(DOCS_DIR)
     if not docs:
         raise ValueError(f"No .docx files found in {DOCS_DIR}")
@@ -12,8 +12,6 @@ from pathlib import Path
 
 import numpy as np
 from docx import Document
-import faiss
-from sentence_transformers import SentenceTransformer
 
 from .config import DOCS_DIR, INDEX_PATH, METADATA_PATH, EMBEDDING_MODEL_NAME
 
@@ -178,6 +176,10 @@ def build_index_improved(
         overlap_tokens: Overlap between chunks (50-100 recommended)
         embedding_model_name: Override embedding model
     """
+    # Heavy imports (torch, faiss) only when actually building
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
     if embedding_model_name is None:
         embedding_model_name = EMBEDDING_MODEL_NAME
     
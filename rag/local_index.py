@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+In-process vector index mirroring knowledge_chunks
+For a corpus of a few thousand chunks a Postgres round trip per query is pure overhead:
+this keeps a snapshot of the table in memory-mapped files and answers top-k in process.
+
+Snapshot layout (one directory per generation, CURRENT points at the live one):
+    embeddings.f32  (N, dim) float32, L2-normalized  -> cosine distance = 1 - dot
+    offsets.i64     (N + 1) byte offsets into payload.bin
+    payload.bin     UTF-8 JSON per row: id, text, metadata, source, order, tags
+    rows.json       [id, version key] per row (for delta sync)
+    meta.json       dim, count, knowledge version, format
+
+Startup is an mmap, not a table read. Freshness: at most every refresh_interval seconds
+the cheap knowledge_chunks fingerprint is polled; on change only rows whose
+content_hash/updated_at differ are fetched, and a new generation is written.
+One LocalVectorIndex per directory per process (get_local_index); writers in different
+processes take the directory's LOCK file and map a generation another writer just
+finished instead of syncing again. The previous generation is kept on disk, so a
+reader that resolved CURRENT right before a switch can still map it.
+
+Search is exact (one mat-vec + argpartition), which at this corpus size is already
+sub-millisecond to a few ms, so no ANN structure is kept.
+
+Usage:
+    python -m rag.local_index --dir data/local_index          # build / sync
+    RAG_LOCAL_INDEX_DIR=data/local_index  -> used by RagQueryEngine
+"""
+import os
+import json
+import time
+import fcntl
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.semantic_cache import fetch_knowledge_version
+
+# Snapshot directory; unset = retrieval goes to Postgres
+DEFAULT_LOCAL_INDEX_DIR = os.getenv("RAG_LOCAL_INDEX_DIR") or None
+DEFAULT_REFRESH_INTERVAL = float(os.getenv("RAG_LOCAL_INDEX_REFRESH_SECONDS", "30"))
+# Bumped when the payload records change shape; snapshots of another format are rebuilt
+# (2: records carry the tags column, which RetrievalFilter.matches filters on)
+SNAPSHOT_FORMAT = 2
+
+_ROW_KEYS_SQL = """
+    SELECT id, COALESCE(content_hash, md5(text)) || '|' || COALESCE(updated_at::text, '')
+    FROM knowledge_chunks
+    WHERE embedding IS NOT NULL
+"""
+
+_ROWS_SQL = """
+    SELECT id, text, metadata, source, "order", tags, embedding::real[],
+           COALESCE(content_hash, md5(text)) || '|' || COALESCE(updated_at::text, '')
+    FROM knowledge_chunks
+    WHERE embedding IS NOT NULL
+"""
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class _Snapshot:
+    """One generation of the index, opened read-only via mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "rows.json"), "r", encoding="utf-8") as f:
+            self.rows: List[Tuple[str, str]] = [tuple(r) for r in json.load(f)]
+        count, dim = self.meta["count"], self.meta["dim"]
+        if count:
+            self.embeddings = np.memmap(os.path.join(path, "embeddings.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+            self.offsets = np.memmap(os.path.join(path, "offsets.i64"), dtype=np.int64, mode="r", shape=(count + 1,))
+            self.payload = np.memmap(os.path.join(path, "payload.bin"), dtype=np.uint8, mode="r")
+        else:
+            self.embeddings = np.zeros((0, dim), dtype=np.float32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.payload = np.zeros(0, dtype=np.uint8)
+
+    def record(self, row: int) -> Dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.payload[start:end].tobytes().decode("utf-8"))
+
+
+def _read_current(directory: str) -> Optional[str]:
+    """Generation name CURRENT points at (None before the first build)"""
+    try:
+        with open(os.path.join(directory, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _open_current(directory: str) -> Optional[_Snapshot]:
+    """Map the generation CURRENT points at; re-resolve once if it was removed meanwhile"""
+    for _ in range(2):
+        generation = _read_current(directory)
+        if generation is None:
+            return None
+        try:
+            return _Snapshot(os.path.join(directory, generation))
+        except FileNotFoundError:
+            continue
+    return None
+
+
+@contextmanager
+def _writer_lock(directory: str):
+    """Exclusive lock on the directory's LOCK file (one snapshot writer across processes)"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "LOCK"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_generation(directory: str, records: List[Dict], embeddings: np.ndarray, keys: List[str], version) -> str:
+    """Write a complete snapshot into a new generation directory and point CURRENT at it"""
+    generation = f"gen-{time.time_ns()}"
+    path = os.path.join(directory, generation)
+    os.makedirs(path)
+
+    count = len(records)
+    dim = int(embeddings.shape[1]) if count else 0
+    if count:
+        embeddings.astype(np.float32).tofile(os.path.join(path, "embeddings.f32"))
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        with open(os.path.join(path, "payload.bin"), "wb") as f:
+            for i, record in enumerate(records):
+                data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                f.write(data)
+                offsets[i + 1] = offsets[i] + len(data)
+        offsets.tofile(os.path.join(path, "offsets.i64"))
+    with open(os.path.join(path, "rows.json"), "w", encoding="utf-8") as f:
+        json.dump([[r["id"], k] for r, k in zip(records, keys)], f)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "count": count, "version": version, "format": SNAPSHOT_FORMAT}, f)
+
+    previous = _read_current(directory)
+    current_tmp = os.path.join(directory, "CURRENT.tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(current_tmp, os.path.join(directory, "CURRENT"))
+
+    # Generations before the previous one are no longer referenced (open mmaps survive
+    # the unlink); the previous one stays for readers that resolved CURRENT just before
+    for name in os.listdir(directory):
+        if name.startswith("gen-") and name not in (generation, previous):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return path
+
+
+class LocalVectorIndex:
+    """Memory-mapped mirror of knowledge_chunks with exact in-process top-k (see get_local_index)"""
+
+    def __init__(self, directory: str, refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"searches": 0, "syncs": 0, "rows_fetched": 0}
+
+        snapshot = _open_current(directory)
+        if snapshot is not None:
+            if snapshot.meta.get("format") == SNAPSHOT_FORMAT:
+                self._snapshot = snapshot
+                print(f"✅ Local vector index mapped: {snapshot.meta['count']} chunks ({directory})")
+            else:
+                # Older records lack fields the filters need: the first refresh rebuilds it
+                print(f"⚠️  Local vector index in {directory} has an old format - rebuilding on first refresh")
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def refresh(self, pool, force: bool = False):
+        """Poll the knowledge version (at most every refresh_interval) and sync deltas on change"""
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and self._snapshot is not None and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+            version = [str(v) for v in pool.run(fetch_knowledge_version)]
+            if self._snapshot is not None and self._snapshot.meta.get("version") == version:
+                return
+            with _writer_lock(self.directory):
+                # Another process may have written this version while we waited for the lock
+                current = _open_current(self.directory)
+                if current is not None and current.meta.get("format") == SNAPSHOT_FORMAT:
+                    self._snapshot = current
+                    if current.meta.get("version") == version:
+                        return
+                pool.run(lambda conn: self._sync(conn, version))
+
+    def _sync(self, conn, version):
+        start = time.time()
+        old = self._snapshot
+        old_rows = {row_id: (i, key) for i, (row_id, key) in enumerate(old.rows)} if old else {}
+
+        with conn.cursor() as cursor:
+            cursor.execute(_ROW_KEYS_SQL)
+            current = cursor.fetchall()
+            changed = [row_id for row_id, key in current if old_rows.get(row_id, (None, None))[1] != key]
+            fetched = {}
+            if changed:
+                cursor.execute(_ROWS_SQL + " AND id = ANY(%s)", (changed, ))
+                for row_id, text, metadata, source, order, tags, embedding, key in cursor.fetchall():
+                    fetched[row_id] = (
+                        {"id": row_id, "text": text, "metadata": metadata, "source": source, "order": order, "tags": tags or []},
+                        np.asarray(embedding, dtype=np.float32),
+                        key,
+                    )
+
+        records, vectors, keys = [], [], []
+        for row_id, key in current:
+            if row_id in fetched:
+                record, vector, key = fetched[row_id]
+            elif row_id in old_rows:
+                row = old_rows[row_id][0]
+                record, vector = old.record(row), np.asarray(old.embeddings[row])
+            else:
+                continue  # Inserted between the two statements; picked up next sync
+            records.append(record)
+            vectors.append(vector)
+            keys.append(key)
+
+        embeddings = _normalize_rows(np.vstack(vectors)) if vectors else np.zeros((0, 0), dtype=np.float32)
+        # Rows copied from the old snapshot are already normalized; renormalizing is a no-op
+        path = _write_generation(self.directory, records, embeddings, keys, version)
+        self._snapshot = _Snapshot(path)
+
+        removed = len(old_rows.keys() - {row_id for row_id, _ in current})
+        self.stats["syncs"] += 1
+        self.stats["rows_fetched"] += len(fetched)
+        print(
+            f"♻️  Local vector index synced: {len(records)} chunks "
+            f"({len(fetched)} fetched, {removed} removed) in {time.time() - start:.2f}s"
+        )
+
+    def search(
+        self,
+        query_embedding,
+        top_k: int,
+        row_filter: Optional[Callable[[Dict], bool]] = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple]:
+        """
+        Top-k rows as (id, text, metadata, source, order, cosine distance), nearest first.
+        row_filter(record) -> bool skips rows (walks the full similarity order, so top-k stays exact)
+        with_embeddings: append each row's (normalized) embedding to its tuple
+        """
+        snapshot = self._snapshot
+        self.stats["searches"] += 1
+        if snapshot is None or snapshot.meta["count"] == 0:
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+        sims = snapshot.embeddings @ q
+        k = min(top_k, sims.shape[0])
+        if row_filter is None:
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+        else:
+            top = np.argsort(-sims)
+
+        results = []
+        for row in top:
+            if len(results) >= k:
+                break
+            record = snapshot.record(int(row))
+            if row_filter is not None and not row_filter(record):
+                continue
+            result = (
+                record["id"], record["text"], record["metadata"], record["source"], record["order"],
+                1.0 - float(sims[row]),
+            )
+            if with_embeddings:
+                result += (np.array(snapshot.embeddings[row]),)
+            results.append(result)
+        return results
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            **self.stats,
+            "chunks": snapshot.meta["count"] if snapshot else 0,
+            "generation": os.path.basename(snapshot.path) if snapshot else None,
+        }
+
+
+# Process-wide indexes, one per snapshot directory (engines share it instead of each
+# syncing and writing its own generations)
+_indexes: Dict[str, LocalVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(directory: str) -> LocalVectorIndex:
+    """Shared LocalVectorIndex for a snapshot directory (created on first use)"""
+    directory = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = LocalVectorIndex(directory)
+            _indexes[directory] = index
+        return index
+
+
+def main():
+    from rag.db import DATABASE_URL, get_pool
+
+    parser = argparse.ArgumentParser(description="Build or sync the local vector index")
+    parser.add_argument("--dir", default=DEFAULT_LOCAL_INDEX_DIR or "data/local_index", help="Snapshot directory")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing snapshot first")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.dir):
+        shutil.rmtree(args.dir)
+    os.makedirs(args.dir, exist_ok=True)
+
+    index = LocalVectorIndex(args.dir)
+    index.refresh(get_pool(DATABASE_URL), force=True)
+    print(f"📊 {index.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
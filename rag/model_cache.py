@@ -1,30 +1,245 @@
 """
 Model caching for performance optimization
 Prevents reloading models on every RagQueryEngine initialization
+
+sentence_transformers (and with it torch) is imported on the first model load,
+not at import time, so importing rag.* stays fast for short-lived tools.
 """
-from typing import Optional
-from sentence_transformers import SentenceTransformer, CrossEncoder
+import os
+import gc
+import time
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 
-# Global model cache
-_embedding_model: Optional[SentenceTransformer] = None
-_rerank_model: Optional[CrossEncoder] = None
-_embedding_model_name: Optional[str] = None
-_rerank_model_name: Optional[str] = None
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer, CrossEncoder
 
+# Inference backend: "torch" (default), "onnx" or "onnx-int8" (see rag/onnx_backend.py)
+MODEL_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_MODEL_BACKEND = os.getenv("RAG_MODEL_BACKEND", "torch")
 
-def get_embedding_model(model_name: str) -> SentenceTransformer:
-    """Get or load embedding model (cached)"""
-    global _embedding_model, _embedding_model_name
-    
-    if _embedding_model is None or _embedding_model_name != model_name:
-        print(f"📥 Loading embedding model: {model_name} (first time or model changed)...")
-        _embedding_model = SentenceTransformer(model_name)
-        _embedding_model_name = model_name
-        print("✅ Embedding model loaded and cached")
-    else:
-        print(f"♻️  Using cached embedding model: {model_name}")
+# Process RSS budget (MB, 0 = unlimited): after a model load, least recently used models
+# are unloaded while RSS is above it. Idle unload timeout (s, 0 = never)
+DEFAULT_MODEL_BUDGET_MB = int(os.getenv("RAG_MODEL_RSS_BUDGET_MB", "0"))
+DEFAULT_MODEL_IDLE_TIMEOUT = float(os.getenv("RAG_MODEL_IDLE_TIMEOUT", "0"))
+
+
+def _model_size_bytes(model) -> int:
+    """Footprint estimate: parameter + buffer bytes (torch) or the ONNX file size"""
+    size = getattr(model, "size_bytes", None)
+    if size is not None:
+        return int(size)
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc; None elsewhere)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Entry:
+    __slots__ = ("model", "size_bytes", "last_used")
+
+    def __init__(self, model, size_bytes: int):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.last_used = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Thread-safe keyed LRU of loaded models.
+    - budget_mb: after each load, evict least recently used models while the process RSS
+      exceeds it (re-measured after every eviction; the model just loaded is always kept).
+      RSS also holds the local index mmap, caches and allocator slack, so eviction stops
+      once unloading a model no longer lowers RSS - it would only make the next request
+      reload it. Without /proc the summed model footprints are compared instead
+    - idle_timeout: unload models unused for that long (checked lazily on each get)
+    A model is loaded once even if several threads ask for it at the same time.
+    get_embedding_model / get_rerank_model hand out ModelHandles, not the models, so
+    the registry holds the only long-lived reference and eviction actually frees memory.
+    """
+
+    def __init__(self, budget_mb: int = DEFAULT_MODEL_BUDGET_MB, idle_timeout: float = DEFAULT_MODEL_IDLE_TIMEOUT):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.idle_timeout = idle_timeout
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.stats = {"hits": 0, "loads": 0, "load_time": 0.0, "lru_evictions": 0, "idle_evictions": 0}
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        self.evict_idle()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._touch(key, entry)
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Per-key lock: concurrent requests for the same model wait for one load
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return self._touch(key, entry)
+
+            print(f"📥 Loading model: {key}...")
+            start = time.time()
+            model = loader()
+            elapsed = time.time() - start
+            size = _model_size_bytes(model)
+            print(f"✅ Model loaded and cached: {key} ({size / 1024 / 1024:.0f} MB, {elapsed:.1f}s)")
+
+            with self._lock:
+                self._entries[key] = _Entry(model, size)
+                self._loading.pop(key, None)
+                self.stats["loads"] += 1
+                self.stats["load_time"] += elapsed
+            self._enforce_budget(keep=key)
+            return model
+
+    def _touch(self, key: str, entry: _Entry):
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry.model
+
+    def _over_budget(self) -> bool:
+        rss = _current_rss_bytes()
+        if rss is None:
+            # No /proc (non-Linux): the summed model footprints stand in for RSS
+            return sum(e.size_bytes for e in self._entries.values()) > self.budget_bytes
+        return rss > self.budget_bytes
+
+    # An eviction must bring RSS down by at least this share of the evicted model's size
+    # (the allocator keeps some freed pages) for the loop to go on to the next model
+    MIN_EVICTION_RSS_DROP = 0.5
+
+    def _enforce_budget(self, keep: str):
+        if not self.budget_bytes:
+            return
+        while True:
+            with self._lock:
+                if not self._over_budget():
+                    break
+                victim = next((k for k in self._entries if k != keep), None)
+                if victim is None:
+                    break  # Nothing left to unload but the model just loaded; keep it
+                rss_before = _current_rss_bytes()
+                # Keep only the size: a local reference to the entry would pin the model
+                size = self._entries.pop(victim).size_bytes
+                self.stats["lru_evictions"] += 1
+            # Engines only hold ModelHandles, so this frees the weights before RSS is re-read.
+            # Collected outside the lock so other threads' cache hits do not wait on it
+            gc.collect()
+            print(f"♻️  Evicted model (RSS budget): {victim}")
+            rss_after = _current_rss_bytes()
+            if rss_before is not None and rss_after is not None:
+                if rss_before - rss_after < size * self.MIN_EVICTION_RSS_DROP:
+                    print("⚠️  Model eviction did not lower RSS; the rest of the budget overrun is not models")
+                    break
+
+    def evict_idle(self):
+        """Unload models not used within idle_timeout"""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        with self._lock:
+            idle = [k for k, e in self._entries.items() if now - e.last_used > self.idle_timeout]
+            for key in idle:
+                self._entries.pop(key)
+                self.stats["idle_evictions"] += 1
+        for key in idle:
+            print(f"♻️  Unloaded idle model: {key}")
+        if idle:
+            gc.collect()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        gc.collect()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            rss = _current_rss_bytes()
+            return {
+                **self.stats,
+                "models": {
+                    k: {"size_mb": round(e.size_bytes / 1024 / 1024, 1), "idle_seconds": round(now - e.last_used, 1)}
+                    for k, e in self._entries.items()
+                },
+                "total_mb": round(sum(e.size_bytes for e in self._entries.values()) / 1024 / 1024, 1),
+                "budget_mb": self.budget_bytes // (1024 * 1024) or None,
+                "rss_mb": round(rss / 1024 / 1024, 1) if rss is not None else None,
+            }
+
+
+class ModelHandle:
+    """
+    Stand-in for a registry model: each attribute access (encode, predict, ...) resolves
+    the model through the registry. An engine holding a handle does not pin a model the
+    registry evicted - the next call reloads it instead of a second copy piling up.
+    """
+    __slots__ = ("_registry", "_key", "_loader")
+
+    def __init__(self, registry: ModelRegistry, key: str, loader: Callable[[], Any]):
+        self._registry = registry
+        self._key = key
+        self._loader = loader
+
+    def resolve(self) -> Any:
+        return self._registry.get(self._key, self._loader)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        return f"ModelHandle({self._key!r})"
+
+
+# Process-wide registry behind get_embedding_model / get_rerank_model
+_registry = ModelRegistry()
+
+
+def _handle(key: str, loader: Callable[[], Any]) -> ModelHandle:
+    """Load (or reuse) the model now, return a handle that re-resolves it on every use"""
+    handle = ModelHandle(_registry, key, loader)
+    handle.resolve()
+    return handle
+
+
+def backend_cache_key(model_name: str, backend: str = DEFAULT_MODEL_BACKEND) -> str:
+    """Model identity for score/embedding caches: ONNX (esp. int8) outputs drift slightly from torch"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def load_model(model_name: str, kind: str, backend: str = DEFAULT_MODEL_BACKEND):
+    """Load a model without caching (kind: "embedding" or "rerank")"""
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend} (expected one of {MODEL_BACKENDS})")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer, CrossEncoder
+        return SentenceTransformer(model_name) if kind == "embedding" else CrossEncoder(model_name)
     
-    return _embedding_model
+    from rag.onnx_backend import load_onnx_embedding_model, load_onnx_rerank_model
+    load = load_onnx_embedding_model if kind == "embedding" else load_onnx_rerank_model
+    return load(model_name, quantize=backend == "onnx-int8")
+
+
+def get_embedding_model(model_name: str, backend: str = DEFAULT_MODEL_BACKEND) -> "SentenceTransformer":
+    """Get or load embedding model (cached, behind a ModelHandle); ONNX backends return a drop-in encoder"""
+    key = "embedding:" + backend_cache_key(model_name, backend)
+    return _handle(key, lambda: load_model(model_name, "embedding", backend))
 
 
 # Rerank model aliases
@@ -35,34 +250,26 @@ RERANK_MODEL_ALIASES = {
     "latest": "mixedbread-ai/mxbai-rerank-large-v1",
 }
 
-def get_rerank_model(model_name: str) -> CrossEncoder:
-    """Get or load rerank model (cached)
+def get_rerank_model(model_name: str, backend: str = DEFAULT_MODEL_BACKEND) -> "CrossEncoder":
+    """Get or load rerank model (cached, behind a ModelHandle)
     
     Args:
         model_name: Model name or alias ("fast", "balanced", "best", "latest")
                    or full HuggingFace model path
+        backend: "torch", "onnx" or "onnx-int8" (ONNX backends return a drop-in predict())
     """
-    global _rerank_model, _rerank_model_name
-    
     # Resolve alias to actual model name
     actual_model_name = RERANK_MODEL_ALIASES.get(model_name, model_name)
-    
-    if _rerank_model is None or _rerank_model_name != actual_model_name:
-        print(f"📥 Loading rerank model: {actual_model_name} (first time or model changed)...")
-        _rerank_model = CrossEncoder(actual_model_name)
-        _rerank_model_name = actual_model_name
-        print("✅ Rerank model loaded and cached")
-    else:
-        print(f"♻️  Using cached rerank model: {actual_model_name}")
-    
-    return _rerank_model
+    key = "rerank:" + backend_cache_key(actual_model_name, backend)
+    return _handle(key, lambda: load_model(actual_model_name, "rerank", backend))
 
 
 def clear_cache():
     """Clear model cache (useful for testing or memory management)"""
-    global _embedding_model, _rerank_model, _embedding_model_name, _rerank_model_name
-    _embedding_model = None
-    _rerank_model = None
-    _embedding_model_name = None
-    _rerank_model_name = None
+    _registry.clear()
+
+
+def get_model_cache_stats() -> Dict:
+    """Loaded models, sizes, load/eviction counters and process RSS"""
+    return _registry.get_stats()
 
@@ -0,0 +1,259 @@
+"""
+ONNX Runtime backend for the embedding and rerank models (CPU deployments)
+Exports a SentenceTransformer / CrossEncoder to ONNX once, optionally with dynamic int8
+quantization, caches the artifacts on disk and serves drop-in objects:
+
+    OnnxSentenceEncoder.encode(...)  ~ SentenceTransformer.encode
+    OnnxCrossEncoder.predict(...)    ~ CrossEncoder.predict
+
+The full SentenceTransformer forward (transformer + pooling + normalize) is exported,
+so the ONNX graph reproduces the model's own pooling. CrossEncoder exports keep the
+model's activation (sigmoid / identity) so scores stay on the same scale.
+
+Artifacts: {RAG_ONNX_DIR}/{model name}/model.onnx, model.int8.onnx, tokenizer files, meta.json
+Needs: onnx + onnxruntime (export also needs torch + sentence-transformers)
+"""
+import os
+import json
+import inspect
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+DEFAULT_ONNX_DIR = os.getenv("RAG_ONNX_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "onnx_models"))
+ONNX_OPSET = 17
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "ONNX backend needs onnxruntime: pip install onnx onnxruntime"
+        ) from e
+    return onnxruntime
+
+
+def artifact_dir(model_name: str, onnx_dir: str = DEFAULT_ONNX_DIR) -> str:
+    return os.path.join(onnx_dir, model_name.replace("/", "__"))
+
+
+def _model_file(directory: str, quantize: bool) -> str:
+    return os.path.join(directory, "model.int8.onnx" if quantize else "model.onnx")
+
+
+# === EXPORT ===
+
+def _quantize(directory: str):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    print("🔧 Quantizing to int8 (dynamic)...")
+    quantize_dynamic(
+        model_input=_model_file(directory, False),
+        model_output=_model_file(directory, True),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def _export(module, tokenizer, directory: str, output_name: str, meta: Dict):
+    """Trace `module(**tokenizer features)` into directory/model.onnx with dynamic batch/sequence axes"""
+    import torch
+
+    os.makedirs(directory, exist_ok=True)
+    sample = tokenizer(["שלום עולם"], ["דוגמה"] if meta["kind"] == "rerank" else None, return_tensors="pt")
+    input_names = [name for name in tokenizer.model_input_names if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch"}
+
+    # torch >= 2.9 exports through dynamo by default (needs onnxscript, ignores dynamic_axes);
+    # keep the TorchScript exporter wherever the choice exists
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    module.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            tuple(sample[name] for name in input_names),
+            _model_file(directory, False),
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            **options,
+        )
+    tokenizer.save_pretrained(directory)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "input_names": input_names}, f, ensure_ascii=False, indent=2)
+
+
+def export_embedding_model(model_name: str, onnx_dir: str = DEFAULT_ONNX_DIR, quantize: bool = False) -> str:
+    """Export a SentenceTransformer (with its pooling) to ONNX; returns the artifact directory"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    directory = artifact_dir(model_name, onnx_dir)
+    if not os.path.exists(_model_file(directory, False)):
+        print(f"📦 Exporting embedding model to ONNX: {model_name}")
+        st = SentenceTransformer(model_name, device="cpu")
+
+        class SentenceEmbedding(torch.nn.Module):
+            def __init__(self, model, input_names):
+                super().__init__()
+                self.model = model
+                self.input_names = input_names
+
+            def forward(self, *inputs):
+                return self.model(dict(zip(self.input_names, inputs)))["sentence_embedding"]
+
+        tokenizer = st.tokenizer
+        names = [n for n in tokenizer.model_input_names if n in tokenizer(["x"])]
+        _export(
+            SentenceEmbedding(st, names),
+            tokenizer,
+            directory,
+            "sentence_embedding",
+            {
+                "kind": "embedding",
+                "model_name": model_name,
+                "max_length": st.max_seq_length,
+                "dim": st.get_sentence_embedding_dimension(),
+            },
+        )
+    if quantize and not os.path.exists(_model_file(directory, True)):
+        _quantize(directory)
+    return directory
+
+
+def export_rerank_model(model_name: str, onnx_dir: str = DEFAULT_ONNX_DIR, quantize: bool = False) -> str:
+    """Export a CrossEncoder to ONNX (logits + its activation name in meta); returns the artifact directory"""
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    directory = artifact_dir(model_name, onnx_dir)
+    if not os.path.exists(_model_file(directory, False)):
+        print(f"📦 Exporting rerank model to ONNX: {model_name}")
+        ce = CrossEncoder(model_name, device="cpu")
+        # sentence-transformers renamed this attribute across versions
+        activation = getattr(ce, "activation_fn", None) or getattr(ce, "default_activation_function", None)
+
+        class Logits(torch.nn.Module):
+            def __init__(self, model, input_names):
+                super().__init__()
+                self.model = model
+                self.input_names = input_names
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(self.input_names, inputs))).logits
+
+        tokenizer = ce.tokenizer
+        names = [n for n in tokenizer.model_input_names if n in tokenizer(["x"], ["y"])]
+        _export(
+            Logits(ce.model, names),
+            tokenizer,
+            directory,
+            "logits",
+            {
+                "kind": "rerank",
+                "model_name": model_name,
+                "max_length": ce.max_length or tokenizer.model_max_length,
+                "activation": "sigmoid" if isinstance(activation, torch.nn.Sigmoid) else "identity",
+            },
+        )
+    if quantize and not os.path.exists(_model_file(directory, True)):
+        _quantize(directory)
+    return directory
+
+
+# === RUNTIME ===
+
+class _OnnxModel:
+    def __init__(self, directory: str, quantize: bool = False):
+        ort = _require_onnxruntime()
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_length = self.meta.get("max_length") or 512
+        self.quantized = quantize
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            _model_file(directory, quantize), options, providers=["CPUExecutionProvider"]
+        )
+        # Footprint estimate for rag.model_cache's memory budget
+        self.size_bytes = os.path.getsize(_model_file(directory, quantize))
+        self.input_names = self.meta["input_names"]
+
+    def _run(self, features) -> np.ndarray:
+        inputs = {name: np.asarray(features[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(None, inputs)[0]
+
+
+class OnnxSentenceEncoder(_OnnxModel):
+    """Drop-in for SentenceTransformer.encode on onnxruntime"""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Length-sorted batches pad less; order is restored below
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        embeddings = np.zeros((len(texts), self.meta["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            features = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            embeddings[idx] = self._run(features)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+        return embeddings[0] if single else embeddings
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """Drop-in for CrossEncoder.predict on onnxruntime"""
+
+    def predict(
+        self,
+        sentences: Sequence[Sequence[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        pairs = list(sentences)
+        scores: List[np.ndarray] = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            features = self.tokenizer(
+                [q for q, _ in batch], [t for _, t in batch], padding=True, truncation="longest_first",
+                max_length=self.max_length, return_tensors="np",
+            )
+            logits = self._run(features)
+            if self.meta.get("activation") == "sigmoid":
+                logits = 1.0 / (1.0 + np.exp(-logits))
+            scores.append(logits[:, 0] if logits.shape[1] == 1 else logits)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+def load_onnx_embedding_model(model_name: str, quantize: bool = False, onnx_dir: str = DEFAULT_ONNX_DIR) -> OnnxSentenceEncoder:
+    """Load (exporting on first use) an ONNX embedding model"""
+    return OnnxSentenceEncoder(export_embedding_model(model_name, onnx_dir, quantize), quantize)
+
+
+def load_onnx_rerank_model(model_name: str, quantize: bool = False, onnx_dir: str = DEFAULT_ONNX_DIR) -> OnnxCrossEncoder:
+    """Load (exporting on first use) an ONNX rerank model"""
+    return OnnxCrossEncoder(export_rerank_model(model_name, onnx_dir, quantize), quantize)
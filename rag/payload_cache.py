@@ -0,0 +1,113 @@
+"""
+Hot chunk payload cache
+With phased retrieval (RagQueryEngine two_phase_fetch / adaptive_depth) the database
+first returns only ids and distances; payloads are then looked up by id. The same
+few hundred chunks answer most questions, so their payloads are kept here and only
+ids never seen before (or whose metadata was not fetched yet) go to Postgres.
+
+Entries hold text, source and order; metadata is added once a chunk reaches a final
+top-N (two-phase fetch defers it). Everything is dropped whenever knowledge_chunks
+changes (see fetch_knowledge_version), polled at most every version_check_interval:
+chunks re-ingested within that window can be served from the old payloads until the
+next poll (RAG_PAYLOAD_CACHE_VERSION_CHECK_INTERVAL, seconds; 0 = check on every fetch).
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag.semantic_cache import DEFAULT_VERSION_CHECK_INTERVAL
+
+DEFAULT_PAYLOAD_CACHE_SIZE = int(os.getenv("RAG_PAYLOAD_CACHE_SIZE", "4096"))
+DEFAULT_PAYLOAD_VERSION_CHECK_INTERVAL = float(
+    os.getenv("RAG_PAYLOAD_CACHE_VERSION_CHECK_INTERVAL", str(DEFAULT_VERSION_CHECK_INTERVAL))
+)
+
+
+class ChunkPayloadCache:
+    """Thread-safe LRU of chunk payloads keyed by chunk id"""
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_PAYLOAD_CACHE_SIZE,
+        version_check_interval: float = DEFAULT_PAYLOAD_VERSION_CHECK_INTERVAL,
+    ):
+        self.capacity = capacity
+        self.version_check_interval = version_check_interval
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._version = None
+        self._last_version_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def lookup(self, ids: Sequence[str], fields: Sequence[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        """({id: payload} for entries holding every field, [ids to fetch])"""
+        found: Dict[str, Dict] = {}
+        missing: List[str] = []
+        with self._lock:
+            for id in ids:
+                entry = self._entries.get(id)
+                if entry is not None and all(field in entry for field in fields):
+                    self._entries.move_to_end(id)
+                    found[id] = entry
+                else:
+                    missing.append(id)
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(missing)
+        return found, missing
+
+    def store(self, payloads: Dict[str, Dict]):
+        """Merge fetched fields into the entries (LRU eviction past capacity)"""
+        with self._lock:
+            for id, payload in payloads.items():
+                entry = self._entries.get(id)
+                if entry is None:
+                    self._entries[id] = dict(payload)
+                else:
+                    entry.update(payload)
+                    self._entries.move_to_end(id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def refresh(self, fetch_version: Callable[[], Tuple]):
+        """Poll the knowledge version (at most every version_check_interval) and clear on change"""
+        now = time.monotonic()
+        # Claimed under the lock: one of the threads hitting an expired interval polls
+        with self._lock:
+            if now - self._last_version_check < self.version_check_interval:
+                return
+            self._last_version_check = now
+        version = fetch_version()
+        with self._lock:
+            changed = self._version is not None and version != self._version
+            if changed:
+                self._entries.clear()
+                self.stats["invalidations"] += 1
+            self._version = version
+        if changed:
+            print("♻️  knowledge_chunks changed - chunk payload cache cleared")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide instance shared by all engines
+_chunk_payload_cache: Optional[ChunkPayloadCache] = None
+
+
+def get_chunk_payload_cache() -> ChunkPayloadCache:
+    global _chunk_payload_cache
+    if _chunk_payload_cache is None:
+        _chunk_payload_cache = ChunkPayloadCache()
+    return _chunk_payload_cache
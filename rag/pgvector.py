@@ -0,0 +1,166 @@
+"""
+numpy <-> pgvector transport helpers
+
+- encode_vector / decode_vector: pgvector's binary wire format
+  (int16 dim, int16 unused, dim x float4, big-endian), as read by vector_recv
+- copy_rows_binary / upsert_rows_binary: bulk writes through COPY ... (FORMAT binary),
+  so embeddings are never formatted as text on the client or parsed on the server
+- register_asyncpg_vector: binary codec for asyncpg connections
+- to_vector_literal: compact text literal for psycopg2 query parameters
+  (psycopg2 interpolates every parameter as text, so binary binds are not available there)
+- from_vector_literal: parse a vector column read through psycopg2 ('[x,y,...]' text)
+"""
+import io
+import json
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_VECTOR_HEADER = struct.Struct(">HH")
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_INT16 = struct.Struct(">h")
+_INT32 = struct.Struct(">i")
+
+# Column spec for COPY: (column name, postgres type)
+# Supported types: "text", "int4", "jsonb", "vector"
+ColumnSpec = Tuple[str, str]
+
+
+def encode_vector(vec) -> bytes:
+    """Encode a 1-D vector in pgvector's binary format"""
+    arr = np.asarray(vec, dtype=">f4")
+    return _VECTOR_HEADER.pack(arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Decode pgvector's binary format into a float32 numpy array"""
+    dim, _ = _VECTOR_HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=">f4", count=dim, offset=_VECTOR_HEADER.size).astype(np.float32)
+
+
+def to_vector_literal(vec) -> str:
+    """
+    Text literal for a vector parameter ('[x,y,...]').
+    Uses 9 significant digits (exact round-trip for float32) in a single format call,
+    which is shorter and faster than ','.join(map(str, vec.tolist())).
+    """
+    values = np.asarray(vec, dtype=np.float32).tolist()
+    return "[" + ",".join(["%.9g"] * len(values)) % tuple(values) + "]"
+
+
+def from_vector_literal(text: str) -> np.ndarray:
+    """Parse pgvector's text output ('[x,y,...]') into a float32 numpy array"""
+    body = text[1:-1]
+    if not body.strip():
+        return np.zeros(0, dtype=np.float32)
+    return np.array(body.split(","), dtype=np.float32)
+
+
+# === BINARY COPY ===
+
+def _encode_field(value: Any, pg_type: str) -> bytes:
+    if pg_type == "text":
+        return str(value).encode("utf-8")
+    if pg_type == "int4":
+        return _INT32.pack(int(value))
+    if pg_type == "jsonb":
+        # jsonb binary format: version byte (1) followed by the JSON text
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        return b"\x01" + text.encode("utf-8")
+    if pg_type == "vector":
+        return encode_vector(value)
+    raise ValueError(f"Unsupported COPY column type: {pg_type}")
+
+
+def build_copy_payload(columns: Sequence[ColumnSpec], rows: Iterable[Sequence[Any]]) -> io.BytesIO:
+    """Build a COPY ... (FORMAT binary) stream for the given rows"""
+    buf = io.BytesIO()
+    buf.write(_COPY_SIGNATURE)
+    buf.write(_INT32.pack(0))  # flags
+    buf.write(_INT32.pack(0))  # header extension length
+    field_count = _INT16.pack(len(columns))
+    for row in rows:
+        buf.write(field_count)
+        for value, (_, pg_type) in zip(row, columns):
+            if value is None:
+                buf.write(_INT32.pack(-1))
+                continue
+            data = _encode_field(value, pg_type)
+            buf.write(_INT32.pack(len(data)))
+            buf.write(data)
+    buf.write(_INT16.pack(-1))  # trailer
+    buf.seek(0)
+    return buf
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def copy_rows_binary(cursor, table: str, columns: Sequence[ColumnSpec], rows: Iterable[Sequence[Any]]):
+    """Insert rows with COPY ... FROM STDIN (FORMAT binary) on a psycopg2 cursor"""
+    column_list = ", ".join(_quote_ident(name) for name, _ in columns)
+    cursor.copy_expert(
+        f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT binary)",
+        build_copy_payload(columns, rows),
+    )
+
+
+def upsert_rows_binary(
+    cursor,
+    table: str,
+    columns: Sequence[ColumnSpec],
+    rows: List[Sequence[Any]],
+    update_columns: Optional[Sequence[str]] = None,
+    extra_values: Optional[Dict[str, str]] = None,
+    conflict_column: str = "id",
+):
+    """
+    Upsert rows via binary COPY into a temp staging table + INSERT ... ON CONFLICT.
+
+    Args:
+        update_columns: columns overwritten on conflict (default: all copied columns)
+        extra_values: column -> SQL expression set on insert and update (e.g. {"updated_at": "NOW()"})
+    """
+    if not rows:
+        return
+    extra_values = extra_values or {}
+    stage = f"_stage_{table}"
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {stage} "
+        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    )
+    cursor.execute(f"TRUNCATE {stage}")
+    copy_rows_binary(cursor, stage, columns, rows)
+
+    names = [name for name, _ in columns]
+    insert_cols = ", ".join(_quote_ident(n) for n in names + list(extra_values))
+    select_cols = ", ".join([_quote_ident(n) for n in names] + list(extra_values.values()))
+    if update_columns is None:
+        update_columns = [n for n in names if n != conflict_column]
+    updates = [f"{_quote_ident(n)} = EXCLUDED.{_quote_ident(n)}" for n in update_columns]
+    updates += [f"{_quote_ident(n)} = {expr}" for n, expr in extra_values.items()]
+
+    # DISTINCT ON: a batch may repeat an id, and ON CONFLICT cannot touch a row twice.
+    # ctid DESC keeps the last copy of each id, like sequential upserts would.
+    cursor.execute(f"""
+        INSERT INTO {table} ({insert_cols})
+        SELECT DISTINCT ON ({_quote_ident(conflict_column)}) {select_cols}
+        FROM {stage}
+        ORDER BY {_quote_ident(conflict_column)}, ctid DESC
+        ON CONFLICT ({_quote_ident(conflict_column)}) DO UPDATE SET {", ".join(updates)}
+    """)
+
+
+# === ASYNCPG ===
+
+async def register_asyncpg_vector(conn, schema: str = "public"):
+    """Send/receive `vector` values in binary as numpy arrays (use as asyncpg pool `init`)"""
+    await conn.set_type_codec(
+        "vector",
+        schema=schema,
+        encoder=encode_vector,
+        decoder=decode_vector,
+        format="binary",
+    )
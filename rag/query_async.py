@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Asyncio RAG Query Engine
+Same pipeline as RagQueryEngine, but DB round trips are coroutines on asyncpg and
+model inference (encode / predict) runs on a bounded thread pool, so one process can
+overlap many in-flight requests instead of serializing them.
+
+Retrieval runs the sync engine's statements (vector, hybrid, phased fetch with adaptive
+depth), so the same settings give the same candidates. The local index snapshot and the
+semantic result cache are synced through the sync engine's pool and are not used here.
+"""
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional
+
+import asyncpg
+
+from rag.db import prepared_form
+from rag.query_improved import (
+    RagQueryEngine,
+    PAYLOAD_FIELDS,
+    payload_sql,
+    _candidates_from_rows,
+    _payloads_from_rows,
+    _fill_payloads,
+    call_llm_default,
+    DATABASE_URL,
+    EMBEDDING_MODEL_NAME,
+    RERANK_MODEL_NAME,
+    DEFAULT_TOP_K_RETRIEVE,
+    DEFAULT_TOP_N_RERANK,
+    DEFAULT_MMR_POOL_SIZE,
+    DEFAULT_MMR_LAMBDA,
+    DEFAULT_IVFFLAT_PROBES,
+    DEFAULT_HNSW_EF_SEARCH,
+    DEFAULT_VECTOR_INDEX_TYPE,
+    DEFAULT_ITERATIVE_SCAN,
+    DEFAULT_HYBRID_RETRIEVAL,
+    DEFAULT_RRF_K,
+    DEFAULT_TWO_PHASE_FETCH,
+)
+from rag.adaptive_depth import DEFAULT_ADAPTIVE_DEPTH, DEFAULT_DEPTH_FLOOR, DEFAULT_DEPTH_CEILING
+from rag.local_index import DEFAULT_LOCAL_INDEX_DIR
+from rag.semantic_cache import DEFAULT_SEMANTIC_CACHE_THRESHOLD
+from rag.pgvector import register_asyncpg_vector
+from rag.retrieval_filter import RetrievalFilter
+
+# Inference threads: torch releases the GIL inside encode/predict,
+# but more threads than cores only adds contention
+DEFAULT_INFERENCE_WORKERS = 2
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+
+class AsyncRagQueryEngine:
+    """
+    Use `await AsyncRagQueryEngine.create(...)` (opens the connection pool),
+    then `await engine.answer(...)` from any number of concurrent tasks.
+    """
+
+    def __init__(
+        self,
+        database_url: str = DATABASE_URL,
+        embedding_model_name: str = EMBEDDING_MODEL_NAME,
+        rerank_model_name: str = RERANK_MODEL_NAME,
+        top_k_retrieve: int = DEFAULT_TOP_K_RETRIEVE,
+        top_n_rerank: int = DEFAULT_TOP_N_RERANK,
+        inference_workers: int = DEFAULT_INFERENCE_WORKERS,
+        pool_min_size: int = DEFAULT_POOL_MIN_SIZE,
+        pool_max_size: int = DEFAULT_POOL_MAX_SIZE,
+        mmr_pool_size: int = DEFAULT_MMR_POOL_SIZE,
+        mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+        retrieval_filter: Optional[RetrievalFilter] = None,
+        ivfflat_probes: Optional[int] = DEFAULT_IVFFLAT_PROBES,
+        hnsw_ef_search: Optional[int] = DEFAULT_HNSW_EF_SEARCH,
+        index_type: Optional[str] = DEFAULT_VECTOR_INDEX_TYPE,
+        iterative_scan: Optional[str] = DEFAULT_ITERATIVE_SCAN,
+        hybrid: bool = DEFAULT_HYBRID_RETRIEVAL,
+        rrf_k: int = DEFAULT_RRF_K,
+        adaptive_depth: bool = DEFAULT_ADAPTIVE_DEPTH,
+        depth_floor: int = DEFAULT_DEPTH_FLOOR,
+        depth_ceiling: int = DEFAULT_DEPTH_CEILING,
+        two_phase_fetch: bool = DEFAULT_TWO_PHASE_FETCH,
+        local_index_dir: Optional[str] = DEFAULT_LOCAL_INDEX_DIR,
+        semantic_cache_threshold: Optional[float] = DEFAULT_SEMANTIC_CACHE_THRESHOLD,
+    ):
+        self.database_url = database_url
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.pool: Optional[asyncpg.Pool] = None
+
+        # Models and the CPU-side steps are shared with the sync engine (no DB connection)
+        self.engine = RagQueryEngine(
+            database_url=None,
+            embedding_model_name=embedding_model_name,
+            rerank_model_name=rerank_model_name,
+            top_k_retrieve=top_k_retrieve,
+            top_n_rerank=top_n_rerank,
+            mmr_pool_size=mmr_pool_size,
+            mmr_lambda=mmr_lambda,
+            retrieval_filter=retrieval_filter,
+            ivfflat_probes=ivfflat_probes,
+            hnsw_ef_search=hnsw_ef_search,
+            index_type=index_type,
+            iterative_scan=iterative_scan,
+            hybrid=hybrid,
+            rrf_k=rrf_k,
+            adaptive_depth=adaptive_depth,
+            depth_floor=depth_floor,
+            depth_ceiling=depth_ceiling,
+            two_phase_fetch=two_phase_fetch,
+        )
+        if local_index_dir:
+            print(f"⚠️  AsyncRagQueryEngine does not use the local index ({local_index_dir}); retrieving from PostgreSQL")
+        if semantic_cache_threshold is not None:
+            print("⚠️  AsyncRagQueryEngine does not use the semantic result cache; every question is retrieved")
+
+        # The sync engine's statements, with %(name)s placeholders turned into asyncpg's $n
+        self.vector_statement = prepared_form(self.engine.vector_sql)[1:]
+        self.phase_one_statement = prepared_form(self.engine.phase_one_sql)[1:]
+        self.hybrid_statement = prepared_form(self.engine.hybrid_sql)[1:]
+        # Phased fetch (adaptive depth / two-phase): metadata comes with the payloads, since
+        # the sync engine's deferred metadata fetch goes through its (absent) pool
+        self.phased_fetch = two_phase_fetch or adaptive_depth
+        self.payload_fields = PAYLOAD_FIELDS + ("metadata",)
+        self.payload_statement = prepared_form(payload_sql(self.payload_fields))[1:]
+        self.executor = ThreadPoolExecutor(
+            max_workers=inference_workers,
+            thread_name_prefix="rag-inference",
+        )
+
+    @classmethod
+    async def create(cls, **kwargs) -> "AsyncRagQueryEngine":
+        """Build the engine and open its connection pool"""
+        engine = cls(**kwargs)
+        await engine.connect()
+        return engine
+
+    async def connect(self):
+        if self.pool is None:
+            print("📥 Opening async PostgreSQL pool...")
+            self.pool = await asyncpg.create_pool(
+                self.database_url,
+                min_size=self.pool_min_size,
+                max_size=self.pool_max_size,
+                # Vectors travel in pgvector's binary format (numpy in, numpy out)
+                init=register_asyncpg_vector,
+            )
+            print("✅ Async pool ready")
+
+    async def _run_inference(self, func, *args):
+        """Run a blocking model call on the bounded inference pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def retrieve_candidates(self, question: str) -> List[Dict]:
+        """
+        שלב 1: Vector search ראשוני (async) -> מחזיר רשימת candidates מ-PostgreSQL
+        """
+        q_emb = await self._run_inference(self.engine.embed_query, question)
+        engine = self.engine
+
+        async with self.pool.acquire() as conn:
+            if engine.hybrid and question:
+                rows = await self._fetch(conn, self.hybrid_statement, {
+                    "vector": q_emb,
+                    "question": question,
+                    "pool_size": engine.top_k_retrieve,
+                    "rrf_k": engine.rrf_k,
+                    "top_k": engine.top_k_retrieve,
+                    **engine.filter_params,
+                })
+            elif self.phased_fetch:
+                # Depth cut and MMR run on the (id, distance) hits, before any payload is read
+                hits = await self._fetch(conn, self.phase_one_statement, {
+                    "vector": q_emb, "top_k": engine.phase_one_depth, **engine.filter_params
+                })
+                candidates = engine._select_hits(q_emb, [tuple(hit) for hit in hits])
+                if not candidates:
+                    return []
+                rows = await self._fetch(
+                    conn, self.payload_statement, {"ids": [c["id"] for c in candidates]}, index_settings=False
+                )
+                return _fill_payloads(candidates, _payloads_from_rows(rows, self.payload_fields))
+            else:
+                rows = await self._fetch(conn, self.vector_statement, {
+                    "vector": q_emb, "top_k": engine.top_k_retrieve, **engine.filter_params
+                })
+
+        candidates = _candidates_from_rows([tuple(row) for row in rows], bool(engine.mmr_pool_size))
+        return engine._diversify(q_emb, candidates)
+
+    async def _fetch(self, conn, statement, params: Dict, index_settings: bool = True):
+        """Run one retrieval statement, after the SET LOCAL index settings"""
+        text, names = statement
+        args = [params[name] for name in names]
+        if index_settings and self.engine.index_settings_sql:
+            # SET LOCAL (probes / ef_search / iterative scan) lasts until the end of
+            # the transaction around the query
+            async with conn.transaction():
+                await conn.execute(self.engine.index_settings_sql)
+                return await conn.fetch(text, *args)
+        return await conn.fetch(text, *args)
+
+    async def rerank(self, question: str, candidates: List[Dict]) -> List[Dict]:
+        """
+        שלב 2: Re-ranking עם CrossEncoder (על ה-executor)
+        """
+        return await self._run_inference(self.engine.rerank, question, candidates)
+
+    async def answer(
+        self,
+        search_query: str = None,
+        question: str = None,
+        llm_callable=call_llm_default,
+        measure_time: bool = False,
+    ) -> Tuple[str, List[Dict], Optional[Dict]]:
+        """
+        הצינור המלא (async): Retrieve -> Re-rank -> LLM Answer
+        Same contract as RagQueryEngine.answer. llm_callable may be sync or a coroutine function.
+        """
+        if question is None:
+            question = search_query
+        if search_query is None:
+            search_query = question
+
+        timing_info = {} if measure_time else None
+
+        if not search_query.strip():
+            return "שאלה ריקה.", [], timing_info
+
+        start_retrieve = time.time()
+        candidates = await self.retrieve_candidates(search_query)
+        if measure_time:
+            timing_info["retrieve_time"] = time.time() - start_retrieve
+            timing_info["num_candidates"] = len(candidates)
+
+        if not candidates:
+            return "לא נמצאו קטעים רלוונטיים במסמכים.", [], timing_info
+
+        start_rerank = time.time()
+        top_chunks = await self.rerank(search_query, candidates)
+        if measure_time:
+            timing_info["rerank_time"] = time.time() - start_rerank
+            timing_info["num_final_chunks"] = len(top_chunks)
+            timing_info["total_chunks_time"] = timing_info["retrieve_time"] + timing_info["rerank_time"]
+
+        if not top_chunks:
+            return "לא הצלחתי לדרג קטעים רלוונטיים.", [], timing_info
+
+        start_llm = time.time()
+        if asyncio.iscoroutinefunction(llm_callable):
+            answer = await llm_callable(question, top_chunks)
+        else:
+            answer = llm_callable(question, top_chunks)
+        if measure_time:
+            timing_info["llm_time"] = time.time() - start_llm
+            timing_info["total_time"] = timing_info["total_chunks_time"] + timing_info["llm_time"]
+
+        return answer, top_chunks, timing_info
+
+    async def close(self):
+        """Close the connection pool and the inference executor"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        self.executor.shutdown(wait=False)
@@ -6,25 +6,55 @@ Uses PostgreSQL + pgvector for vector search and CrossEncoder for re-ranking
 import os
 import json
 import time
-from typing import List, Dict, Tuple, Optional
+import threading
+from typing import List, Dict, Tuple, Optional, Iterator
 
-import psycopg2
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from rag.model_cache import get_embedding_model, get_rerank_model
+from rag.model_cache import get_embedding_model, get_rerank_model, backend_cache_key, RERANK_MODEL_ALIASES
+from rag.db import DATABASE_URL, get_pool
+from rag.pgvector import to_vector_literal, from_vector_literal
+from rag.embedding_cache import QueryEmbeddingCache, get_query_embedding_cache, normalize_query
+from rag.semantic_cache import SemanticResultCache, DEFAULT_SEMANTIC_CACHE_THRESHOLD, fetch_knowledge_version
+from rag.score_cache import PairScoreCache, get_pair_score_cache
+from rag.local_index import get_local_index, DEFAULT_LOCAL_INDEX_DIR
+from rag.rerank_improved import cascade_rerank, parse_cascade, format_cascade_report, DEFAULT_RERANK_CASCADE
+from rag.batching import predict_pairs
+from rag.rerank_pool import get_rerank_pool, DEFAULT_RERANK_PROCESSES
+from rag.retrieval_filter import RetrievalFilter
+from rag.mmr import mmr_select, DEFAULT_MMR_POOL_SIZE, DEFAULT_MMR_LAMBDA
+from rag.adaptive_depth import choose_depth, DEFAULT_ADAPTIVE_DEPTH, DEFAULT_DEPTH_FLOOR, DEFAULT_DEPTH_CEILING
+from rag.payload_cache import ChunkPayloadCache, get_chunk_payload_cache
 
 # === CONFIGURATION ===
 
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 
-# Database
-# Remove schema parameter from DATABASE_URL as psycopg2 doesn't support it
-_raw_database_url = os.getenv("DATABASE_URL", "postgresql://tzahimoyal@localhost:5432/talbashanai")
-# Remove ?schema=... from URL if present
-if "?schema=" in _raw_database_url:
-    DATABASE_URL = _raw_database_url.split("?schema=")[0]
-else:
-    DATABASE_URL = _raw_database_url
+# Database: connections come from the process-wide pool in rag/db.py
+# Per-query statement_timeout for retrieval (ms, 0 = no limit)
+DEFAULT_STATEMENT_TIMEOUT_MS = int(os.getenv("RAG_STATEMENT_TIMEOUT_MS", "5000"))
+# Per-query ANN recall/speed knobs (unset = server default); pick values with
+# scripts/optimize_database_index.py, which benchmarks latency + recall@k for each
+DEFAULT_IVFFLAT_PROBES = int(os.environ["RAG_IVFFLAT_PROBES"]) if os.getenv("RAG_IVFFLAT_PROBES") else None
+DEFAULT_HNSW_EF_SEARCH = int(os.environ["RAG_HNSW_EF_SEARCH"]) if os.getenv("RAG_HNSW_EF_SEARCH") else None
+# Type of the knowledge_chunks embedding index ("ivfflat" / "hnsw"): only its settings are
+# sent. Unset = "hnsw" when only RAG_HNSW_EF_SEARCH is given, else "ivfflat"
+DEFAULT_VECTOR_INDEX_TYPE = os.getenv("RAG_VECTOR_INDEX_TYPE") or None
+# Hybrid retrieval: full-text + vector candidates fused with reciprocal-rank fusion
+# (needs the index in scripts/add-hybrid-search-index.sql)
+DEFAULT_HYBRID_RETRIEVAL = os.getenv("RAG_HYBRID_RETRIEVAL", "false").lower() == "true"
+DEFAULT_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Keep chunks tagged metadata.is_general out of retrieval (see rag/retrieval_filter.py)
+DEFAULT_EXCLUDE_GENERAL = os.getenv("RAG_EXCLUDE_GENERAL_CHUNKS", "false").lower() == "true"
+# pgvector >= 0.8 iterative index scans ("strict_order" (HNSW only) / "relaxed_order") so a filtered
+# ANN search keeps scanning until LIMIT rows pass the filter (unset = not sent)
+DEFAULT_ITERATIVE_SCAN = os.getenv("RAG_ITERATIVE_SCAN") or None
+# Ids + distances first, payloads only for rerank candidates, metadata only for the top-N
+DEFAULT_TWO_PHASE_FETCH = os.getenv("RAG_TWO_PHASE_FETCH", "false").lower() == "true"
+# Retrieval SQL as server-side prepared statements, one PREPARE per pooled connection
+# (turn off behind a transaction-mode pgbouncer, which does not keep them per client)
+DEFAULT_PREPARED_STATEMENTS = os.getenv("RAG_PREPARED_STATEMENTS", "true").lower() == "true"
+# Planning time of each retrieval statement in the stage timings (extra EXPLAIN round trip)
+DEFAULT_PLAN_TIMING = os.getenv("RAG_PLAN_TIMING", "false").lower() == "true"
 
 # Models
 EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
@@ -40,6 +70,20 @@ RERANK_MODEL_NAME = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6
 # Default parameters
 DEFAULT_TOP_K_RETRIEVE = 50
 DEFAULT_TOP_N_RERANK = 8
+# answer_stream: candidates scored per partial-rerank event
+DEFAULT_STREAM_RERANK_BATCH = 16
+
+# answer_stream event types (event dicts carry the type under "type")
+EVENT_CANDIDATES = "candidates"      # candidates, retrieve_time
+EVENT_RERANK_BATCH = "rerank_batch"  # scored, total, top_chunks (best so far)
+EVENT_TOP_CHUNKS = "top_chunks"      # chunks, timing
+EVENT_TOKEN = "token"                # text
+EVENT_DONE = "done"                  # answer, chunks, timing
+
+# Dummy query for warmup() (Hebrew, so the tokenizer exercises the same vocabulary as real traffic)
+WARMUP_QUESTION = "מה ההבדל בין תודעה ריאקטיבית לתודעה אקטיבית?"
+# Batch shape of answer_many / evaluation runs
+WARMUP_BATCH_SIZE = 32
 
 
 # === LLM CALL ===
@@ -59,92 +103,555 @@ def call_llm_default(question: str, context_chunks: List[Dict]) -> str:
 
 # === RAG + RE-RANKING ENGINE ===
 
+# Vector retrieval: full rows of the top_k nearest chunks
+VECTOR_SQL = """
+    SELECT
+        id,
+        text,
+        metadata,
+        source,
+        "order",
+        embedding <=> %(vector)s::vector AS distance{embedding_column}
+    FROM knowledge_chunks
+    WHERE embedding IS NOT NULL{retrieval_filter}
+    ORDER BY distance
+    LIMIT %(top_k)s
+"""
+
+# Phase 1 of the phased fetch: ids and distances only (no text / metadata / TOAST reads;
+# embeddings only for MMR)
+PHASE_ONE_SQL = """
+    SELECT id, embedding <=> %(vector)s::vector AS distance{embedding_column}
+    FROM knowledge_chunks
+    WHERE embedding IS NOT NULL{retrieval_filter}
+    ORDER BY distance
+    LIMIT %(top_k)s
+"""
+
+# Hybrid retrieval in one statement: top pool_size by vector distance and top pool_size
+# by full-text rank, fused with RRF (score = sum of 1 / (rrf_k + rank) over both lists).
+# Hebrew has no Postgres dictionary, so the 'simple' config is used; the question's words
+# are OR-ed, skipping 1-2 letter particles (מה, של, את...). to_tsvector('simple', text)
+# must match the GIN index expression in scripts/add-hybrid-search-index.sql.
+HYBRID_SQL = """
+    WITH vector_hits AS (
+        SELECT id, row_number() OVER (ORDER BY distance) AS rank
+        FROM (
+            SELECT id, embedding <=> %(vector)s::vector AS distance
+            FROM knowledge_chunks
+            WHERE embedding IS NOT NULL{vector_filter}
+            ORDER BY distance
+            LIMIT %(pool_size)s
+        ) v
+    ),
+    lexical_query AS (
+        SELECT to_tsquery('simple', string_agg(quote_literal(word), ' | ')) AS query
+        FROM unnest(tsvector_to_array(to_tsvector('simple', %(question)s))) AS word
+        WHERE length(word) > 2
+    ),
+    lexical_hits AS (
+        SELECT id, row_number() OVER (ORDER BY text_rank DESC) AS rank
+        FROM (
+            SELECT c.id, ts_rank_cd(to_tsvector('simple', c.text), q.query) AS text_rank
+            FROM knowledge_chunks c, lexical_query q
+            WHERE to_tsvector('simple', c.text) @@ q.query
+              AND c.embedding IS NOT NULL{lexical_filter}
+            ORDER BY text_rank DESC
+            LIMIT %(pool_size)s
+        ) l
+    ),
+    fused AS (
+        SELECT id, sum(1.0 / (%(rrf_k)s + rank)) AS rrf_score
+        FROM (SELECT * FROM vector_hits UNION ALL SELECT * FROM lexical_hits) hits
+        GROUP BY id
+        ORDER BY rrf_score DESC
+        LIMIT %(top_k)s
+    )
+    SELECT
+        c.id,
+        c.text,
+        c.metadata,
+        c.source,
+        c."order",
+        c.embedding <=> %(vector)s::vector AS distance,
+        f.rrf_score{embedding_column}
+    FROM fused f
+    JOIN knowledge_chunks c ON c.id = f.id
+    ORDER BY f.rrf_score DESC
+"""
+
+
+def _parse_metadata(metadata) -> Dict:
+    return metadata if isinstance(metadata, dict) else json.loads(metadata) if metadata else {}
+
+
+def _candidate_from_row(row) -> Dict:
+    """Build a candidate dict from an (id, text, metadata, source, order, distance[, rrf_score]) row"""
+    id, text, metadata, source, order, distance = row[:6]
+    
+    candidate = {
+        "id": id,
+        "text": text,
+        "metadata": _parse_metadata(metadata),
+        "source": source or "unknown",
+        "chunk_index": order or 0,
+        "order": order or 0,
+        "distance": float(distance)
+    }
+    if len(row) > 6:
+        candidate["rrf_score"] = float(row[6])
+    return candidate
+
+
+def _candidates_from_rows(rows, with_embeddings: bool = False) -> List[Dict]:
+    """
+    Candidate dicts from result rows. with_embeddings: the last column is the chunk
+    embedding (pgvector text from Postgres, numpy from the local index), kept under
+    "embedding" until MMR has used it.
+    """
+    if not with_embeddings:
+        return [_candidate_from_row(row) for row in rows]
+    candidates = []
+    for row in rows:
+        candidate = _candidate_from_row(row[:-1])
+        embedding = row[-1]
+        candidate["embedding"] = from_vector_literal(embedding) if isinstance(embedding, str) else embedding
+        candidates.append(candidate)
+    return candidates
+
+
+# Payload columns of the phased fetch (metadata is added unless two-phase fetch defers it)
+PAYLOAD_FIELDS = ("text", "source", "order")
+
+
+def payload_sql(fields: Tuple[str, ...]) -> str:
+    """Phase 2 of the phased fetch: the given payload columns for a list of ids"""
+    return "SELECT id, " + ", ".join(f'"{field}"' for field in fields) + " FROM knowledge_chunks WHERE id = ANY(%(ids)s)"
+
+
+def _payloads_from_rows(rows, fields: Tuple[str, ...]) -> Dict[str, Dict]:
+    """{id: payload} from payload_sql() rows"""
+    payloads = {}
+    for row in rows:
+        payload = dict(zip(fields, row[1:]))
+        if "metadata" in payload:
+            payload["metadata"] = _parse_metadata(payload["metadata"])
+        payloads[row[0]] = payload
+    return payloads
+
+
+def _candidates_from_hits(hits, with_embeddings: bool = False) -> List[Dict]:
+    """Payload-less candidates from (id, distance[, embedding]) rows (see _fill_payloads)"""
+    candidates = []
+    for hit in hits:
+        candidate = {"id": hit[0], "distance": float(hit[1])}
+        if with_embeddings:
+            embedding = hit[2]
+            candidate["embedding"] = from_vector_literal(embedding) if isinstance(embedding, str) else embedding
+        candidates.append(candidate)
+    return candidates
+
+
+def _fill_payloads(candidates: List[Dict], payloads: Dict[str, Dict]) -> List[Dict]:
+    """Add the fetched payload fields to candidates; rows deleted since phase 1 are dropped"""
+    filled = []
+    for candidate in candidates:
+        payload = payloads.get(candidate["id"])
+        if payload is None:
+            continue
+        candidate["text"] = payload["text"]
+        candidate["source"] = payload["source"] or "unknown"
+        candidate["chunk_index"] = candidate["order"] = payload["order"] or 0
+        if "metadata" in payload:
+            candidate["metadata"] = dict(payload["metadata"])
+        filled.append(candidate)
+    return filled
+
+
+def prewarm_knowledge_chunks(conn) -> Dict[str, int]:
+    """
+    Load knowledge_chunks (heap, TOAST and every index) into shared buffers with pg_prewarm.
+    Returns {relation: blocks loaded}; empty when the extension is not installed.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")
+    if cursor.fetchone() is None:
+        cursor.close()
+        return {}
+    cursor.execute("""
+        SELECT c.relname, pg_prewarm(c.oid)
+        FROM pg_class c
+        WHERE c.oid = 'knowledge_chunks'::regclass
+           OR c.oid = (SELECT reltoastrelid FROM pg_class WHERE oid = 'knowledge_chunks'::regclass)
+           OR c.oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = 'knowledge_chunks'::regclass)
+    """)
+    blocks = {relname: int(count) for relname, count in cursor.fetchall()}
+    cursor.close()
+    return blocks
+
+
 class RagQueryEngine:
     def __init__(
         self,
-        database_url: str = DATABASE_URL,
+        database_url: Optional[str] = DATABASE_URL,
         embedding_model_name: str = EMBEDDING_MODEL_NAME,
         rerank_model_name: str = RERANK_MODEL_NAME,
         top_k_retrieve: int = DEFAULT_TOP_K_RETRIEVE,
         top_n_rerank: int = DEFAULT_TOP_N_RERANK,
+        statement_timeout_ms: int = DEFAULT_STATEMENT_TIMEOUT_MS,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        semantic_cache_threshold: Optional[float] = DEFAULT_SEMANTIC_CACHE_THRESHOLD,
+        score_cache: Optional[PairScoreCache] = None,
+        local_index_dir: Optional[str] = DEFAULT_LOCAL_INDEX_DIR,
+        ivfflat_probes: Optional[int] = DEFAULT_IVFFLAT_PROBES,
+        hnsw_ef_search: Optional[int] = DEFAULT_HNSW_EF_SEARCH,
+        index_type: Optional[str] = DEFAULT_VECTOR_INDEX_TYPE,
+        rerank_cascade: Optional[str] = DEFAULT_RERANK_CASCADE,
+        rerank_processes: int = DEFAULT_RERANK_PROCESSES,
+        hybrid: bool = DEFAULT_HYBRID_RETRIEVAL,
+        rrf_k: int = DEFAULT_RRF_K,
+        retrieval_filter: Optional[RetrievalFilter] = None,
+        iterative_scan: Optional[str] = DEFAULT_ITERATIVE_SCAN,
+        mmr_pool_size: int = DEFAULT_MMR_POOL_SIZE,
+        mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+        adaptive_depth: bool = DEFAULT_ADAPTIVE_DEPTH,
+        depth_floor: int = DEFAULT_DEPTH_FLOOR,
+        depth_ceiling: int = DEFAULT_DEPTH_CEILING,
+        two_phase_fetch: bool = DEFAULT_TWO_PHASE_FETCH,
+        payload_cache: Optional[ChunkPayloadCache] = None,
+        prepared_statements: bool = DEFAULT_PREPARED_STATEMENTS,
+        plan_timing: bool = DEFAULT_PLAN_TIMING,
     ):
-        print(f"📥 Connecting to PostgreSQL...")
-        self.conn = psycopg2.connect(database_url)
-        print("✅ Connected to database")
+        # Connections are checked out per query from the shared, thread-safe pool
+        # database_url=None skips the database (models only, e.g. for AsyncRagQueryEngine)
+        self.pool = get_pool(database_url) if database_url else None
+        self.statement_timeout_ms = statement_timeout_ms
+        
+        # SET LOCAL prefix sent with the retrieval query (same round trip, scoped to its transaction)
+        # Only the configured index type's settings: the other type's GUCs do nothing
+        # (and are not even defined until that access method has been loaded)
+        if index_type is None:
+            index_type = "hnsw" if hnsw_ef_search is not None and ivfflat_probes is None else "ivfflat"
+        if index_type not in ("ivfflat", "hnsw"):
+            raise ValueError(f"Unknown vector index type: {index_type}")
+        if index_type == "ivfflat" and hnsw_ef_search is not None:
+            raise ValueError("hnsw_ef_search is set but the vector index type is ivfflat (RAG_VECTOR_INDEX_TYPE)")
+        if index_type == "hnsw" and ivfflat_probes is not None:
+            raise ValueError("ivfflat_probes is set but the vector index type is hnsw (RAG_VECTOR_INDEX_TYPE)")
+        self.index_type = index_type
+        index_settings = []
+        if ivfflat_probes is not None:
+            index_settings.append(f"SET LOCAL ivfflat.probes = {int(ivfflat_probes)};")
+        if hnsw_ef_search is not None:
+            index_settings.append(f"SET LOCAL hnsw.ef_search = {int(hnsw_ef_search)};")
+        
+        # Metadata filter compiled once into WHERE conditions (None / empty = every row)
+        if retrieval_filter is None and DEFAULT_EXCLUDE_GENERAL:
+            retrieval_filter = RetrievalFilter(exclude_general=True)
+        self.retrieval_filter = retrieval_filter if retrieval_filter and not retrieval_filter.is_empty() else None
+        if self.retrieval_filter is not None:
+            self.filter_sql, self.filter_params = self.retrieval_filter.sql()
+            self.filter_sql_aliased, _ = self.retrieval_filter.sql(alias="c.")
+            if iterative_scan is not None:
+                # IVFFlat only has relaxed_order; strict_order is rejected rather than
+                # silently relaxed (adaptive depth relies on ascending distances)
+                modes = ("strict_order", "relaxed_order") if index_type == "hnsw" else ("relaxed_order",)
+                if iterative_scan not in modes:
+                    raise ValueError(f"Iterative scan mode {iterative_scan!r} is not supported by {index_type} (use one of {modes})")
+                index_settings.append(f"SET LOCAL {index_type}.iterative_scan = {iterative_scan};")
+        else:
+            self.filter_sql, self.filter_params, self.filter_sql_aliased = "", {}, ""
+        self.index_settings_sql = " ".join(index_settings)
+        
+        # Retrieval statements are PREPAREd once per pooled connection and then only
+        # EXECUTEd (see ConnectionPool.execute). plan_timing adds each statement's
+        # planning time to the stage timings as retrieve_plan_ms.
+        self.prepared_statements = prepared_statements
+        self.plan_timing = plan_timing
+        self._plan_times = threading.local()
         
         # Use cached models for better performance
+        # *_model_name include the backend when it is not torch (keys for the embedding/score caches)
+        self.embedding_model_name = backend_cache_key(embedding_model_name)
         self.embed_model = get_embedding_model(embedding_model_name)
-        self.rerank_model = get_rerank_model(rerank_model_name)
+        # Cascade reranking for every rerank path, e.g. "fast:15,best" (None = single rerank model)
+        self.rerank_cascade = parse_cascade(rerank_cascade) if rerank_cascade else None
+        # rerank_processes > 0: score in worker processes (rag/rerank_pool.py), same predict() API.
+        # With a cascade the stage models do the scoring (in-process, see cascade_rerank),
+        # so the single rerank model / process pool is not loaded at all.
+        if self.rerank_cascade is not None:
+            self.rerank_model = None
+        elif rerank_processes > 0:
+            self.rerank_model = get_rerank_pool(rerank_model_name, processes=rerank_processes)
+        else:
+            self.rerank_model = get_rerank_model(rerank_model_name)
+        self.rerank_model_name = backend_cache_key(RERANK_MODEL_ALIASES.get(rerank_model_name, rerank_model_name))
         
         self.top_k_retrieve = top_k_retrieve
         self.top_n_rerank = top_n_rerank
         
+        # Lexical + vector candidates fused with RRF (database retrieval only; the
+        # local index is vector-only). The fused pool is still top_k_retrieve long.
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        
+        # MMR between retrieval and rerank: the top_k_retrieve candidates (fetched with
+        # their embeddings) are cut to mmr_pool_size distinct ones (0 = disabled)
+        self.mmr_pool_size = mmr_pool_size if 0 < mmr_pool_size < top_k_retrieve else 0
+        self.mmr_lambda = mmr_lambda
+        self.embedding_sql = ", embedding" if self.mmr_pool_size else ""
+        self.embedding_sql_aliased = ", c.embedding" if self.mmr_pool_size else ""
+        
+        # Retrieval statements with this engine's filter / embedding columns filled in
+        # (AsyncRagQueryEngine runs the same ones)
+        self.vector_sql = VECTOR_SQL.format(embedding_column=self.embedding_sql, retrieval_filter=self.filter_sql)
+        self.phase_one_sql = PHASE_ONE_SQL.format(embedding_column=self.embedding_sql, retrieval_filter=self.filter_sql)
+        self.hybrid_sql = HYBRID_SQL.format(
+            vector_filter=self.filter_sql,
+            lexical_filter=self.filter_sql_aliased,
+            embedding_column=self.embedding_sql_aliased,
+        )
+        
+        # Adaptive depth (vector retrieval; hybrid keeps its fixed pool): (id, distance)
+        # for depth_ceiling rows first, the rerank pool size from their distance curve
+        # (rag/adaptive_depth.py), then payloads for only that many rows
+        self.adaptive_depth = adaptive_depth
+        self.depth_floor = depth_floor
+        self.depth_ceiling = depth_ceiling or top_k_retrieve
+        
+        # Two-phase fetch (vector retrieval; hybrid and the local index return full rows):
+        # text/source/order only for the candidates entering rerank, metadata only for
+        # the final top-N. Adaptive depth uses the same phased path with full payloads.
+        # Hot chunks are served from the shared payload cache (rag/payload_cache.py). It polls
+        # the knowledge version every RAG_PAYLOAD_CACHE_VERSION_CHECK_INTERVAL seconds (30 by
+        # default), so re-ingested chunks can keep their old payloads for that long; set it to
+        # 0 where ingest and queries share a process and must see new payloads immediately.
+        self.two_phase_fetch = two_phase_fetch
+        self.phased_fetch = (two_phase_fetch or adaptive_depth) and self.pool is not None
+        self.phase_one_depth = self.depth_ceiling if adaptive_depth else top_k_retrieve
+        self.payload_fields = PAYLOAD_FIELDS if two_phase_fetch else PAYLOAD_FIELDS + ("metadata",)
+        self.payload_cache = payload_cache if payload_cache is not None else get_chunk_payload_cache()
+        
+        # Repeated questions skip the embedding model (shared process-wide by default)
+        self.query_cache = query_cache if query_cache is not None else get_query_embedding_cache()
+        
+        # Near-duplicate questions reuse a previous reranked top-N (None = disabled)
+        self.semantic_cache = (
+            SemanticResultCache(threshold=semantic_cache_threshold)
+            if semantic_cache_threshold is not None and self.pool is not None
+            else None
+        )
+        
+        # Cross-encoder scores per (model, query, chunk content) - only new pairs hit predict()
+        self.score_cache = score_cache if score_cache is not None else get_pair_score_cache()
+        
+        # Optional in-process mirror of knowledge_chunks (mmap snapshot, synced from the DB),
+        # shared by every engine using the same directory
+        self.local_index = (
+            get_local_index(local_index_dir)
+            if local_index_dir and self.pool is not None
+            else None
+        )
+        
         print("✅ RagQueryEngine initialized.")
 
-    def retrieve_candidates(self, question: str) -> List[Dict]:
-        """
-        שלב 1: Vector search ראשוני -> מחזיר רשימת candidates מ-PostgreSQL
-        """
-        cursor = self.conn.cursor()
-        
-        # Generate query embedding (optimized: use show_progress_bar=False for speed)
-        q_emb = self.embed_model.encode(
+    def embed_query(self, question: str):
+        """Encode a single query into its embedding vector (numpy, cached per model + query)"""
+        return self.query_cache.get_or_compute(self.embedding_model_name, question, self._encode_query)
+
+    def _encode_query(self, question: str):
+        # Optimized: use show_progress_bar=False for speed
+        return self.embed_model.encode(
             [question], 
             convert_to_numpy=True,
             show_progress_bar=False,
             batch_size=1
         )[0]
-        embedding_str = '[' + ','.join(map(str, q_emb.tolist())) + ']'
+
+    def retrieve_candidates(self, question: str) -> List[Dict]:
+        """
+        שלב 1: Vector search ראשוני -> מחזיר רשימת candidates מ-PostgreSQL
+        """
+        return self._retrieve_by_embedding(self.embed_query(question), question)
+
+    def _retrieve_by_embedding(self, q_emb, question: Optional[str] = None) -> List[Dict]:
+        if self.local_index is not None:
+            self.local_index.refresh(self.pool)
+            return self._diversify(q_emb, self._search_local_index(q_emb))
+        
+        if self.phased_fetch and not (self.hybrid and question):
+            # Depth cut and MMR run on the (id, distance) hits, before any payload is read
+            return self.pool.run(
+                lambda conn: self._fetch_candidates_phased(conn, q_emb),
+                statement_timeout_ms=self.statement_timeout_ms,
+            )
+        
+        embedding_str = to_vector_literal(q_emb)
+        candidates = self.pool.run(
+            lambda conn: self._fetch_candidates(conn, embedding_str, question),
+            statement_timeout_ms=self.statement_timeout_ms,
+        )
+        return self._diversify(q_emb, candidates)
+
+    def _search_local_index(self, q_emb) -> List[Dict]:
+        top_k = self.depth_ceiling if self.adaptive_depth else self.top_k_retrieve
+        rows = self.local_index.search(
+            q_emb, top_k, self._local_row_filter(), with_embeddings=bool(self.mmr_pool_size)
+        )
+        if self.adaptive_depth:
+            rows = self._cut_to_depth(rows, distance_column=5)
+        return _candidates_from_rows(rows, bool(self.mmr_pool_size))
+
+    def _cut_to_depth(self, hits: List[Tuple], distance_column: int = 1) -> List[Tuple]:
+        """Keep the first choose_depth() hits (nearest first)"""
+        depth, method = choose_depth([h[distance_column] for h in hits], self.depth_floor, self.depth_ceiling)
+        print(f"📏 Adaptive depth: {depth} of {len(hits)} candidates ({method})")
+        return hits[:depth]
+
+    def _diversify(self, q_emb, candidates: List[Dict]) -> List[Dict]:
+        """MMR-select mmr_pool_size of the candidates (near-duplicate chunks are dropped); strips the embeddings"""
+        if not self.mmr_pool_size:
+            return candidates
+        embeddings = [c.pop("embedding") for c in candidates]
+        if len(candidates) <= self.mmr_pool_size:
+            return candidates
+        selected = mmr_select(q_emb, embeddings, self.mmr_pool_size, self.mmr_lambda)
+        return [candidates[i] for i in selected]
+
+    def _local_row_filter(self):
+        if self.retrieval_filter is None:
+            return None
+        return lambda record: self.retrieval_filter.matches(record)
+
+    def _execute(self, cursor, sql: str, params: Dict, index_settings: bool = True):
+        """Run a retrieval statement (prepared when enabled), after the SET LOCAL index settings"""
+        self.pool.execute(
+            cursor,
+            sql,
+            params,
+            prefix=self.index_settings_sql if index_settings else "",
+            prepare=self.prepared_statements,
+            plan_times=getattr(self._plan_times, "values", None),
+        )
+
+    def _start_plan_timing(self) -> Optional[List[float]]:
+        """Collect planning times (ms) of this thread's next statements; None when plan_timing is off"""
+        self._plan_times.values = [] if self.plan_timing else None
+        return self._plan_times.values
+
+    def _stop_plan_timing(self, timing_info: Optional[Dict]):
+        plan_times = getattr(self._plan_times, "values", None)
+        self._plan_times.values = None
+        if plan_times is not None and timing_info is not None:
+            timing_info["retrieve_plan_ms"] = sum(plan_times)
+            timing_info["prepared_statements"] = self.prepared_statements
+
+    def _fetch_candidates(self, conn, embedding_str: str, question: Optional[str] = None) -> List[Dict]:
+        if self.hybrid and question:
+            return self._fetch_candidates_hybrid(conn, embedding_str, question)
+        cursor = conn.cursor()
         
         # Search in PostgreSQL (optimized for vector search)
         # Using EXPLAIN to ensure index is used, and limiting work_mem if needed
         # Note: The ivfflat index should be used automatically for vector similarity search
-        cursor.execute("""
-            SELECT 
-                id,
-                text,
-                metadata,
-                source,
-                "order",
-                embedding <=> %s::vector AS distance
-            FROM knowledge_chunks
-            WHERE embedding IS NOT NULL
-            ORDER BY embedding <=> %s::vector
-            LIMIT %s
-        """, (embedding_str, embedding_str, self.top_k_retrieve))
+        # The query vector is bound once: ORDER BY the distance column (same expression,
+        # so the index still provides the ordering)
+        # Metadata filters go into the WHERE clause (partial / GIN indexes, see RetrievalFilter)
+        self._execute(cursor, self.vector_sql, {"vector": embedding_str, "top_k": self.top_k_retrieve, **self.filter_params})
         
-        candidates: List[Dict] = []
-        for row in cursor.fetchall():
-            id, text, metadata, source, order, distance = row
-            metadata_dict = metadata if isinstance(metadata, dict) else json.loads(metadata) if metadata else {}
-            
-            candidates.append({
-                "id": id,
-                "text": text,
-                "metadata": metadata_dict,
-                "source": source or "unknown",
-                "chunk_index": order or 0,
-                "order": order or 0,
-                "distance": float(distance)
-            })
+        candidates = _candidates_from_rows(cursor.fetchall(), bool(self.mmr_pool_size))
         
         cursor.close()
         return candidates
 
+    def _fetch_candidates_phased(self, conn, q_emb) -> List[Dict]:
+        cursor = conn.cursor()
+        # Phase 1: ids and distances only (no text / metadata / TOAST reads; embeddings only for MMR)
+        self._execute(cursor, self.phase_one_sql, {
+            "vector": to_vector_literal(q_emb), "top_k": self.phase_one_depth, **self.filter_params
+        })
+        candidates = self._select_hits(q_emb, cursor.fetchall())
+        # Phase 2: payloads for the candidates entering rerank
+        payloads = self._load_payloads(conn, cursor, [c["id"] for c in candidates], self.payload_fields)
+        cursor.close()
+        return _fill_payloads(candidates, payloads)
+
+    def _select_hits(self, q_emb, hits: List[Tuple]) -> List[Dict]:
+        """Adaptive depth cut, then MMR, on (id, distance[, embedding]) hits"""
+        if self.adaptive_depth:
+            hits = self._cut_to_depth(hits)
+        return self._diversify(q_emb, _candidates_from_hits(hits, bool(self.mmr_pool_size)))
+
+    def _load_payloads(self, conn, cursor, ids: List, fields: Tuple[str, ...]) -> Dict[str, Dict]:
+        """{id: payload} for ids: hot chunks from the payload cache, the rest in one query"""
+        if not ids:
+            return {}
+        self.payload_cache.refresh(lambda: fetch_knowledge_version(conn))
+        payloads, missing = self.payload_cache.lookup(list(dict.fromkeys(ids)), fields)
+        if missing:
+            payloads.update(self._fetch_payloads(cursor, missing, fields))
+        return payloads
+
+    def _fetch_payloads(self, cursor, ids: List, fields: Tuple[str, ...]) -> Dict[str, Dict]:
+        self._execute(cursor, payload_sql(fields), {"ids": ids}, index_settings=False)
+        fetched = _payloads_from_rows(cursor.fetchall(), fields)
+        self.payload_cache.store(fetched)
+        return fetched
+
+    def _attach_metadata(self, chunks: List[Dict]):
+        """Phase 3 of two-phase fetch: metadata for the final chunks only (in place, cache first)"""
+        pending = [c for c in chunks if "metadata" not in c]
+        if not pending:
+            return
+        payloads, missing = self.payload_cache.lookup(list(dict.fromkeys(c["id"] for c in pending)), ("metadata",))
+        if missing and self.pool is not None:
+            def fetch(conn):
+                cursor = conn.cursor()
+                fetched = self._fetch_payloads(cursor, missing, ("metadata",))
+                cursor.close()
+                return fetched
+            payloads.update(self.pool.run(fetch, statement_timeout_ms=self.statement_timeout_ms))
+        for chunk in pending:
+            payload = payloads.get(chunk["id"])
+            chunk["metadata"] = dict(payload["metadata"]) if payload else {}
+
+    def _fetch_candidates_hybrid(self, conn, embedding_str: str, question: str) -> List[Dict]:
+        cursor = conn.cursor()
+        self._execute(cursor, self.hybrid_sql, {
+            "vector": embedding_str,
+            "question": question,
+            "pool_size": self.top_k_retrieve,
+            "rrf_k": self.rrf_k,
+            "top_k": self.top_k_retrieve,
+            **self.filter_params,
+        })
+        candidates = _candidates_from_rows(cursor.fetchall(), bool(self.mmr_pool_size))
+        cursor.close()
+        return candidates
+
     def rerank(self, question: str, candidates: List[Dict]) -> List[Dict]:
         """
         שלב 2: Re-ranking עם CrossEncoder
         """
-        if not candidates:
-            return []
+        return self.rerank_with_report(question, candidates)[0]
 
-        # Prepare pairs for CrossEncoder
-        pairs = [[question, c["text"]] for c in candidates]
+    def rerank_with_report(self, question: str, candidates: List[Dict]) -> Tuple[List[Dict], Optional[List[Dict]]]:
+        """Re-rank and return (top chunks, per-stage cascade report or None)"""
+        if not candidates:
+            return [], None
         
-        # Get scores from CrossEncoder (optimized: batch processing, no progress bar)
-        scores = self.rerank_model.predict(
-            pairs,
-            show_progress_bar=False,
+        if self.rerank_cascade is not None:
+            top_chunks, report = cascade_rerank(question, candidates, self.top_n_rerank, self.rerank_cascade)
+            print("🪜 Rerank cascade:\n" + format_cascade_report(report))
+            self._attach_metadata(top_chunks)
+            return top_chunks, report
+
+        # Get scores from CrossEncoder (cached pairs are reused, the rest are batch-predicted)
+        scores = self.score_cache.score(
+            self.rerank_model,
+            self.rerank_model_name,
+            question,
+            candidates,
             batch_size=32  # Process in batches for better performance
         )
 
@@ -154,8 +661,10 @@ class RagQueryEngine:
 
         # Sort by rerank score (descending)
         candidates_sorted = sorted(candidates, key=lambda x: x["rerank_score"], reverse=True)
+        top_chunks = candidates_sorted[: self.top_n_rerank]
+        self._attach_metadata(top_chunks)
         
-        return candidates_sorted[: self.top_n_rerank]
+        return top_chunks, None
 
     def answer(
         self,
@@ -183,20 +692,73 @@ class RagQueryEngine:
         if not search_query.strip():
             return "שאלה ריקה.", [], timing_info
 
+        # Semantic cache: a near-duplicate question skips retrieval and re-ranking
+        cached_chunks = None
+        if self.semantic_cache is not None:
+            self.semantic_cache.refresh(lambda: self.pool.run(fetch_knowledge_version))
+            q_emb = self.embed_query(search_query)
+            cached_chunks = self.semantic_cache.lookup(q_emb)
+        
+        if cached_chunks:
+            print(f"♻️  Semantic cache hit - reusing top {len(cached_chunks)} chunks")
+            top_chunks = cached_chunks
+            if measure_time:
+                timing_info.update({
+                    "retrieve_time": 0.0,
+                    "rerank_time": 0.0,
+                    "num_candidates": 0,
+                    "num_final_chunks": len(top_chunks),
+                    "total_chunks_time": 0.0,
+                    "semantic_cache_hit": True,
+                })
+        else:
+            top_chunks = self._retrieve_and_rerank(search_query, timing_info)
+            if top_chunks is None:
+                return "לא נמצאו קטעים רלוונטיים במסמכים.", [], timing_info
+            if self.semantic_cache is not None:
+                self.semantic_cache.store(q_emb, top_chunks)
+        
+        if not top_chunks:
+            return "לא הצלחתי לדרג קטעים רלוונטיים.", [], timing_info
+
+        # Measure LLM time (optional)
+        if measure_time:
+            start_llm = time.time()
+        
+        print(f"🧠 Calling LLM with top {len(top_chunks)} chunks...")
+        # Use question (current question only) for LLM
+        answer = llm_callable(question, top_chunks)
+        
+        if measure_time:
+            timing_info["llm_time"] = time.time() - start_llm
+            timing_info["total_time"] = timing_info["total_chunks_time"] + timing_info["llm_time"]
+        
+        return answer, top_chunks, timing_info
+
+    def _retrieve_and_rerank(self, search_query: str, timing_info: Optional[Dict]) -> Optional[List[Dict]]:
+        """Retrieve + re-rank; returns None when retrieval found nothing"""
+        measure_time = timing_info is not None
+        
         # Measure retrieval time
         if measure_time:
             start_retrieve = time.time()
         
         print("🔍 Retrieving candidates...")
         # Use search_query (with history) for better retrieval
-        candidates = self.retrieve_candidates(search_query)
+        if measure_time:
+            self._start_plan_timing()
+        try:
+            candidates = self.retrieve_candidates(search_query)
+        finally:
+            if measure_time:
+                self._stop_plan_timing(timing_info)
         
         if measure_time:
             timing_info["retrieve_time"] = time.time() - start_retrieve
             timing_info["num_candidates"] = len(candidates)
         
         if not candidates:
-            return "לא נמצאו קטעים רלוונטיים במסמכים.", [], timing_info
+            return None
 
         # Measure rerank time
         if measure_time:
@@ -204,34 +766,399 @@ class RagQueryEngine:
         
         print(f"🔍 Retrieved {len(candidates)} candidates. Re-ranking...")
         # Use search_query (with history) for better reranking
-        top_chunks = self.rerank(search_query, candidates)
+        top_chunks, cascade_report = self.rerank_with_report(search_query, candidates)
         
         if measure_time:
             timing_info["rerank_time"] = time.time() - start_rerank
+            if cascade_report is not None:
+                timing_info["rerank_stages"] = cascade_report
             timing_info["num_final_chunks"] = len(top_chunks)
             timing_info["total_chunks_time"] = timing_info["retrieve_time"] + timing_info["rerank_time"]
         
+        return top_chunks
+
+    def answer_stream(
+        self,
+        search_query: str = None,
+        question: str = None,
+        llm_stream=None,
+        rerank_batch_size: int = DEFAULT_STREAM_RERANK_BATCH,
+    ) -> Iterator[Dict]:
+        """
+        הצינור המלא כ-generator: מחזיר אירועים (dict עם "type") ברגע שכל שלב מסתיים
+        candidates -> rerank_batch (לכל batch) -> top_chunks -> token... -> done
+
+        Args:
+            llm_stream: callable(question, chunks) -> iterable of text tokens.
+                        None = stop after top_chunks (the caller runs the LLM, e.g. the TS route)
+        """
+        try:
+            yield from self._answer_stream(search_query, question, llm_stream, rerank_batch_size)
+        finally:
+            # Also reached through GeneratorExit when the consumer abandons the stream
+            # (client disconnect): this thread's plan timing must not leak into its next request
+            self._stop_plan_timing(None)
+
+    def _answer_stream(self, search_query, question, llm_stream, rerank_batch_size) -> Iterator[Dict]:
+        if question is None:
+            question = search_query
+        if search_query is None:
+            search_query = question
+
+        timing_info = {}
+        if not search_query.strip():
+            yield {"type": EVENT_DONE, "answer": "שאלה ריקה.", "chunks": [], "timing": timing_info}
+            return
+
+        # Semantic cache: a near-duplicate question goes straight to top_chunks
+        top_chunks = None
+        if self.semantic_cache is not None:
+            self.semantic_cache.refresh(lambda: self.pool.run(fetch_knowledge_version))
+            q_emb = self.embed_query(search_query)
+            top_chunks = self.semantic_cache.lookup(q_emb)
+            timing_info["semantic_cache_hit"] = bool(top_chunks)
+
         if not top_chunks:
-            return "לא הצלחתי לדרג קטעים רלוונטיים.", [], timing_info
+            start = time.time()
+            self._start_plan_timing()
+            try:
+                candidates = self.retrieve_candidates(search_query)
+            finally:
+                self._stop_plan_timing(timing_info)
+            timing_info["retrieve_time"] = time.time() - start
+            timing_info["num_candidates"] = len(candidates)
+            yield {"type": EVENT_CANDIDATES, "candidates": candidates, "retrieve_time": timing_info["retrieve_time"]}
 
-        # Measure LLM time (optional)
-        if measure_time:
-            start_llm = time.time()
-        
-        print(f"🧠 Calling LLM with top {len(top_chunks)} chunks...")
-        # Use question (current question only) for LLM
-        answer = llm_callable(question, top_chunks)
-        
-        if measure_time:
-            timing_info["llm_time"] = time.time() - start_llm
+            if not candidates:
+                yield {"type": EVENT_DONE, "answer": "לא נמצאו קטעים רלוונטיים במסמכים.", "chunks": [], "timing": timing_info}
+                return
+
+            start = time.time()
+            if self.rerank_cascade is not None:
+                # Each stage only scores the previous stage's survivors, so there is no
+                # best-so-far top-N to stream: one batch event once the cascade is done
+                top_chunks, cascade_report = self.rerank_with_report(search_query, candidates)
+                timing_info["rerank_stages"] = cascade_report
+                yield {"type": EVENT_RERANK_BATCH, "scored": len(candidates), "total": len(candidates), "top_chunks": top_chunks}
+            else:
+                # Re-rank in slices; after each slice the best-so-far top-N is already usable
+                scored = []
+                for offset in range(0, len(candidates), rerank_batch_size):
+                    batch = candidates[offset:offset + rerank_batch_size]
+                    scores = self.score_cache.score(
+                        self.rerank_model, self.rerank_model_name, search_query, batch, batch_size=rerank_batch_size
+                    )
+                    for c, s in zip(batch, scores):
+                        c["rerank_score"] = float(s)
+                    scored.extend(batch)
+                    top_chunks = sorted(scored, key=lambda x: x["rerank_score"], reverse=True)[: self.top_n_rerank]
+                    yield {"type": EVENT_RERANK_BATCH, "scored": len(scored), "total": len(candidates), "top_chunks": top_chunks}
+                self._attach_metadata(top_chunks)
+            timing_info["rerank_time"] = time.time() - start
+
+            if self.semantic_cache is not None:
+                self.semantic_cache.store(q_emb, top_chunks)
+
+        timing_info["num_final_chunks"] = len(top_chunks)
+        timing_info["total_chunks_time"] = timing_info.get("retrieve_time", 0.0) + timing_info.get("rerank_time", 0.0)
+        yield {"type": EVENT_TOP_CHUNKS, "chunks": top_chunks, "timing": timing_info}
+
+        answer = None
+        if llm_stream is not None:
+            start = time.time()
+            tokens = []
+            for token in llm_stream(question, top_chunks):
+                tokens.append(token)
+                yield {"type": EVENT_TOKEN, "text": token}
+            answer = "".join(tokens)
+            timing_info["llm_time"] = time.time() - start
             timing_info["total_time"] = timing_info["total_chunks_time"] + timing_info["llm_time"]
-        
-        return answer, top_chunks, timing_info
+
+        yield {"type": EVENT_DONE, "answer": answer, "chunks": top_chunks, "timing": timing_info}
+
+    # === BATCH API (evaluation / offline runs) ===
+
+    def embed_queries(self, questions: List[str]) -> List:
+        """Embeddings for many queries: cached ones are reused, the rest are encoded in one call"""
+        embeddings = [self.query_cache.get(self.embedding_model_name, q) for q in questions]
+        # Encode the normalized text: that is what the cache keys on
+        missing = list(dict.fromkeys(normalize_query(q) for q, emb in zip(questions, embeddings) if emb is None))
+        if missing:
+            encoded = self.embed_model.encode(
+                missing,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                batch_size=32
+            )
+            fresh = {q: self.query_cache.put(self.embedding_model_name, q, emb) for q, emb in zip(missing, encoded)}
+            embeddings = [emb if emb is not None else fresh[normalize_query(q)] for q, emb in zip(questions, embeddings)]
+        return embeddings
+
+    def retrieve_candidates_many(self, questions: List[str]) -> List[List[Dict]]:
+        """
+        שלב 1 (batch): candidates לכל שאלה - embedding אחד, שאילתת SQL אחת
+        """
+        if not questions:
+            return []
+        q_embs = self.embed_queries(questions)
+
+        if self.local_index is not None:
+            self.local_index.refresh(self.pool)
+            candidates_lists = [self._search_local_index(q_emb) for q_emb in q_embs]
+        elif self.phased_fetch and not self.hybrid:
+            # Depth cut and MMR already ran per question on the (id, distance) hits
+            return self.pool.run(
+                lambda conn: self._fetch_candidates_many_phased(conn, q_embs),
+                statement_timeout_ms=self.statement_timeout_ms * len(questions),
+            )
+        else:
+            embedding_strs = [to_vector_literal(q_emb) for q_emb in q_embs]
+            if self.hybrid:
+                # One hybrid statement per question, all on the same connection
+                fetch = lambda conn: [self._fetch_candidates_hybrid(conn, e, q) for e, q in zip(embedding_strs, questions)]
+            else:
+                fetch = lambda conn: self._fetch_candidates_many(conn, embedding_strs)
+            candidates_lists = self.pool.run(fetch, statement_timeout_ms=self.statement_timeout_ms * len(questions))
+        return [self._diversify(q_emb, candidates) for q_emb, candidates in zip(q_embs, candidates_lists)]
+
+    def _fetch_candidates_many(self, conn, embedding_strs: List[str]) -> List[List[Dict]]:
+        cursor = conn.cursor()
+
+        # One statement for all questions: LATERAL top-k per query vector
+        # (each inner query is an ordinary index-ordered scan)
+        self._execute(cursor, """
+            SELECT
+                q.ord,
+                c.id,
+                c.text,
+                c.metadata,
+                c.source,
+                c."order",
+                c.distance""" + self.embedding_sql_aliased + """
+            FROM unnest(%(vectors)s::text[]) WITH ORDINALITY AS q(vec, ord)
+            CROSS JOIN LATERAL (
+                SELECT
+                    id,
+                    text,
+                    metadata,
+                    source,
+                    "order",
+                    embedding <=> q.vec::vector AS distance""" + self.embedding_sql + """
+                FROM knowledge_chunks
+                WHERE embedding IS NOT NULL""" + self.filter_sql + """
+                ORDER BY distance
+                LIMIT %(top_k)s
+            ) c
+            ORDER BY q.ord, c.distance
+        """, {"vectors": embedding_strs, "top_k": self.top_k_retrieve, **self.filter_params})
+
+        rows_by_query: List[List] = [[] for _ in embedding_strs]
+        for row in cursor.fetchall():
+            rows_by_query[row[0] - 1].append(row[1:])
+        results = [_candidates_from_rows(rows, bool(self.mmr_pool_size)) for rows in rows_by_query]
+
+        cursor.close()
+        return results
+
+    def _fetch_candidates_many_phased(self, conn, q_embs: List) -> List[List[Dict]]:
+        cursor = conn.cursor()
+
+        # Phase 1: LATERAL (id, distance) per query vector; then depth cut + MMR per question
+        self._execute(cursor, """
+            SELECT q.ord, c.id, c.distance""" + self.embedding_sql_aliased + """
+            FROM unnest(%(vectors)s::text[]) WITH ORDINALITY AS q(vec, ord)
+            CROSS JOIN LATERAL (
+                SELECT id, embedding <=> q.vec::vector AS distance""" + self.embedding_sql + """
+                FROM knowledge_chunks
+                WHERE embedding IS NOT NULL""" + self.filter_sql + """
+                ORDER BY distance
+                LIMIT %(top_k)s
+            ) c
+            ORDER BY q.ord, c.distance
+        """, {
+            "vectors": [to_vector_literal(q_emb) for q_emb in q_embs],
+            "top_k": self.phase_one_depth,
+            **self.filter_params,
+        })
+
+        hits_by_query: List[List] = [[] for _ in q_embs]
+        for row in cursor.fetchall():
+            hits_by_query[row[0] - 1].append(row[1:])
+        candidates_lists = [self._select_hits(q_emb, hits) for q_emb, hits in zip(q_embs, hits_by_query)]
+
+        # Phase 2: one payload fetch for every question's surviving ids
+        payloads = self._load_payloads(
+            conn, cursor, [c["id"] for candidates in candidates_lists for c in candidates], self.payload_fields
+        )
+        cursor.close()
+        return [_fill_payloads(candidates, payloads) for candidates in candidates_lists]
+
+    def rerank_many(self, questions: List[str], candidates_lists: List[List[Dict]]) -> List[List[Dict]]:
+        """
+        שלב 2 (batch): Re-ranking לכל השאלות - כל הזוגות החסרים ב-batches משותפים של ה-CrossEncoder
+        (with a rerank cascade: the same cascade as rerank(), question by question)
+        """
+        if self.rerank_cascade is not None:
+            return [self.rerank(question, candidates) for question, candidates in zip(questions, candidates_lists)]
+
+        all_scores = self.score_cache.score_many(
+            self.rerank_model,
+            self.rerank_model_name,
+            list(zip(questions, candidates_lists)),
+            batch_size=32
+        )
+
+        results = []
+        for candidates, scores in zip(candidates_lists, all_scores):
+            for c, s in zip(candidates, scores):
+                c["rerank_score"] = float(s)
+            candidates_sorted = sorted(candidates, key=lambda x: x["rerank_score"], reverse=True)
+            results.append(candidates_sorted[: self.top_n_rerank])
+        self._attach_metadata([chunk for top_chunks in results for chunk in top_chunks])
+        return results
+
+    def answer_many(
+        self,
+        questions: List[str],
+        search_queries: Optional[List[str]] = None,
+        llm_callable=None,
+        measure_time: bool = False,
+    ) -> List[Tuple[Optional[str], List[Dict], Optional[Dict]]]:
+        """
+        הצינור המלא עבור הרבה שאלות: encode אחד, SQL אחד, re-ranking ב-batches משותפים
+        מחזיר רשימה של (תשובה, מקורות, זמנים) - כמו answer() לכל שאלה.
+
+        Args:
+            questions: השאלות (נשלחות ל-LLM)
+            search_queries: שאילתות החיפוש (ברירת מחדל: questions)
+            llm_callable: אם None - מחזיר רק chunks (answer=None), לשימוש בהערכה
+
+        Timing is measured for the whole batch; each question's timing_info holds its
+        share (batch time / number of questions) plus "batch_size".
+        """
+        if search_queries is None:
+            search_queries = questions
+        if not questions:
+            return []
+
+        start = time.time()
+        plan_timing: Dict = {}
+        if measure_time:
+            self._start_plan_timing()
+        try:
+            candidates_lists = self.retrieve_candidates_many(search_queries)
+        finally:
+            if measure_time:
+                self._stop_plan_timing(plan_timing)
+        retrieve_time = time.time() - start
+
+        start = time.time()
+        top_chunks_lists = self.rerank_many(search_queries, candidates_lists)
+        rerank_time = time.time() - start
+        print(
+            f"🔍 Batch of {len(questions)}: retrieve {retrieve_time:.2f}s, "
+            f"re-rank {rerank_time:.2f}s"
+        )
+
+        results = []
+        for question, candidates, top_chunks in zip(questions, candidates_lists, top_chunks_lists):
+            timing_info = None
+            if measure_time:
+                timing_info = {
+                    "retrieve_time": retrieve_time / len(questions),
+                    "rerank_time": rerank_time / len(questions),
+                    "num_candidates": len(candidates),
+                    "num_final_chunks": len(top_chunks),
+                    "batch_size": len(questions),
+                }
+                if plan_timing:
+                    timing_info["retrieve_plan_ms"] = plan_timing["retrieve_plan_ms"] / len(questions)
+                    timing_info["prepared_statements"] = plan_timing["prepared_statements"]
+                timing_info["total_chunks_time"] = timing_info["retrieve_time"] + timing_info["rerank_time"]
+
+            answer = None
+            if not candidates:
+                answer = "לא נמצאו קטעים רלוונטיים במסמכים."
+            elif llm_callable is not None:
+                start_llm = time.time()
+                answer = llm_callable(question, top_chunks)
+                if measure_time:
+                    timing_info["llm_time"] = time.time() - start_llm
+                    timing_info["total_time"] = timing_info["total_chunks_time"] + timing_info["llm_time"]
+            results.append((answer, top_chunks, timing_info))
+
+        return results
+
+    def warmup(self, batch_size: int = WARMUP_BATCH_SIZE) -> Dict:
+        """
+        Pay the one-time costs before the first real query: tokenizer init and
+        first-batch kernel setup at the batch shapes queries use, cold index pages
+        (pg_prewarm when installed, plus one real retrieval) and the few-shot/QNA files.
+        The query embedding, pair score and semantic caches are bypassed. The retrieval
+        step is a real one, though: with a local index it syncs (and may write) the
+        snapshot, and phased fetches store the payloads of the rows it returns in the
+        chunk payload cache.
+
+        Returns per-step timings in seconds (and pg_prewarm blocks per relation).
+        """
+        from rag.few_shot_examples import load_qna_examples, load_few_shot_examples
+
+        report: Dict = {}
+        start_total = time.time()
+
+        # 1. Embedding model: single query (answer) and batch (answer_many) shapes
+        start = time.time()
+        q_emb = self._encode_query(WARMUP_QUESTION)
+        self.embed_model.encode(
+            [WARMUP_QUESTION] * batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+            batch_size=batch_size,
+        )
+        report["embed_time"] = time.time() - start
+
+        # 2. Database: pull the table and its indexes into shared buffers, then run the
+        #    real retrieval query (plans it and touches the vector index pages it uses)
+        candidates: List[Dict] = []
+        if self.pool is not None:
+            start = time.time()
+            try:
+                report["prewarm_blocks"] = self.pool.run(prewarm_knowledge_chunks)
+                if not report["prewarm_blocks"]:
+                    print("⚠️  pg_prewarm not installed - warming the vector index with a query only")
+            except Exception as e:
+                # e.g. no permission to call pg_prewarm; the retrieval below still warms the index
+                print(f"⚠️  pg_prewarm failed: {e}")
+                report["prewarm_blocks"] = {}
+            candidates = self._retrieve_by_embedding(q_emb, WARMUP_QUESTION)
+            report["retrieve_time"] = time.time() - start
+
+        # 3. Rerank models at the real shape: top_k_retrieve pairs through the same
+        #    length-aware batching as rerank(); real chunk texts when the DB returned any
+        texts = [c["text"] for c in candidates] or [
+            WARMUP_QUESTION * (1 + i % 20) for i in range(self.top_k_retrieve)
+        ]
+        pairs = [[WARMUP_QUESTION, text] for text in texts]
+        start = time.time()
+        if self.rerank_model is not None:
+            predict_pairs(self.rerank_model, pairs, max_batch_size=batch_size)
+        for model_name, _ in self.rerank_cascade or []:
+            predict_pairs(get_rerank_model(model_name), pairs, max_batch_size=batch_size)
+        report["rerank_time"] = time.time() - start
+
+        # 4. Prompt material read from disk on first use
+        start = time.time()
+        load_qna_examples()
+        load_few_shot_examples()
+        report["few_shot_time"] = time.time() - start
+
+        report["total_time"] = time.time() - start_total
+        print(f"🔥 RagQueryEngine warmed up in {report['total_time']:.2f}s")
+        return report
 
     def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Release the engine (the connection pool is process-wide; see rag.db.close_all_pools)"""
+        self.pool = None
 
 
 # === CLI לשימוש ישיר מהטרמינל ===
@@ -1,9 +1,11 @@
 """
 Improved Reranking with multiple model options and optimizations
 """
-from typing import List, Dict, Optional
-from sentence_transformers import CrossEncoder
-from rag.model_cache import get_rerank_model
+import os
+import time
+from typing import List, Dict, Optional, Tuple
+from rag.model_cache import get_rerank_model, backend_cache_key
+from rag.score_cache import get_pair_score_cache
 
 # Available rerank models (from best to fastest)
 RERANK_MODELS = {
@@ -16,6 +18,11 @@ RERANK_MODELS = {
 # Default model
 DEFAULT_RERANK_MODEL = "fast"  # Use fast by default, can be changed
 
+# Cascade: cheap model prunes, expensive model orders the survivors.
+# Spec format: "model:keep,model:keep,...,model" (last stage keeps top_n)
+# e.g. RERANK_CASCADE="fast:15,best" -> fast scores 50, best scores 15
+DEFAULT_RERANK_CASCADE = os.getenv("RERANK_CASCADE") or None
+
 
 def rerank_chunks(
     question: str,
@@ -57,14 +64,14 @@ def rerank_chunks(
     # Get rerank model (cached)
     reranker = get_rerank_model(actual_model_name)
     
-    # Prepare pairs: (question, chunk_text)
-    pairs = [[question, chunk.get("text", "")] for chunk in chunks]
-    
-    # Get scores from CrossEncoder
-    scores = reranker.predict(
-        pairs,
-        show_progress_bar=show_progress,
-        batch_size=batch_size
+    # Get scores from CrossEncoder (only pairs missing from the score cache are predicted)
+    scores = get_pair_score_cache().score(
+        reranker,
+        backend_cache_key(actual_model_name),
+        question,
+        chunks,
+        batch_size=batch_size,
+        show_progress=show_progress
     )
     
     # Add scores to chunks
@@ -85,6 +92,75 @@ def rerank_chunks(
     return scored_chunks_sorted[:top_n]
 
 
+def parse_cascade(spec: str) -> List[Tuple[str, Optional[int]]]:
+    """Parse "fast:15,best" into [("fast", 15), ("best", None)]"""
+    stages = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        model_name, _, keep = part.partition(":")
+        stages.append((model_name.strip(), int(keep) if keep else None))
+    if not stages:
+        raise ValueError(f"Empty rerank cascade: {spec!r}")
+    return stages
+
+
+def cascade_rerank(
+    question: str,
+    chunks: List[Dict],
+    top_n: int = 8,
+    stages: Optional[List[Tuple[str, Optional[int]]]] = None,
+    batch_size: int = 32,
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Rerank in stages: each stage scores the survivors of the previous one and keeps
+    its top `keep` (the last stage keeps top_n)
+    
+    Args:
+        stages: [(model name or alias, keep), ...] - default: DEFAULT_RERANK_CASCADE,
+                or a single DEFAULT_RERANK_MODEL stage
+    
+    Returns:
+        (top_n chunks with "rerank_score" from the last stage,
+         per-stage report: [{"model", "input", "kept", "time"}, ...])
+    """
+    if stages is None:
+        stages = parse_cascade(DEFAULT_RERANK_CASCADE) if DEFAULT_RERANK_CASCADE else [(DEFAULT_RERANK_MODEL, None)]
+    
+    survivors = chunks
+    report = []
+    for i, (model_name, keep) in enumerate(stages):
+        if i == len(stages) - 1 or keep is None:
+            keep = top_n
+        start = time.time()
+        stage_input = len(survivors)
+        survivors = rerank_chunks(
+            question,
+            survivors,
+            top_n=keep,
+            model_name=model_name,
+            batch_size=batch_size,
+        )
+        report.append({
+            "model": RERANK_MODELS.get(model_name, model_name),
+            "input": stage_input,
+            "kept": len(survivors),
+            "time": time.time() - start,
+        })
+        if not survivors:
+            break
+    
+    return survivors[:top_n], report
+
+
+def format_cascade_report(report: List[Dict]) -> str:
+    """One line per stage: model, cut size and time"""
+    return "\n".join(
+        f"   {s['model']}: {s['input']} -> {s['kept']} ({s['time'] * 1000:.0f}ms)" for s in report
+    )
+
+
 def compare_rerank_models(
     question: str,
     chunks: List[Dict],
@@ -136,4 +212,8 @@ if __name__ == "__main__":
     print("\n📊 Results:")
     for i, chunk in enumerate(reranked, 1):
         print(f"{i}. Score: {chunk['rerank_score']:.3f} | {chunk['text'][:50]}...")
+    
+    print("\n🧪 Testing cascade (fast:2 -> balanced)...")
+    reranked, report = cascade_rerank(test_question, test_chunks, top_n=1, stages=parse_cascade("fast:2,balanced"))
+    print(format_cascade_report(report))
 
@@ -0,0 +1,182 @@
+"""
+Multi-process cross-encoder scoring
+A single predict() relies on torch intra-op threads, which scale poorly on ~50-pair
+batches, and concurrent requests contend for the same threads. RerankProcessPool
+keeps the rerank model loaded in N worker processes, each pinned to a fixed number
+of intra-op threads, and scores [query, text] pairs there.
+
+Sharding policies (how one scoring call is split across processes):
+    "balanced"   - pairs spread by length (longest first to the lightest shard), so
+                   every process gets ~the same tokens: lowest single-request latency
+    "contiguous" - equal-count slices in input order
+    "none"       - the whole call goes to one process: no split/IPC overhead, best
+                   throughput when many requests are scored concurrently
+
+RagQueryEngine uses a pool when RAG_RERANK_PROCESSES > 0 (default 0 = in-process model).
+Pick processes / threads / sharding with scripts/benchmark_rerank_pool.py.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from rag.batching import DEFAULT_TOKEN_BUDGET, DEFAULT_MAX_BATCH_SIZE, predict_pairs
+from rag.model_cache import DEFAULT_MODEL_BACKEND, RERANK_MODEL_ALIASES, backend_cache_key, load_model
+
+DEFAULT_RERANK_PROCESSES = int(os.getenv("RAG_RERANK_PROCESSES", "0"))
+# Intra-op threads per process (0 = cores // processes)
+DEFAULT_RERANK_THREADS = int(os.getenv("RAG_RERANK_THREADS_PER_PROCESS", "0"))
+DEFAULT_RERANK_SHARDING = os.getenv("RAG_RERANK_SHARDING", "balanced")
+SHARDING_POLICIES = ("balanced", "contiguous", "none")
+# Smaller shards cost more in pickling / IPC than they save in compute
+MIN_PAIRS_PER_SHARD = 4
+
+
+# === WORKER PROCESS SIDE ===
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    """Pin intra-op threads, then load the model once per process"""
+    global _worker_model
+    # OpenMP / MKL read these when torch initializes them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    _worker_model = load_model(model_name, "rerank", backend)
+
+
+def _score_shard(pairs: List[List[str]], token_budget: int, max_batch_size: int) -> np.ndarray:
+    return predict_pairs(_worker_model, pairs, token_budget, max_batch_size)
+
+
+# === POOL ===
+
+class RerankProcessPool:
+    """
+    Drop-in for CrossEncoder in predict() / rag.batching.predict_pairs() that scores
+    in worker processes. Thread-safe: concurrent callers share the processes.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        processes: int = DEFAULT_RERANK_PROCESSES,
+        threads_per_process: int = DEFAULT_RERANK_THREADS,
+        sharding: str = DEFAULT_RERANK_SHARDING,
+        backend: str = DEFAULT_MODEL_BACKEND,
+    ):
+        if sharding not in SHARDING_POLICIES:
+            raise ValueError(f"Unknown sharding policy: {sharding} (expected one of {SHARDING_POLICIES})")
+        self.model_name = RERANK_MODEL_ALIASES.get(model_name, model_name)
+        self.processes = max(1, processes)
+        self.threads_per_process = threads_per_process or max(1, (os.cpu_count() or 1) // self.processes)
+        self.sharding = sharding
+        # spawn, not fork: a forked torch runtime (threads, OpenMP state) can deadlock
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, backend, self.threads_per_process),
+        )
+
+    def shard(self, pairs: Sequence[Sequence[str]]) -> List[np.ndarray]:
+        """Split pair indices into per-process shards according to the sharding policy"""
+        n = len(pairs)
+        shards = min(self.processes, max(1, n // MIN_PAIRS_PER_SHARD))
+        if self.sharding == "none" or shards == 1:
+            return [np.arange(n)]
+        if self.sharding == "contiguous":
+            return np.array_split(np.arange(n), shards)
+
+        # balanced: longest pair first to the shard with the least characters so far
+        lengths = np.array([len(q) + len(t) for q, t in pairs])
+        loads = np.zeros(shards)
+        members: List[List[int]] = [[] for _ in range(shards)]
+        for idx in np.argsort(-lengths, kind="stable"):
+            s = int(np.argmin(loads))
+            members[s].append(int(idx))
+            loads[s] += lengths[idx]
+        return [np.array(m) for m in members if m]
+
+    def predict_pairs(
+        self,
+        pairs: Sequence[Sequence[str]],
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        show_progress: bool = False,
+    ) -> np.ndarray:
+        """Scores in input order; each shard is length-batched inside its process"""
+        if len(pairs) == 0:
+            return np.zeros(0, dtype=np.float32)
+        pairs = [[q, t] for q, t in pairs]
+        shards = self.shard(pairs)
+        futures = [
+            self._executor.submit(_score_shard, [pairs[i] for i in shard], token_budget, max_batch_size)
+            for shard in shards
+        ]
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for shard, future in zip(shards, futures):
+            scores[shard] = future.result()
+        return scores
+
+    def predict(
+        self,
+        sentences: Sequence[Sequence[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        """CrossEncoder.predict signature (batch_size caps the pairs per batch in each process)"""
+        return self.predict_pairs(list(sentences), max_batch_size=batch_size)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Process-wide pools, one per (model, backend, processes, threads, sharding)
+_pools: Dict[Tuple, RerankProcessPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_rerank_pool(
+    model_name: str,
+    processes: int = DEFAULT_RERANK_PROCESSES,
+    threads_per_process: int = DEFAULT_RERANK_THREADS,
+    sharding: str = DEFAULT_RERANK_SHARDING,
+    backend: str = DEFAULT_MODEL_BACKEND,
+) -> RerankProcessPool:
+    """Shared RerankProcessPool for a model and pool configuration (created on first use)"""
+    key = (
+        backend_cache_key(RERANK_MODEL_ALIASES.get(model_name, model_name), backend),
+        max(1, processes),
+        threads_per_process,
+        sharding,
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = RerankProcessPool(
+                model_name,
+                processes=processes,
+                threads_per_process=threads_per_process,
+                sharding=sharding,
+                backend=backend,
+            )
+            _pools[key] = pool
+        return pool
+
+
+def close_rerank_pools():
+    """Shut down every worker process (call on shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
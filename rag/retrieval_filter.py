@@ -0,0 +1,98 @@
+"""
+Metadata filters for retrieval, compiled into the candidate SQL
+Ingest tags every chunk (metadata.is_general / chunk_type, metadata.category, the
+tags[] column, source); filtering in the WHERE clause keeps low-value chunks out of
+the candidate pool instead of spending rerank slots on them.
+
+Each condition has an index in scripts/add-metadata-filter-indexes.sql:
+    exclude_general  - partial vector index WHERE lower(metadata->>'is_general') IS DISTINCT FROM 'true'
+                       (built by scripts/optimize_database_index.py --exclude-general-index)
+                       (the expression below must stay identical for the planner to use it)
+    categories       - btree on (metadata->>'category')
+    tags             - GIN on tags
+    sources          - btree on source
+Selective filters (a category, a tag) become a bitmap scan + exact distance sort over
+the few matching rows; the broad exclude_general filter keeps the ANN index.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Shared by the SQL and the partial index predicate. Case-insensitive like matches():
+# "True" / "TRUE" strings count as general too
+NOT_GENERAL_SQL = "lower(metadata->>'is_general') IS DISTINCT FROM 'true'"
+
+
+class RetrievalFilter:
+    """Restrictions on which knowledge_chunks rows can be retrieved (all conditions AND-ed)"""
+
+    def __init__(
+        self,
+        exclude_general: bool = False,
+        categories: Optional[Sequence[str]] = None,
+        tags: Optional[Sequence[str]] = None,
+        sources: Optional[Sequence[str]] = None,
+    ):
+        self.exclude_general = exclude_general
+        self.categories = sorted(categories) if categories else None
+        self.tags = sorted(tags) if tags else None
+        self.sources = sorted(sources) if sources else None
+
+    @classmethod
+    def from_params(cls, params: Optional[Dict]) -> Optional["RetrievalFilter"]:
+        """Build from a JSON-style dict (worker requests); None when nothing is restricted"""
+        if not params:
+            return None
+        retrieval_filter = cls(
+            exclude_general=bool(params.get("exclude_general", False)),
+            categories=params.get("categories"),
+            tags=params.get("tags"),
+            sources=params.get("sources"),
+        )
+        return None if retrieval_filter.is_empty() else retrieval_filter
+
+    def is_empty(self) -> bool:
+        return not (self.exclude_general or self.categories or self.tags or self.sources)
+
+    def key(self) -> Tuple:
+        """Hashable identity (engine / cache keys)"""
+        return (
+            self.exclude_general,
+            tuple(self.categories or ()),
+            tuple(self.tags or ()),
+            tuple(self.sources or ()),
+        )
+
+    def sql(self, alias: str = "") -> Tuple[str, Dict]:
+        """
+        " AND ..." conditions with %(filter_*)s placeholders, and their params.
+        alias: table alias prefix for the columns (e.g. "c.")
+        """
+        clauses: List[str] = []
+        params: Dict = {}
+        if self.exclude_general:
+            clauses.append(NOT_GENERAL_SQL.replace("metadata", alias + "metadata"))
+        if self.categories:
+            clauses.append(f"({alias}metadata->>'category') = ANY(%(filter_categories)s)")
+            params["filter_categories"] = self.categories
+        if self.tags:
+            clauses.append(f"{alias}tags && %(filter_tags)s::text[]")
+            params["filter_tags"] = self.tags
+        if self.sources:
+            clauses.append(f"{alias}source = ANY(%(filter_sources)s)")
+            params["filter_sources"] = self.sources
+        return "".join(f"\n              AND {c}" for c in clauses), params
+
+    def matches(self, candidate: Dict) -> bool:
+        """Same conditions on a candidate dict (local index records, which carry the tags column)"""
+        metadata = candidate.get("metadata") or {}
+        if self.exclude_general and str(metadata.get("is_general")).lower() == "true":
+            return False
+        if self.categories and metadata.get("category") not in self.categories:
+            return False
+        if self.tags and not set(candidate.get("tags") or ()) & set(self.tags):
+            return False
+        if self.sources and candidate.get("source") not in self.sources:
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"RetrievalFilter{self.key()}"
@@ -0,0 +1,134 @@
+"""
+Cross-encoder pair-score cache
+Follow-up questions, evaluation runs and parameter sweeps rescore the same
+[question, chunk] pairs over and over. Scores are cached per
+(resolved model name, query hash, chunk content hash), so only pairs that were
+never scored go to predict().
+
+Chunks are keyed by content (their content_hash, or a hash of the text), so an
+edited chunk with the same id is rescored rather than served a stale score.
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from rag.batching import predict_pairs
+
+DEFAULT_PAIR_SCORE_CACHE_SIZE = int(os.getenv("RAG_PAIR_SCORE_CACHE_SIZE", "50000"))
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def chunk_cache_key(chunk: Dict) -> str:
+    """Content key of a chunk: its stored content_hash, or a hash of its text"""
+    return chunk.get("content_hash") or _digest(chunk.get("text", "")).hex()
+
+
+class PairScoreCache:
+    """Thread-safe bounded LRU of cross-encoder scores"""
+
+    def __init__(self, max_entries: int = DEFAULT_PAIR_SCORE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, bytes, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def score(
+        self,
+        model,
+        model_name: str,
+        query: str,
+        chunks: List[Dict],
+        batch_size: int = 32,
+        show_progress: bool = False,
+    ) -> List[float]:
+        """
+        Scores for [query, chunk text] pairs, in chunk order.
+        Cached pairs are reused; only the rest go to model.predict().
+        """
+        return self.score_many(model, model_name, [(query, chunks)], batch_size, show_progress)[0]
+
+    def score_many(
+        self,
+        model,
+        model_name: str,
+        requests: List[Tuple[str, List[Dict]]],
+        batch_size: int = 32,
+        show_progress: bool = False,
+    ) -> List[List[float]]:
+        """
+        Scores for several (query, chunks) requests at once.
+        Missing pairs of every request share the same predict() batches
+        (length-aware, see rag.batching.predict_pairs).
+        """
+        keys = []
+        for query, chunks in requests:
+            query_key = _digest(query)
+            keys.append([(model_name, query_key, chunk_cache_key(chunk)) for chunk in chunks])
+
+        scores: List[List[Optional[float]]] = [[None] * len(chunks) for _, chunks in requests]
+        missing = []  # (request index, chunk index)
+        with self._lock:
+            for r, request_keys in enumerate(keys):
+                for i, key in enumerate(request_keys):
+                    cached = self._scores.get(key)
+                    if cached is None:
+                        missing.append((r, i))
+                    else:
+                        self._scores.move_to_end(key)
+                        scores[r][i] = cached
+            self.stats["hits"] += sum(len(k) for k in keys) - len(missing)
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            # Duplicate pairs (same query + text) are scored once
+            unique: Dict[Tuple[str, bytes, str], List] = {}
+            for r, i in missing:
+                unique.setdefault(keys[r][i], [requests[r][0], requests[r][1][i].get("text", "")])
+            # Length-sorted, token-budgeted batches; batch_size caps the pairs per batch
+            fresh = predict_pairs(
+                model,
+                list(unique.values()),
+                max_batch_size=batch_size,
+                show_progress=show_progress,
+            )
+            fresh_by_key = {key: float(s) for key, s in zip(unique, fresh)}
+            for r, i in missing:
+                scores[r][i] = fresh_by_key[keys[r][i]]
+
+            with self._lock:
+                for key, s in fresh_by_key.items():
+                    self._scores[key] = s
+                    self._scores.move_to_end(key)
+                while len(self._scores) > self.max_entries:
+                    self._scores.popitem(last=False)
+
+        return scores
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._scores),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+
+
+# Process-wide cache shared by every rerank path
+_pair_score_cache: Optional[PairScoreCache] = None
+
+
+def get_pair_score_cache() -> PairScoreCache:
+    global _pair_score_cache
+    if _pair_score_cache is None:
+        _pair_score_cache = PairScoreCache()
+    return _pair_score_cache
@@ -0,0 +1,132 @@
+"""
+Semantic result cache for near-duplicate questions
+Stores the reranked top-N chunks per query embedding. A new query whose embedding is
+within a cosine threshold of a cached one is served from the cache, skipping both the
+Postgres scan and the cross-encoder pass.
+
+Nearest-neighbour lookup is a single matrix-vector product over the cached (normalized)
+query vectors - at a few thousand entries this is exact and faster than an ANN index.
+Entries are dropped whenever knowledge_chunks changes (see fetch_knowledge_version).
+"""
+import os
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Cosine similarity needed for a hit (e.g. 0.95); unset / "off" = cache disabled.
+# Opt-in: a near-duplicate question can differ in the detail that decides the answer
+_threshold_env = os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "off")
+DEFAULT_SEMANTIC_CACHE_THRESHOLD: Optional[float] = None if _threshold_env.lower() == "off" else float(_threshold_env)
+DEFAULT_SEMANTIC_CACHE_CAPACITY = int(os.getenv("RAG_SEMANTIC_CACHE_SIZE", "2048"))
+# How often to poll knowledge_chunks for changes (seconds)
+DEFAULT_VERSION_CHECK_INTERVAL = 30.0
+
+
+def fetch_knowledge_version(conn) -> Tuple:
+    """
+    Cheap fingerprint of knowledge_chunks: changes on insert/update/delete.
+    Row count + newest timestamps catch re-indexing; pg_stat modification counters
+    catch in-place updates that don't touch updated_at.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM knowledge_chunks),
+                (SELECT MAX(updated_at) FROM knowledge_chunks),
+                (SELECT MAX("createdAt") FROM knowledge_chunks),
+                (SELECT n_tup_ins + n_tup_upd + n_tup_del
+                 FROM pg_stat_user_tables WHERE relname = 'knowledge_chunks')
+        """)
+        return tuple(cursor.fetchone())
+
+
+class SemanticResultCache:
+    """Thread-safe cache of reranked results keyed by query embedding similarity"""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        capacity: int = DEFAULT_SEMANTIC_CACHE_CAPACITY,
+        version_check_interval: float = DEFAULT_VERSION_CHECK_INTERVAL,
+    ):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.version_check_interval = version_check_interval
+
+        # Ring buffer of normalized query vectors (allocated on first store, once dim is known)
+        self._vectors: Optional[np.ndarray] = None
+        self._results: List[Optional[List[Dict]]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+
+        self._version = None
+        self._last_version_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def lookup(self, query_embedding) -> Optional[List[Dict]]:
+        """Return copies of the cached top chunks for the nearest cached query, if close enough"""
+        q = self._normalize(query_embedding)
+        with self._lock:
+            if self._size == 0 or self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                self.stats["misses"] += 1
+                return None
+            sims = self._vectors[:self._size] @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            similarity = float(sims[best])
+            return [{**chunk, "semantic_cache_similarity": similarity} for chunk in self._results[best]]
+
+    def store(self, query_embedding, top_chunks: List[Dict]):
+        if not top_chunks:
+            return
+        q = self._normalize(query_embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                self._vectors = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+                self._size = 0
+                self._next = 0
+            # FIFO eviction once full
+            self._vectors[self._next] = q
+            self._results[self._next] = [dict(chunk) for chunk in top_chunks]
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._next = 0
+            self._results = [None] * self.capacity
+
+    def refresh(self, fetch_version: Callable[[], Tuple]):
+        """Poll the knowledge version (at most every version_check_interval) and clear on change"""
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_interval:
+            return
+        self._last_version_check = now
+        version = fetch_version()
+        if self._version is not None and version != self._version:
+            self.clear()
+            self.stats["invalidations"] += 1
+            print("♻️  knowledge_chunks changed - semantic result cache cleared")
+        self._version = version
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": self._size,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Long-lived RAG worker process
+Keeps models and the database connection warm between chat turns instead of
+spawning a fresh interpreter per request.
+
+Protocol: newline-delimited JSON (one object per line) over stdio or a Unix socket.
+    request:  {"id": 1, "op": "answer" | "answer_stream" | "rerank" | "warmup" | "ping", "params": {...}}
+    response: {"id": 1, "ok": true, "result": ...}
+              {"id": 1, "ok": false, "error": "...", "traceback": "..."}
+    events:   {"id": 1, "event": {"type": ...}}  (answer_stream only, sent before the response)
+    ready:    {"ready": true}  (stdio only: sent once, after the start-up warm-up)
+    answer / answer_stream params may carry "filter": {"exclude_general", "categories", "tags", "sources"}
+
+The default engine is warmed up (RagQueryEngine.warmup) before the worker reads
+its first request, so the first chat turn after a deploy is not a cold one.
+
+Usage:
+    python -m rag.worker                     # serve on stdin/stdout
+    python -m rag.worker --socket /tmp/rag.sock
+    python -m rag.worker --no-warmup         # skip the start-up warm-up
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+import traceback
+import socketserver
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple, Any, Optional, TextIO
+
+from rag.db import close_all_pools, get_pool_stats
+from rag.model_cache import get_model_cache_stats
+from rag.embedding_cache import get_query_embedding_cache
+from rag.score_cache import get_pair_score_cache
+from rag.payload_cache import get_chunk_payload_cache
+from rag.rerank_pool import close_rerank_pools
+from rag.query_improved import RagQueryEngine, call_llm_default
+from rag.retrieval_filter import RetrievalFilter
+from rag.rerank_improved import rerank_chunks, cascade_rerank, parse_cascade, format_cascade_report
+
+# Rerank model for the "rerank" op when the caller does not pass one.
+# Matches scripts/rerank_with_crossencoder.py, which the TS rerank path used to spawn.
+DEFAULT_WORKER_RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-base")
+# Warm engines kept per (top_k, top_n, filter); least recently used ones are dropped beyond
+# this (filters come from clients, so the set of keys is unbounded)
+DEFAULT_MAX_ENGINES = int(os.getenv("RAG_WORKER_MAX_ENGINES", "16"))
+
+
+def _format_source(s: Dict) -> Dict:
+    """Shape a chunk dict the way the TS callers expect it"""
+    return {
+        "id": str(s.get("id", "")),
+        "text": s.get("text", ""),
+        "source": s.get("source", "unknown"),
+        "chunk_index": int(s.get("chunk_index", s.get("order", 0)) or 0),
+        "rerank_score": float(s.get("rerank_score", 0)),
+        "distance": float(s.get("distance", 0)),
+    }
+
+
+class RagWorker:
+    """
+    Holds warm RagQueryEngine instances and dispatches protocol requests.
+    Engines are keyed by (top_k, top_n, filter) in an LRU of max_engines; models are shared
+    through rag.model_cache and database connections through the process-wide pool in rag.db,
+    so an engine is cheap to rebuild after eviction.
+    """
+
+    # Ops whose handler takes an extra emit(event) callback
+    STREAMING_OPS = {"answer_stream"}
+
+    def __init__(self, max_engines: int = DEFAULT_MAX_ENGINES):
+        self.max_engines = max(1, max_engines)
+        self._engines: "OrderedDict[Tuple, RagQueryEngine]" = OrderedDict()
+        # Requests are served one at a time: concurrent CPU inference only oversubscribes cores
+        self._lock = threading.Lock()
+
+    def _get_engine(self, top_k: int, top_n: int, filter_params: Optional[Dict] = None) -> RagQueryEngine:
+        # filter_params: {"exclude_general", "categories", "tags", "sources"} (see RetrievalFilter)
+        retrieval_filter = RetrievalFilter.from_params(filter_params)
+        key = (top_k, top_n, retrieval_filter.key() if retrieval_filter else None)
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = RagQueryEngine(top_k_retrieve=top_k, top_n_rerank=top_n, retrieval_filter=retrieval_filter)
+            self._engines[key] = engine
+            while len(self._engines) > self.max_engines:
+                self._engines.popitem(last=False)
+        else:
+            self._engines.move_to_end(key)
+        return engine
+
+    def op_ping(self, params: Dict) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "engines": len(self._engines),
+            "query_embedding_cache": get_query_embedding_cache().get_stats(),
+            "pair_score_cache": get_pair_score_cache().get_stats(),
+            "chunk_payload_cache": get_chunk_payload_cache().get_stats(),
+            "models": get_model_cache_stats(),
+            "db_pools": get_pool_stats(),
+            "semantic_cache": {
+                f"{top_k}/{top_n}" + (f" {retrieval_filter}" if retrieval_filter else ""): engine.semantic_cache.get_stats()
+                for (top_k, top_n, retrieval_filter), engine in self._engines.items()
+                if engine.semantic_cache is not None
+            },
+        }
+
+    def op_warmup(self, params: Dict) -> Dict:
+        """Warm the engine for (top_k, top_n); returns its per-step timings"""
+        engine = self._get_engine(int(params.get("top_k", 50)), int(params.get("top_n", 8)))
+        return engine.warmup()
+
+    def op_answer(self, params: Dict) -> Dict:
+        top_k = int(params.get("top_k", 50))
+        top_n = int(params.get("top_n", 8))
+        engine = self._get_engine(top_k, top_n, params.get("filter"))
+        answer, sources, timing_info = engine.answer(
+            search_query=params.get("search_query"),
+            question=params.get("question"),
+            llm_callable=call_llm_default,
+            measure_time=True,
+        )
+        return {
+            "answer": answer,
+            "sources": [_format_source(s) for s in sources],
+            "timing": timing_info if timing_info else None,
+        }
+
+    def op_answer_stream(self, params: Dict, emit: Callable[[Dict], None]) -> Dict:
+        """Like op_answer, but emits each stage as it completes (LLM runs on the TS side)"""
+        top_k = int(params.get("top_k", 50))
+        top_n = int(params.get("top_n", 8))
+        engine = self._get_engine(top_k, top_n, params.get("filter"))
+        result = None
+        for event in engine.answer_stream(
+            search_query=params.get("search_query"),
+            question=params.get("question"),
+        ):
+            if event["type"] == "candidates":
+                emit({"type": "candidates", "count": len(event["candidates"]), "retrieve_time": event["retrieve_time"]})
+            elif event["type"] == "rerank_batch":
+                emit({
+                    "type": "rerank_batch",
+                    "scored": event["scored"],
+                    "total": event["total"],
+                    "sources": [_format_source(s) for s in event["top_chunks"]],
+                })
+            elif event["type"] == "top_chunks":
+                emit({"type": "top_chunks", "sources": [_format_source(s) for s in event["chunks"]], "timing": event["timing"]})
+            elif event["type"] == "done":
+                result = {
+                    "answer": event["answer"],
+                    "sources": [_format_source(s) for s in event["chunks"]],
+                    "timing": event["timing"] or None,
+                }
+        return result
+
+    def op_rerank(self, params: Dict) -> list:
+        if params.get("cascade"):
+            # e.g. "fast:15,best" - see rag.rerank_improved.cascade_rerank
+            reranked, report = cascade_rerank(
+                params.get("query", ""),
+                params.get("candidates", []),
+                top_n=int(params.get("top_n", 8)),
+                stages=parse_cascade(params["cascade"]),
+            )
+            print("🪜 Rerank cascade:\n" + format_cascade_report(report))
+            return [_format_source(s) for s in reranked]
+        reranked = rerank_chunks(
+            params.get("query", ""),
+            params.get("candidates", []),
+            top_n=int(params.get("top_n", 8)),
+            model_name=params.get("model") or DEFAULT_WORKER_RERANK_MODEL,
+        )
+        return [_format_source(s) for s in reranked]
+
+    def handle(self, request: Dict, emit_line: Optional[Callable[[str], None]] = None) -> Dict:
+        """Run one request and build its response (never raises); events go to emit_line"""
+        request_id = request.get("id")
+        handler = getattr(self, f"op_{request.get('op')}", None)
+        if handler is None:
+            return {"id": request_id, "ok": False, "error": f"Unknown op: {request.get('op')}"}
+        try:
+            with self._lock:
+                if request.get("op") in self.STREAMING_OPS:
+                    def emit(event: Dict):
+                        if emit_line is not None:
+                            emit_line(json.dumps({"id": request_id, "event": event}, ensure_ascii=False))
+                    result = handler(request.get("params") or {}, emit)
+                else:
+                    result = handler(request.get("params") or {})
+            return {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            return {
+                "id": request_id,
+                "ok": False,
+                "error": str(e),
+                "traceback": traceback.format_exc(),
+            }
+
+    def handle_line(self, line: str, emit_line: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            response = {"id": None, "ok": False, "error": f"Invalid JSON: {e}"}
+        else:
+            response = self.handle(request, emit_line)
+        return json.dumps(response, ensure_ascii=False)
+
+    def close(self):
+        for engine in self._engines.values():
+            engine.close()
+        self._engines.clear()
+        close_all_pools()
+        close_rerank_pools()
+
+
+def serve_stdio(worker: RagWorker, out: TextIO):
+    """Serve requests from stdin; responses go to `out` (the real stdout)"""
+    def write(line: str):
+        out.write(line + "\n")
+        out.flush()
+
+    # Clients start their request timers on this, so the cold start is not counted
+    write(json.dumps({"ready": True}))
+    for line in sys.stdin:
+        response = worker.handle_line(line, write)
+        if response is not None:
+            write(response)
+
+
+def serve_socket(worker: RagWorker, path: str):
+    """Serve requests on a Unix socket, one thread per client connection"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                response = worker.handle_line(raw.decode("utf-8"), self.write_line)
+                if response is not None:
+                    self.write_line(response)
+
+        def write_line(self, line: str):
+            self.wfile.write((line + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        print(f"✅ RAG worker listening on {path}", file=sys.stderr)
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived RAG worker")
+    parser.add_argument("--socket", help="Unix socket path (default: serve on stdio)")
+    parser.add_argument("--no-warmup", action="store_true", help="Serve immediately, without warming the default engine")
+    args = parser.parse_args()
+
+    # The engine logs with print(); keep stdout clean for the protocol
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    worker = RagWorker()
+    try:
+        if not args.no_warmup:
+            # Requests sent meanwhile wait in the pipe / socket backlog until the worker is warm
+            response = worker.handle({"id": None, "op": "warmup"})
+            if not response["ok"]:
+                print(f"⚠️  Warm-up failed, serving cold: {response['error']}", file=sys.stderr)
+        if args.socket:
+            serve_socket(worker, args.socket)
+        else:
+            print("✅ RAG worker ready on stdio", file=sys.stderr)
+            serve_stdio(worker, protocol_out)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
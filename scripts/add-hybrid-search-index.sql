@@ -0,0 +1,10 @@
+-- Full-text index for hybrid (lexical + vector) retrieval
+-- Used by RagQueryEngine(hybrid=True) / RAG_HYBRID_RETRIEVAL=true (rag/query_improved.py)
+
+-- Postgres has no Hebrew dictionary: the 'simple' config lowercases and splits on word
+-- boundaries without stemming. The expression must match HYBRID_SQL exactly, otherwise
+-- the planner cannot use the index.
+CREATE INDEX IF NOT EXISTS knowledge_chunks_text_fts_idx
+ON knowledge_chunks USING gin (to_tsvector('simple', text));
+
+ANALYZE knowledge_chunks;
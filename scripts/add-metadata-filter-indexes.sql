@@ -0,0 +1,23 @@
+-- Indexes behind metadata-filtered retrieval (rag/retrieval_filter.py)
+-- The expressions must match RetrievalFilter.sql() exactly, otherwise the planner ignores them.
+
+-- exclude_general: partial vector index over non-general chunks, so the common
+-- "no general chunks" search is still an ANN index scan. It must use the same method
+-- (ivfflat / HNSW) and parameters as knowledge_chunks_embedding_idx, so it is built by
+--     python3 scripts/optimize_database_index.py --exclude-general-index [--type hnsw ...]
+-- which also rebuilds it whenever the main index is rebuilt or its predicate changes:
+--     WHERE lower(metadata->>'is_general') IS DISTINCT FROM 'true'
+
+-- categories: (metadata->>'category') = ANY(...)
+CREATE INDEX IF NOT EXISTS knowledge_chunks_category_idx
+ON knowledge_chunks ((metadata->>'category'));
+
+-- tags: tags && ARRAY[...]
+CREATE INDEX IF NOT EXISTS knowledge_chunks_tags_idx
+ON knowledge_chunks USING gin (tags);
+
+-- sources: source = ANY(...)
+CREATE INDEX IF NOT EXISTS knowledge_chunks_source_idx
+ON knowledge_chunks (source);
+
+ANALYZE knowledge_chunks;
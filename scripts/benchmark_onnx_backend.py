@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Parity check + benchmark: torch vs ONNX Runtime (fp32 / int8) backends
+
+For the configured embedding and rerank models (exporting ONNX artifacts on first run):
+  - parity: embedding cosine similarity to torch, rerank score drift and top-N agreement
+  - speed:  single-query encode latency and 50-pair rerank latency, speedup vs torch
+Exits with status 1 if a backend drifts past the thresholds, so it can gate a deploy.
+
+Usage:
+    python3 scripts/benchmark_onnx_backend.py
+    python3 scripts/benchmark_onnx_backend.py --rerank-model balanced --backends onnx-int8
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.model_cache import load_model, RERANK_MODEL_ALIASES
+from rag.query_improved import EMBEDDING_MODEL_NAME, RERANK_MODEL_NAME, DEFAULT_TOP_N_RERANK
+
+QUESTIONS = [
+    "מה ההבדל בין תודעה ריאקטיבית לתודעה אקטיבית?",
+    "מה זה מעגל התודעה?",
+    "איך מזהים דפוס רגשי שמנהל אותנו באופן אוטומטי?",
+    "מהי אחריות אישית וכיצד היא משפיעה על תהליך שינוי?",
+]
+
+# Max allowed drift per backend: (1 - min embedding cosine, min top-N overlap with torch)
+THRESHOLDS = {
+    "onnx": (0.001, 0.99),
+    "onnx-int8": (0.05, 0.75),
+}
+
+
+def load_chunk_texts(limit: int) -> List[str]:
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "master_rag", "chunks")
+    texts = []
+    for path in sorted(glob.glob(os.path.join(root, "*.md")))[:limit]:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def time_it(func, repeat: int) -> float:
+    func()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run_backend(backend: str, embedding_model: str, rerank_model: str, texts: List[str], repeat: int) -> Dict:
+    print(f"\n📥 Loading {backend} models...")
+    embedder = load_model(embedding_model, "embedding", backend)
+    reranker = load_model(rerank_model, "rerank", backend)
+
+    embeddings = np.asarray(embedder.encode(QUESTIONS, convert_to_numpy=True, show_progress_bar=False))
+    scores = [
+        np.asarray(reranker.predict([[q, t] for t in texts], show_progress_bar=False, batch_size=32))
+        for q in QUESTIONS
+    ]
+    return {
+        "embeddings": embeddings,
+        "scores": scores,
+        "encode_ms": time_it(lambda: embedder.encode([QUESTIONS[0]], show_progress_bar=False, batch_size=1), repeat) * 1000,
+        "rerank_ms": time_it(lambda: reranker.predict([[QUESTIONS[0], t] for t in texts], show_progress_bar=False, batch_size=32), repeat) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check + benchmark for ONNX model backends")
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--rerank-model", default=RERANK_MODEL_NAME, help="Model name or alias")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"], choices=list(THRESHOLDS))
+    parser.add_argument("--candidates", type=int, default=50, help="Chunks scored per question")
+    parser.add_argument("--repeat", type=int, default=10, help="Timing repetitions")
+    args = parser.parse_args()
+
+    rerank_model = RERANK_MODEL_ALIASES.get(args.rerank_model, args.rerank_model)
+    texts = load_chunk_texts(args.candidates)
+    if not texts:
+        print("❌ No chunk texts found in master_rag/chunks")
+        sys.exit(1)
+
+    print("🚀 ONNX backend parity + benchmark")
+    print("=" * 80)
+    print(f"📦 Embedding: {args.embedding_model}")
+    print(f"📦 Rerank:    {rerank_model} ({len(texts)} chunks per question)")
+
+    baseline = run_backend("torch", args.embedding_model, rerank_model, texts, args.repeat)
+    top_n = DEFAULT_TOP_N_RERANK
+
+    print(f"\n{'backend':<11} {'encode ms':>10} {'rerank ms':>10} {'min cos':>9} {'max |Δscore|':>13} {'top-' + str(top_n) + ' overlap':>14}")
+    print("-" * 80)
+    print(f"{'torch':<11} {baseline['encode_ms']:>10.1f} {baseline['rerank_ms']:>10.1f} {1.0:>9.4f} {0.0:>13.4f} {1.0:>14.2f}")
+
+    failed = False
+    for backend in args.backends:
+        result = run_backend(backend, args.embedding_model, rerank_model, texts, args.repeat)
+
+        a, b = baseline["embeddings"], result["embeddings"]
+        cosines = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+        drift = max(float(np.max(np.abs(x - y))) for x, y in zip(baseline["scores"], result["scores"]))
+        overlap = np.mean([
+            len(set(np.argsort(-x)[:top_n]) & set(np.argsort(-y)[:top_n])) / top_n
+            for x, y in zip(baseline["scores"], result["scores"])
+        ])
+
+        max_cos_drift, min_overlap = THRESHOLDS[backend]
+        ok = (1 - float(cosines.min())) <= max_cos_drift and overlap >= min_overlap
+        failed |= not ok
+        print(
+            f"{backend:<11} {result['encode_ms']:>10.1f} {result['rerank_ms']:>10.1f} {cosines.min():>9.4f} "
+            f"{drift:>13.4f} {overlap:>14.2f}   "
+            f"{baseline['encode_ms'] / result['encode_ms']:.1f}x / {baseline['rerank_ms'] / result['rerank_ms']:.1f}x "
+            f"{'✅' if ok else '❌'}"
+        )
+
+    print("=" * 80)
+    if failed:
+        print("❌ Parity check failed (see thresholds in THRESHOLDS)")
+        sys.exit(1)
+    print("✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
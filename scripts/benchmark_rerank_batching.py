@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: fixed-size vs length-aware cross-encoder batching
+
+Scores the same [question, chunk] pairs twice:
+  - fixed:  predict(pairs, batch_size=32) in candidate order (the old rerank path)
+  - dynamic: rag.batching.predict_pairs (length-sorted, token-budgeted batches)
+and reports time per query, padded-token counts and the max score difference.
+
+Chunk texts come from knowledge_chunks (--db, the real length distribution)
+or from master_rag/chunks/*.md.
+
+Usage:
+    python3 scripts/benchmark_rerank_batching.py
+    python3 scripts/benchmark_rerank_batching.py --db --model balanced --budget 4096 8192 16384
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+from typing import List
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.batching import pair_lengths, make_batches, predict_pairs
+from rag.model_cache import get_rerank_model
+
+QUESTIONS = [
+    "מה ההבדל בין תודעה ריאקטיבית לתודעה אקטיבית?",
+    "מה זה מעגל התודעה?",
+    "איך מזהים דפוס רגשי שמנהל אותנו באופן אוטומטי?",
+    "מהי אחריות אישית וכיצד היא משפיעה על תהליך שינוי?",
+]
+
+
+def load_texts_from_db(limit: int) -> List[str]:
+    from rag.db import DATABASE_URL, get_pool
+
+    with get_pool(DATABASE_URL).connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT text FROM knowledge_chunks WHERE embedding IS NOT NULL ORDER BY random() LIMIT %s",
+                (limit, ),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def load_texts_from_files(limit: int) -> List[str]:
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "master_rag", "chunks")
+    paths = sorted(glob.glob(os.path.join(root, "*.md")))
+    random.shuffle(paths)
+    texts = []
+    for path in paths[:limit]:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def padded_tokens(lengths: np.ndarray, batches: List[np.ndarray]) -> int:
+    return sum(len(b) * int(lengths[b].max()) for b in batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fixed vs length-aware rerank batching")
+    parser.add_argument("--db", action="store_true", help="Sample chunk texts from knowledge_chunks")
+    parser.add_argument("--model", default="fast", help="Rerank model name or alias")
+    parser.add_argument("--candidates", type=int, default=50, help="Candidates per query")
+    parser.add_argument("--queries", type=int, default=8, help="Number of queries")
+    parser.add_argument("--budget", type=int, nargs="+", default=[4096, 8192, 16384], help="Token budgets to test")
+    args = parser.parse_args()
+
+    print("🚀 Rerank batching benchmark")
+    print("=" * 80)
+
+    texts = load_texts_from_db(args.candidates * 4) if args.db else load_texts_from_files(args.candidates * 4)
+    if len(texts) < args.candidates:
+        print(f"❌ Need at least {args.candidates} chunk texts, found {len(texts)}")
+        sys.exit(1)
+    char_lengths = np.array([len(t) for t in texts])
+    print(f"📊 {len(texts)} chunks, chars: p10={np.percentile(char_lengths, 10):.0f} "
+          f"median={np.median(char_lengths):.0f} p90={np.percentile(char_lengths, 90):.0f}")
+
+    model = get_rerank_model(args.model)
+    workloads = []
+    for i in range(args.queries):
+        sample = random.sample(texts, args.candidates)
+        workloads.append([[QUESTIONS[i % len(QUESTIONS)], t] for t in sample])
+
+    # Warm-up (first call pays one-time allocation costs)
+    model.predict(workloads[0][:8], show_progress_bar=False, batch_size=8)
+
+    start = time.perf_counter()
+    fixed_scores = [np.asarray(model.predict(p, show_progress_bar=False, batch_size=32)) for p in workloads]
+    t_fixed = (time.perf_counter() - start) / len(workloads)
+
+    lengths = [pair_lengths(model, p) for p in workloads]
+    fixed_padding = np.mean([
+        padded_tokens(l, [np.arange(s, min(s + 32, len(l))) for s in range(0, len(l), 32)]) for l in lengths
+    ])
+    real_tokens = np.mean([l.sum() for l in lengths])
+
+    print(f"\n{'method':<22} {'ms/query':>10} {'padded tokens':>15} {'waste':>8} {'max |Δscore|':>14}")
+    print("-" * 80)
+    print(f"{'fixed batch_size=32':<22} {t_fixed * 1000:>10.1f} {fixed_padding:>15.0f} "
+          f"{1 - real_tokens / fixed_padding:>7.0%} {0.0:>14.2e}")
+
+    for budget in args.budget:
+        start = time.perf_counter()
+        dynamic_scores = [predict_pairs(model, p, token_budget=budget) for p in workloads]
+        t_dynamic = (time.perf_counter() - start) / len(workloads)
+        padding = np.mean([padded_tokens(l, make_batches(l, budget)) for l in lengths])
+        drift = max(float(np.max(np.abs(a - b))) for a, b in zip(fixed_scores, dynamic_scores))
+        label = f"dynamic budget={budget}"
+        print(f"{label:<22} {t_dynamic * 1000:>10.1f} {padding:>15.0f} "
+              f"{1 - real_tokens / padding:>7.0%} {drift:>14.2e}   ({t_fixed / t_dynamic:.2f}x)")
+
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: in-process rerank vs rag.rerank_pool.RerankProcessPool
+
+For each configuration (in-process model using all cores, then every
+processes x sharding combination) it measures:
+  - latency:    one request at a time (p50 / p95 ms per request)
+  - throughput: --concurrency requests in flight at once (requests/s)
+and the max score difference against the in-process model.
+
+Usage:
+    python3 scripts/benchmark_rerank_pool.py
+    python3 scripts/benchmark_rerank_pool.py --model balanced --processes 2 4 --sharding balanced none
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.batching import predict_pairs
+from rag.model_cache import get_rerank_model
+from rag.rerank_pool import RerankProcessPool, SHARDING_POLICIES
+
+QUESTIONS = [
+    "מה ההבדל בין תודעה ריאקטיבית לתודעה אקטיבית?",
+    "מה זה מעגל התודעה?",
+    "איך מזהים דפוס רגשי שמנהל אותנו באופן אוטומטי?",
+    "מהי אחריות אישית וכיצד היא משפיעה על תהליך שינוי?",
+]
+
+
+def load_texts(limit: int) -> List[str]:
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "master_rag", "chunks")
+    paths = sorted(glob.glob(os.path.join(root, "*.md")))
+    random.shuffle(paths)
+    texts = []
+    for path in paths[:limit]:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def measure(model, workloads: List[List[List[str]]], concurrency: int) -> Dict:
+    predict_pairs(model, workloads[0])  # warm-up (process start + model load for pools)
+
+    latencies = []
+    scores = []
+    for pairs in workloads:
+        start = time.perf_counter()
+        scores.append(predict_pairs(model, pairs))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda p: predict_pairs(model, p), workloads))
+    throughput = len(workloads) / (time.perf_counter() - start)
+
+    return {
+        "p50": float(np.percentile(latencies, 50)) * 1000,
+        "p95": float(np.percentile(latencies, 95)) * 1000,
+        "throughput": throughput,
+        "scores": scores,
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark multi-process reranking")
+    parser.add_argument("--model", default="fast", help="Rerank model name or alias")
+    parser.add_argument("--candidates", type=int, default=50, help="Pairs per request")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per measurement")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight for the throughput run")
+    parser.add_argument("--processes", type=int, nargs="+",
+                        default=sorted({p for p in (1, 2, 4, cores) if p <= cores}))
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads per process (0 = cores // processes)")
+    parser.add_argument("--sharding", nargs="+", default=list(SHARDING_POLICIES), choices=SHARDING_POLICIES)
+    args = parser.parse_args()
+
+    texts = load_texts(args.candidates * 4)
+    if len(texts) < args.candidates:
+        print(f"❌ Need at least {args.candidates} chunk texts in master_rag/chunks, found {len(texts)}")
+        sys.exit(1)
+    workloads = [
+        [[QUESTIONS[i % len(QUESTIONS)], t] for t in random.sample(texts, args.candidates)]
+        for i in range(args.requests)
+    ]
+
+    print("🚀 Rerank process-pool benchmark")
+    print("=" * 80)
+    print(f"🖥️  {cores} cores | {args.requests} requests x {args.candidates} pairs | concurrency {args.concurrency}")
+
+    print(f"\n{'config':<28} {'threads':>7} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>8} {'max |Δscore|':>13}")
+    print("-" * 80)
+    baseline = measure(get_rerank_model(args.model), workloads, args.concurrency)
+    print(f"{'in-process':<28} {cores:>7} {baseline['p50']:>9.1f} {baseline['p95']:>9.1f} "
+          f"{baseline['throughput']:>8.2f} {0.0:>13.2e}")
+
+    for processes in args.processes:
+        for sharding in args.sharding:
+            if processes == 1 and sharding != args.sharding[0]:
+                continue  # one process: every policy is the same
+            pool = RerankProcessPool(args.model, processes=processes, threads_per_process=args.threads, sharding=sharding)
+            try:
+                result = measure(pool, workloads, args.concurrency)
+            finally:
+                pool.close()
+            drift = max(float(np.max(np.abs(a - b))) for a, b in zip(baseline["scores"], result["scores"]))
+            label = f"{processes} proc / {sharding}"
+            print(f"{label:<28} {pool.threads_per_process:>7} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                  f"{result['throughput']:>8.2f} {drift:>13.2e}   "
+                  f"({baseline['p50'] / result['p50']:.2f}x latency, "
+                  f"{result['throughput'] / baseline['throughput']:.2f}x throughput)")
+
+    print("=" * 80)
+    print("💡 Set RAG_RERANK_PROCESSES / RAG_RERANK_THREADS_PER_PROCESS / RAG_RERANK_SHARDING from the best row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: text-literal vs binary pgvector transport
+
+Client side (always): per-query cost of building the query parameter and per-row cost
+of encoding embeddings for ingest, for 768-3072 dim vectors.
+Database side (--db): retrieval with the literal sent twice vs once, and ingest of N rows
+with per-row INSERT of text literals vs one binary COPY (into a TEMP table).
+
+Usage:
+    python3 scripts/benchmark_vector_transport.py
+    python3 scripts/benchmark_vector_transport.py --db --rows 2000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.pgvector import encode_vector, to_vector_literal, build_copy_payload, copy_rows_binary
+
+DIMS = [768, 1536, 3072]
+
+
+def legacy_literal(vec) -> str:
+    """The format every path used before: '[' + ','.join(map(str, emb.tolist())) + ']'"""
+    return '[' + ','.join(map(str, vec.tolist())) + ']'
+
+
+def time_per_call(func, arg, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_client(repeat: int):
+    print("🧮 Client-side encoding (per vector)")
+    print("-" * 80)
+    print(f"{'dim':>6} {'legacy text':>14} {'compact text':>14} {'binary':>10}   {'bytes legacy/compact/binary':>30}")
+    for dim in DIMS:
+        vec = np.random.rand(dim).astype(np.float32)
+        t_legacy = time_per_call(legacy_literal, vec, repeat)
+        t_compact = time_per_call(to_vector_literal, vec, repeat)
+        t_binary = time_per_call(encode_vector, vec, repeat)
+        sizes = f"{len(legacy_literal(vec))}/{len(to_vector_literal(vec))}/{len(encode_vector(vec))}"
+        print(
+            f"{dim:>6} {t_legacy * 1e6:>11.1f} µs {t_compact * 1e6:>11.1f} µs {t_binary * 1e6:>7.1f} µs"
+            f"   {sizes:>30}"
+        )
+
+
+def bench_db(database_url: str, rows: int, repeat: int):
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT vector_dims(embedding) FROM knowledge_chunks WHERE embedding IS NOT NULL LIMIT 1")
+    row = cursor.fetchone()
+    dim = row[0] if row else 768
+
+    print(f"\n🗄️  Retrieval query (dim={dim}, LIMIT 50, {repeat} runs)")
+    print("-" * 80)
+    vectors = [np.random.rand(dim).astype(np.float32) for _ in range(repeat)]
+
+    start = time.perf_counter()
+    for vec in vectors:
+        literal = legacy_literal(vec)
+        cursor.execute("""
+            SELECT id, embedding <=> %s::vector AS distance
+            FROM knowledge_chunks WHERE embedding IS NOT NULL
+            ORDER BY embedding <=> %s::vector LIMIT 50
+        """, (literal, literal))
+        cursor.fetchall()
+    t_twice = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for vec in vectors:
+        cursor.execute("""
+            SELECT id, embedding <=> %s::vector AS distance
+            FROM knowledge_chunks WHERE embedding IS NOT NULL
+            ORDER BY distance LIMIT 50
+        """, (to_vector_literal(vec), ))
+        cursor.fetchall()
+    t_once = (time.perf_counter() - start) / repeat
+    conn.rollback()
+
+    print(f"   legacy literal, bound twice: {t_twice * 1000:8.2f} ms/query")
+    print(f"   compact literal, bound once: {t_once * 1000:8.2f} ms/query")
+
+    print(f"\n💾 Ingest ({rows} rows, dim={dim}, TEMP table)")
+    print("-" * 80)
+    cursor.execute(f"CREATE TEMP TABLE bench_vectors (id text, embedding vector({dim}))")
+    data = [(f"row_{i}", np.random.rand(dim).astype(np.float32)) for i in range(rows)]
+
+    start = time.perf_counter()
+    for row_id, vec in data:
+        cursor.execute(
+            "INSERT INTO bench_vectors (id, embedding) VALUES (%s, %s::vector)",
+            (row_id, legacy_literal(vec)),
+        )
+    t_text = time.perf_counter() - start
+    cursor.execute("TRUNCATE bench_vectors")
+
+    columns = [("id", "text"), ("embedding", "vector")]
+    start = time.perf_counter()
+    copy_rows_binary(cursor, "bench_vectors", columns, data)
+    t_copy = time.perf_counter() - start
+    payload = len(build_copy_payload(columns, data).getvalue())
+    conn.rollback()
+
+    print(f"   per-row INSERT (text):  {t_text:8.3f}s  ({t_text / rows * 1e6:8.1f} µs/row)")
+    print(f"   binary COPY:            {t_copy:8.3f}s  ({t_copy / rows * 1e6:8.1f} µs/row, {payload / 1024:.0f} KiB)")
+
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pgvector text vs binary transport")
+    parser.add_argument("--db", action="store_true", help="Also benchmark against DATABASE_URL")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows for the ingest benchmark")
+    parser.add_argument("--repeat", type=int, default=200, help="Repetitions per measurement")
+    args = parser.parse_args()
+
+    print("🚀 pgvector transport benchmark")
+    print("=" * 80)
+    bench_client(args.repeat)
+
+    if args.db:
+        from rag.db import DATABASE_URL
+        bench_db(DATABASE_URL, args.rows, min(args.repeat, 50))
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Startup-time budget check for the rag package and its CLIs
+
+Heavy dependencies (torch via sentence_transformers, transformers, onnxruntime, faiss)
+must only be imported on first model use. For each module / CLI this runs a fresh
+interpreter with `python -X importtime` and checks:
+  - no heavy module was imported
+  - import time (modules: cumulative import of the module; CLIs: wall clock of --help)
+    stays under the budget (best of --repeat runs, to ignore disk-cache noise)
+Exits with status 1 on any violation, so it can run in CI.
+
+Usage:
+    python3 scripts/check_import_time.py
+    python3 scripts/check_import_time.py --module-budget-ms 200 --cli-budget-ms 500
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, List, Set, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "rag.db",
+    "rag.pgvector",
+    "rag.batching",
+    "rag.model_cache",
+    "rag.score_cache",
+    "rag.embedding_cache",
+    "rag.semantic_cache",
+    "rag.local_index",
+    "rag.bm25_index",
+    "rag.retrieval_filter",
+    "rag.mmr",
+    "rag.adaptive_depth",
+    "rag.payload_cache",
+    "rag.rerank_improved",
+    "rag.rerank_pool",
+    "rag.query_improved",
+    "rag.worker",
+]
+
+CLIS = [
+    ["-m", "rag.worker", "--help"],
+    ["-m", "rag.local_index", "--help"],
+    ["scripts/optimize_database_index.py", "--help"],
+    ["scripts/benchmark_rerank_batching.py", "--help"],
+]
+
+HEAVY_MODULES = {"torch", "sentence_transformers", "transformers", "onnxruntime", "faiss", "tensorflow"}
+
+
+def run_importtime(args: List[str]) -> Tuple[Dict[str, int], float]:
+    """Run `python -X importtime <args>`; returns ({module: cumulative us}, wall clock seconds)"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cum)
+    return cumulative, wall
+
+
+def heavy_imports(modules: Dict[str, int]) -> Set[str]:
+    return {name.split(".")[0] for name in modules} & HEAVY_MODULES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time of the rag package and CLIs against a budget")
+    parser.add_argument("--module-budget-ms", type=float, default=300, help="Max cumulative import time per module")
+    parser.add_argument("--cli-budget-ms", type=float, default=800, help="Max wall clock per CLI --help run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per target (best time counts)")
+    args = parser.parse_args()
+
+    print("🚀 Import-time budget check")
+    print("=" * 80)
+    failures = []
+
+    print(f"\n{'module':<28} {'import ms':>10} {'budget':>8}")
+    print("-" * 80)
+    for module in MODULES:
+        best, heavy = None, set()
+        for _ in range(args.repeat):
+            modules, _ = run_importtime(["-c", f"import {module}"])
+            heavy |= heavy_imports(modules)
+            ms = modules.get(module, 0) / 1000
+            best = ms if best is None else min(best, ms)
+        ok = best <= args.module_budget_ms and not heavy
+        print(f"{module:<28} {best:>10.1f} {args.module_budget_ms:>8.0f} {'✅' if ok else '❌'}"
+              + (f"  heavy: {', '.join(sorted(heavy))}" if heavy else ""))
+        if not ok:
+            failures.append(module)
+
+    print(f"\n{'cli':<50} {'wall ms':>10} {'budget':>8}")
+    print("-" * 80)
+    for cli in CLIS:
+        label = " ".join(cli)
+        best, heavy = None, set()
+        for _ in range(args.repeat):
+            modules, wall = run_importtime(cli)
+            heavy |= heavy_imports(modules)
+            best = wall * 1000 if best is None else min(best, wall * 1000)
+        ok = best <= args.cli_budget_ms and not heavy
+        print(f"{label:<50} {best:>10.1f} {args.cli_budget_ms:>8.0f} {'✅' if ok else '❌'}"
+              + (f"  heavy: {', '.join(sorted(heavy))}" if heavy else ""))
+        if not ok:
+            failures.append(label)
+
+    print("=" * 80)
+    if failures:
+        print(f"❌ Over budget or importing heavy modules: {', '.join(failures)}")
+        sys.exit(1)
+    print("✅ All imports within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,6 @@ import json
 import time
 from pathlib import Path
 from typing import List, Dict, Any
-import psycopg2
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
@@ -17,6 +16,7 @@ BASE_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(BASE_DIR))
 
 from rag.model_cache import get_embedding_model
+from rag.db import get_pool
 
 RAG_DIR = BASE_DIR / "data" / "rag"
 
@@ -170,12 +170,11 @@ def main():
     embed_model = get_embedding_model(EMBEDDING_MODEL_NAME)
     print("✅ Embedding model loaded")
     
-    # Connect to database
+    # Check out a connection from the shared pool
     print(f"\n📥 Connecting to database...")
-    conn = psycopg2.connect(DATABASE_URL)
-    print("✅ Connected to database")
-    
-    try:
+    with get_pool(DATABASE_URL).connection() as conn:
+        print("✅ Connected to database")
+        
         # Clean existing index
         clean_existing_index(conn)
         
@@ -214,10 +213,8 @@ def main():
         print("✨ Indexing Complete!")
         print("=" * 80)
         print(f"📊 Total chunks in database: {total_count}")
-        
-    finally:
-        conn.close()
-        print("\n✅ Database connection closed")
+    
+    print("\n✅ Database connection returned to pool")
 
 if __name__ == "__main__":
     main()
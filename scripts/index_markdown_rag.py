@@ -17,7 +17,6 @@ import os
 import sys
 import hashlib
 import json
-import psycopg2
 import numpy as np
 from openai import OpenAI
 import re
@@ -31,6 +30,9 @@ from typing import List, Dict, Any
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from rag.db import get_pool
+from rag.pgvector import upsert_rows_binary
+
 # -------- CONFIG --------
 DATA_DIR = os.path.join(project_root, "data", "rag")
 EMBED_MODEL = "text-embedding-3-small"  # 1536 dimensions (supports indexing)
@@ -143,35 +145,46 @@ def load_markdown_clean(path: str) -> str:
 
 
 def connect_db():
-    """Connect to PostgreSQL database."""
-    return psycopg2.connect(DB_URL)
-
-
-def upsert_chunk(conn, chunk: Dict[str, Any]):
-    """Upsert chunk into database."""
-    with conn.cursor() as cur:
-        cur.execute("""
-            INSERT INTO knowledge_chunks 
-            (id, file_path, chunk_index, text, embedding, metadata, content_hash, updated_at, source)
-            VALUES (%s, %s, %s, %s, %s::vector, %s::jsonb, %s, NOW(), %s)
-            ON CONFLICT (id) DO UPDATE SET
-                text = EXCLUDED.text,
-                embedding = EXCLUDED.embedding,
-                metadata = EXCLUDED.metadata,
-                content_hash = EXCLUDED.content_hash,
-                file_path = EXCLUDED.file_path,
-                chunk_index = EXCLUDED.chunk_index,
-                updated_at = NOW();
-        """, (
+    """Check out a connection from the shared pool (use as a context manager)."""
+    return get_pool(DB_URL).connection()
+
+
+CHUNK_COLUMNS = [
+    ("id", "text"),
+    ("file_path", "text"),
+    ("chunk_index", "int4"),
+    ("text", "text"),
+    ("embedding", "vector"),
+    ("metadata", "jsonb"),
+    ("content_hash", "text"),
+    ("source", "text"),
+]
+
+
+def upsert_chunks(conn, chunks: List[Dict[str, Any]]):
+    """Upsert chunks into database (binary COPY, embeddings sent as float4 - no text formatting)."""
+    rows = [
+        (
             chunk["id"],
             chunk["file_path"],
             chunk["chunk_index"],
             chunk["text"],
             chunk["embedding"],
-            json.dumps(chunk["metadata"]),
+            chunk["metadata"],
             chunk["content_hash"],
             chunk.get("source", "markdown"),
-        ))
+        )
+        for chunk in chunks
+    ]
+    with conn.cursor() as cur:
+        upsert_rows_binary(
+            cur,
+            "knowledge_chunks",
+            CHUNK_COLUMNS,
+            rows,
+            update_columns=["text", "embedding", "metadata", "content_hash", "file_path", "chunk_index"],
+            extra_values={"updated_at": "NOW()"},
+        )
     conn.commit()
 
 
@@ -227,21 +240,18 @@ def index_file(conn, path: str, relative_path: str):
         print(f"   ❌ Error generating embeddings: {e}")
         return
     
-    indexed_count = 0
+    records = []
     for idx, (chunk_text, emb) in enumerate(zip(chunks, embeddings)):
         try:
             # Generate unique chunk ID
             chunk_id = sha256(relative_path + "::" + str(idx) + "::" + chunk_text)
             
-            # Convert embedding to string format for pgvector
-            embedding_str = "[" + ",".join(map(str, emb)) + "]"
-            
             record = {
                 "id": chunk_id,
                 "file_path": relative_path,
                 "chunk_index": idx,
                 "text": chunk_text,
-                "embedding": embedding_str,
+                "embedding": emb,
                 "content_hash": content_hash,
                 "source": "markdown",
                 "metadata": {
@@ -253,12 +263,18 @@ def index_file(conn, path: str, relative_path: str):
                     "embedding_dim": 1536,
                 }
             }
-            
-            upsert_chunk(conn, record)
-            indexed_count += 1
+            records.append(record)
         except Exception as e:
             print(f"   ❌ Error indexing chunk {idx}: {e}")
     
+    try:
+        upsert_chunks(conn, records)
+        indexed_count = len(records)
+    except Exception as e:
+        conn.rollback()
+        print(f"   ❌ Error writing chunks: {e}")
+        indexed_count = 0
+    
     print(f"   ✅ Indexed {indexed_count}/{len(chunks)} chunks")
 
 
@@ -301,11 +317,10 @@ def index_jsonl_file(conn, jsonl_path: str):
         # Generate embeddings in batch
         embeddings = embed_texts(texts)
         
-        indexed_count = 0
+        records = []
         for idx, (chunk, text, emb) in enumerate(zip(chunks_data, texts, embeddings)):
             try:
                 chunk_id = chunk["id"]
-                embedding_str = "[" + ",".join(map(str, emb)) + "]"
                 content_hash = sha256(text)
                 
                 record = {
@@ -313,7 +328,7 @@ def index_jsonl_file(conn, jsonl_path: str):
                     "file_path": rel_path,
                     "chunk_index": idx,
                     "text": text,
-                    "embedding": embedding_str,
+                    "embedding": emb,
                     "content_hash": content_hash,
                     "source": "qna",
                     "metadata": {
@@ -327,12 +342,18 @@ def index_jsonl_file(conn, jsonl_path: str):
                         **chunk.get("metadata", {})
                     }
                 }
-                
-                upsert_chunk(conn, record)
-                indexed_count += 1
+                records.append(record)
             except Exception as e:
                 print(f"   ❌ Error indexing chunk {chunk.get('id', 'unknown')}: {e}")
         
+        try:
+            upsert_chunks(conn, records)
+            indexed_count = len(records)
+        except Exception as e:
+            conn.rollback()
+            print(f"   ❌ Error writing chunks: {e}")
+            indexed_count = 0
+        
         print(f"   ✅ Indexed {indexed_count}/{len(chunks_data)} chunks")
     except Exception as e:
         print(f"   ❌ Error reading JSONL file: {e}")
@@ -340,8 +361,11 @@ def index_jsonl_file(conn, jsonl_path: str):
 
 def index_all():
     """Main indexing function."""
-    conn = connect_db()
-    
+    with connect_db() as conn:
+        _index_all(conn)
+
+
+def _index_all(conn):
     print("=" * 80)
     print("🚀 Production RAG Indexing System")
     print("=" * 80)
@@ -354,7 +378,6 @@ def index_all():
     if not os.path.exists(DATA_DIR):
         print(f"❌ ERROR: Directory {DATA_DIR} does not exist")
         print(f"   Create it and add markdown files to index")
-        conn.close()
         sys.exit(1)
     
     # Scan for markdown and JSONL files
@@ -373,7 +396,6 @@ def index_all():
     
     if not md_files and not jsonl_files:
         print(f"⚠️  No markdown or JSONL files found in {DATA_DIR}")
-        conn.close()
         return
     
     print(f"📋 Found {len(md_files)} markdown files")
@@ -410,8 +432,6 @@ def index_all():
     valid_files = {rel_path for _, rel_path in md_files + jsonl_files}
     delete_orphans(conn, valid_files)
     
-    conn.close()
-    
     print()
     print("=" * 80)
     print("✅ Indexing complete!")
@@ -4,16 +4,21 @@ Simple RAG Ingestion - Starting Fresh
 Reads Word documents, chunks them, creates embeddings, and indexes to PostgreSQL
 """
 import os
-import json
+import sys
 from typing import List, Dict
 from pathlib import Path
 
 import numpy as np
 from docx import Document
 from sentence_transformers import SentenceTransformer
-import psycopg2
 from tqdm import tqdm
 
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.db import get_pool
+from rag.pgvector import copy_rows_binary
+
 # === CONFIGURATION ===
 
 # Documents directory
@@ -30,6 +35,16 @@ EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base
 CHUNK_MAX_CHARS = 800
 CHUNK_OVERLAP_CHARS = 150
 
+# Columns written by COPY (name, postgres type)
+KNOWLEDGE_CHUNK_COLUMNS = [
+    ("id", "text"),
+    ("text", "text"),
+    ("metadata", "jsonb"),
+    ("source", "text"),
+    ("order", "int4"),
+    ("embedding", "vector"),
+]
+
 # === HELPERS ===
 
 def load_word_docs(doc_dir: str) -> List[Dict]:
@@ -193,18 +208,16 @@ def index_to_postgresql(
     conn.commit()
     print("✅ Old chunks deleted")
     
-    indexed = 0
+    rows = []
     errors = 0
     
-    # Insert chunks with progress bar
+    # Prepare rows with progress bar
     for chunk, embedding in tqdm(zip(chunks, embeddings), total=len(chunks), desc="Indexing"):
         try:
             chunk_id = f"{chunk['filename']}_chunk_{chunk['chunk_index']:03d}"
             # Sanitize ID (remove invalid characters)
             chunk_id = chunk_id.replace('/', '_').replace('\\', '_')
             
-            embedding_str = '[' + ','.join(map(str, embedding.tolist())) + ']'
-            
             # Extract topic and key concepts (improved)
             text_lower = chunk['text'].lower()
             sentences = [s.strip() for s in chunk['text'].split('.') if s.strip()]
@@ -277,25 +290,29 @@ def index_to_postgresql(
                 'is_standalone': len(chunk['text']) >= 200 and word_count >= 30  # Can stand alone
             }
             
-            cursor.execute("""
-                INSERT INTO knowledge_chunks (id, text, metadata, source, "order", embedding)
-                VALUES (%s, %s, %s::jsonb, %s, %s, %s::vector)
-            """, (
+            rows.append((
                 chunk_id,
                 chunk['text'],
-                json.dumps(metadata),
+                metadata,
                 chunk['filename'],
                 chunk['chunk_index'],
-                embedding_str
+                embedding
             ))
-            
-            indexed += 1
         except Exception as e:
             errors += 1
             if errors <= 5:
-                print(f"   ❌ Error inserting chunk: {e}")
+                print(f"   ❌ Error preparing chunk: {e}")
     
-    conn.commit()
+    # Single binary COPY: embeddings go over the wire as float4, no text formatting/parsing
+    indexed = 0
+    try:
+        copy_rows_binary(cursor, "knowledge_chunks", KNOWLEDGE_CHUNK_COLUMNS, rows)
+        conn.commit()
+        indexed = len(rows)
+    except Exception as e:
+        conn.rollback()
+        errors += len(rows)
+        print(f"   ❌ Error inserting chunks: {e}")
     cursor.close()
     
     print(f"\n✅ Indexed: {indexed}/{len(chunks)}")
@@ -371,15 +388,13 @@ def build_index(
     print(f"\n📐 Embedding dimension: {dim}")
     print(f"🔢 Total chunks: {total_chunks}")
     
-    # Connect to PostgreSQL
+    # Connect to PostgreSQL (connection from the shared pool)
     print(f"\n🔌 Connecting to PostgreSQL...")
-    conn = psycopg2.connect(DATABASE_URL)
-    print("✅ Connected to database")
-    
-    # Index to PostgreSQL
-    index_to_postgresql(all_chunks, all_embeddings_np, conn)
-    
-    conn.close()
+    with get_pool(DATABASE_URL).connection() as conn:
+        print("✅ Connected to database")
+        
+        # Index to PostgreSQL
+        index_to_postgresql(all_chunks, all_embeddings_np, conn)
     
     print("\n" + "=" * 80)
     print("🎉 Ingestion & indexing completed successfully!")
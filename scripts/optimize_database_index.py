@@ -1,100 +1,308 @@
 #!/usr/bin/env python3
 """
 Optimize the vector index for better performance
+Manages the knowledge_chunks embedding index (ivfflat or HNSW) and benchmarks
+latency + recall@k of the index against exact search, so the per-query knobs
+(ivfflat.probes / hnsw.ef_search, see RagQueryEngine) can be picked deliberately.
+
+Usage:
+    python3 scripts/optimize_database_index.py                          # ivfflat, lists = rows/1000
+    python3 scripts/optimize_database_index.py --type hnsw --m 16 --ef-construction 64
+    python3 scripts/optimize_database_index.py --exclude-general-index     # + partial index for RAG_EXCLUDE_GENERAL_CHUNKS
+    python3 scripts/optimize_database_index.py --benchmark-only --ef-search 20 40 80 --probes 1 5 10
+    python3 scripts/optimize_database_index.py --benchmark-only --questions questions.txt  # held-out queries
 """
-import psycopg2
 import os
+import re
+import sys
+import time
+import argparse
+from typing import Dict, List, Optional
 
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://tzahimoyal@localhost:5432/talbashanai")
+import psycopg2
 
-def optimize_index():
-    """Rebuild the vector index with optimal parameters"""
-    conn = psycopg2.connect(DATABASE_URL)
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.db import DATABASE_URL
+from rag.retrieval_filter import NOT_GENERAL_SQL
+
+INDEX_NAME = "knowledge_chunks_embedding_idx"
+# Partial index behind RetrievalFilter(exclude_general=True): kept on the same method and
+# parameters as INDEX_NAME (rebuilt with it whenever it exists)
+NOT_GENERAL_INDEX_NAME = "knowledge_chunks_embedding_not_general_idx"
+
+# pgvector defaults
+DEFAULT_HNSW_M = 16
+DEFAULT_HNSW_EF_CONSTRUCTION = 64
+
+# An ivfflat index built with the automatic lists value is kept while its lists stays
+# within this factor of the current optimum (rows/1000 moves with every ingest)
+LISTS_TOLERANCE = 2.0
+
+
+def optimal_lists(count: int) -> int:
+    # For ivfflat: lists should be rows / 1000 (minimum 10)
+    return max(10, count // 1000)
+
+
+def lists_within_tolerance(current: int, optimal: int) -> bool:
+    return optimal / LISTS_TOLERANCE <= current <= optimal * LISTS_TOLERANCE
+
+
+def current_index(cursor, name: str = INDEX_NAME) -> Optional[Dict]:
+    """An embedding index as {"name", "type", "params"} (None if there is none)"""
+    cursor.execute('''
+        SELECT indexname, indexdef
+        FROM pg_indexes
+        WHERE tablename = 'knowledge_chunks' AND indexname = %s
+    ''', (name, ))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    name, indexdef = row
+    method = re.search(r"USING (\w+)", indexdef)
+    with_clause = re.search(r"WITH \(([^)]*)\)", indexdef)
+    params = {k: int(v) for k, v in re.findall(r"(\w+)='?(\d+)'?", with_clause.group(1))} if with_clause else {}
+    predicate = indexdef.split(" WHERE ", 1)[1] if " WHERE " in indexdef else ""
+    return {"name": name, "type": method.group(1) if method else None, "params": params, "predicate": predicate}
+
+
+def _normalize_predicate(predicate: str) -> str:
+    """Compare a WHERE clause with Postgres' rewritten form of it (extra parentheses, ::text casts)"""
+    return re.sub(r"::text|[()\s]", "", predicate).lower()
+
+
+def create_index(cursor, index_type: str, params: Dict[str, int], name: str = INDEX_NAME, where: str = ""):
+    with_clause = ", ".join(f"{k} = {v}" for k, v in params.items())
+    cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    cursor.execute(f'''
+        CREATE INDEX {name}
+        ON knowledge_chunks
+        USING {index_type} (embedding vector_cosine_ops)
+        WITH ({with_clause})
+    ''' + (f"WHERE {where}" if where else ""))
+
+
+def index_matches(
+    current: Dict, index_type: str, wanted: Dict[str, int], auto_lists: bool = False, where: str = ""
+) -> bool:
+    """Whether an existing index can stay (auto_lists: ivfflat lists only needs to be near the optimum)"""
+    if current["type"] != index_type:
+        return False
+    if _normalize_predicate(current["predicate"]) != _normalize_predicate(where):
+        return False
+    if auto_lists and index_type == "ivfflat":
+        return lists_within_tolerance(current["params"].get("lists", 0), wanted["lists"])
+    return current["params"] == wanted
+
+
+def ensure_index(
+    conn,
+    cursor,
+    index_type: str,
+    wanted: Dict[str, int],
+    force: bool,
+    name: str = INDEX_NAME,
+    where: str = "",
+    auto_lists: bool = False,
+):
+    """(Re)build an embedding index unless it already has the wanted type and parameters"""
+    current = current_index(cursor, name)
+    if current:
+        print(f"\n📊 אינדקס נוכחי: {current['name']} ({current['type']} {current['params']})"
+              + (f" WHERE {current['predicate']}" if current["predicate"] else ""))
+    else:
+        print(f"⚠️  לא נמצא אינדקס {name} - יוצר חדש...")
+
+    if current and index_matches(current, index_type, wanted, auto_lists, where) and not force:
+        print("✅ האינדקס כבר מותאם")
+        return
+    print(f"\n🔨 בונה אינדקס {name}: {index_type} עם {wanted}...")
+    start = time.time()
+    # HNSW builds are much faster when the graph fits in maintenance_work_mem
+    cursor.execute("SET maintenance_work_mem = '512MB'")
+    create_index(cursor, index_type, wanted, name, where)
+    conn.commit()
+    print(f"✅ אינדקס חדש נוצר ({time.time() - start:.1f}s)")
+
+
+def optimize_index(
+    conn,
+    index_type: str,
+    lists: Optional[int],
+    m: int,
+    ef_construction: int,
+    force: bool,
+    exclude_general_index: bool = False,
+):
+    """
+    Rebuild the vector index if its type or parameters differ from the requested ones.
+    Without an explicit lists value, an ivfflat index is only rebuilt once its lists is
+    off by more than LISTS_TOLERANCE from rows/1000 (force rebuilds regardless).
+    The exclude_general partial index gets the same type and parameters; it is created
+    when exclude_general_index is set and kept in step whenever it exists.
+    """
     cursor = conn.cursor()
-    
+
     try:
         # Get table size
         cursor.execute('SELECT COUNT(*) FROM knowledge_chunks')
         count = cursor.fetchone()[0]
         print(f"📊 מספר chunks בטבלה: {count}")
-        
-        # Calculate optimal lists parameter
-        # For ivfflat: lists should be rows / 1000 (minimum 10)
-        optimal_lists = max(10, count // 1000)
-        print(f"💡 lists מומלץ: {optimal_lists}")
-        
-        # Check current index
-        cursor.execute('''
-            SELECT indexname, indexdef
-            FROM pg_indexes 
-            WHERE tablename = 'knowledge_chunks' AND indexname LIKE '%embedding%'
-        ''')
-        current = cursor.fetchone()
-        
-        if current:
-            print(f"\n📊 אינדקס נוכחי: {current[0]}")
-            if 'lists=' in current[1]:
-                current_lists = int(current[1].split('lists=')[1].split(')')[0].strip("'"))
-                print(f"   lists נוכחי: {current_lists}")
-                
-                if current_lists < optimal_lists:
-                    print(f"\n⚠️  האינדקס לא מותאם! בונה מחדש עם lists={optimal_lists}...")
-                    
-                    # Drop old index
-                    cursor.execute('DROP INDEX IF EXISTS knowledge_chunks_embedding_idx')
-                    conn.commit()
-                    print("✅ אינדקס ישן נמחק")
-                    
-                    # Create new index with optimal parameters
-                    cursor.execute(f'''
-                        CREATE INDEX knowledge_chunks_embedding_idx 
-                        ON knowledge_chunks 
-                        USING ivfflat (embedding vector_cosine_ops) 
-                        WITH (lists={optimal_lists})
-                    ''')
-                    conn.commit()
-                    print(f"✅ אינדקס חדש נוצר עם lists={optimal_lists}")
-                else:
-                    print("✅ האינדקס כבר מותאם")
-            else:
-                print("⚠️  לא נמצא lists parameter - בונה אינדקס חדש...")
-                cursor.execute('DROP INDEX IF EXISTS knowledge_chunks_embedding_idx')
-                cursor.execute(f'''
-                    CREATE INDEX knowledge_chunks_embedding_idx 
-                    ON knowledge_chunks 
-                    USING ivfflat (embedding vector_cosine_ops) 
-                    WITH (lists={optimal_lists})
-                ''')
-                conn.commit()
-                print(f"✅ אינדקס חדש נוצר")
+
+        if index_type == "ivfflat":
+            wanted = {"lists": lists or optimal_lists(count)}
         else:
-            print("⚠️  לא נמצא אינדקס - יוצר חדש...")
-            cursor.execute(f'''
-                CREATE INDEX knowledge_chunks_embedding_idx 
-                ON knowledge_chunks 
-                USING ivfflat (embedding vector_cosine_ops) 
-                WITH (lists={optimal_lists})
-            ''')
-            conn.commit()
-            print(f"✅ אינדקס נוצר")
-        
+            wanted = {"m": m, "ef_construction": ef_construction}
+        print(f"💡 אינדקס מבוקש: {index_type} {wanted}")
+
+        auto_lists = index_type == "ivfflat" and not lists
+        ensure_index(conn, cursor, index_type, wanted, force, auto_lists=auto_lists)
+        if exclude_general_index or current_index(cursor, NOT_GENERAL_INDEX_NAME):
+            # The predicate must stay identical to RetrievalFilter.sql() for the planner to use it
+            ensure_index(
+                conn, cursor, index_type, wanted, force, NOT_GENERAL_INDEX_NAME, NOT_GENERAL_SQL, auto_lists=auto_lists
+            )
+
         # Analyze table for better query planning
         print("\n📊 מריץ ANALYZE על הטבלה...")
         cursor.execute('ANALYZE knowledge_chunks')
         conn.commit()
         print("✅ ANALYZE הושלם")
-        
+
     except Exception as e:
         print(f"❌ שגיאה: {e}")
         conn.rollback()
+        raise
     finally:
         cursor.close()
+
+
+# === BENCHMARK ===
+
+_TOP_K_SQL = """
+    SELECT id
+    FROM knowledge_chunks
+    WHERE embedding IS NOT NULL
+    ORDER BY embedding <=> %s::vector
+    LIMIT %s
+"""
+
+
+def _run_top_k(cursor, settings: List[str], vector: str, k: int) -> List[str]:
+    for setting in settings:
+        cursor.execute(f"SET LOCAL {setting}")
+    cursor.execute(_TOP_K_SQL, (vector, k))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _question_vectors(path: str, num_queries: int) -> List[str]:
+    """Held-out queries: questions from a file (one per line) encoded with the retrieval model"""
+    from rag.model_cache import get_embedding_model
+    from rag.pgvector import to_vector_literal
+    from rag.query_improved import EMBEDDING_MODEL_NAME
+
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()][:num_queries]
+    embeddings = get_embedding_model(EMBEDDING_MODEL_NAME).encode(
+        questions, convert_to_numpy=True, show_progress_bar=False
+    )
+    return [to_vector_literal(e) for e in embeddings]
+
+
+def benchmark(conn, k: int, num_queries: int, probes: List[int], ef_search: List[int], questions_file: Optional[str] = None):
+    """Latency and recall@k of the current index vs exact (sequential scan) search"""
+    cursor = conn.cursor()
+    current = current_index(cursor)
+    if not current:
+        print("⚠️  אין אינדקס - אין מה למדוד")
+        return
+
+    if questions_file:
+        queries = _question_vectors(questions_file, num_queries)
+    else:
+        # Stored embeddings as queries (no model needed). Biased upward: each query is itself
+        # a row, sits at distance 0 in its own list / graph neighbourhood and is always found,
+        # so recall reads higher than for real questions - pass --questions for held-out queries
+        print("⚠️  Queries are stored chunk embeddings: recall is optimistic (use --questions)")
+        cursor.execute(
+            "SELECT embedding::text FROM knowledge_chunks WHERE embedding IS NOT NULL ORDER BY random() LIMIT %s",
+            (num_queries, ),
+        )
+        queries = [row[0] for row in cursor.fetchall()]
+        conn.rollback()
+
+    print(f"\n🏁 Benchmark: {current['type']} {current['params']}, {len(queries)} queries, recall@{k}")
+    print("-" * 80)
+
+    exact = []
+    start = time.perf_counter()
+    for vector in queries:
+        exact.append(set(_run_top_k(cursor, ["enable_indexscan = off", "enable_bitmapscan = off"], vector, k)))
+        conn.rollback()
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"{'exact (seq scan)':<24} {exact_ms:8.2f} ms/query   recall 1.000")
+
+    if current["type"] == "hnsw":
+        knobs = [f"hnsw.ef_search = {v}" for v in ef_search]
+    else:
+        knobs = [f"ivfflat.probes = {v}" for v in probes]
+
+    for knob in knobs:
+        recalls = []
+        start = time.perf_counter()
+        for vector, truth in zip(queries, exact):
+            found = _run_top_k(cursor, [knob], vector, k)
+            conn.rollback()
+            recalls.append(len(truth.intersection(found)) / max(len(truth), 1))
+        ms = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"{knob:<24} {ms:8.2f} ms/query   recall {sum(recalls) / len(recalls):.3f}")
+
+    knob_env = "RAG_HNSW_EF_SEARCH" if current["type"] == "hnsw" else "RAG_IVFFLAT_PROBES"
+    print(f"\n💡 RagQueryEngine: RAG_VECTOR_INDEX_TYPE={current['type']} {knob_env}=<value>")
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage and benchmark the knowledge_chunks vector index")
+    parser.add_argument("--type", choices=["ivfflat", "hnsw"], default="ivfflat", help="Index type")
+    parser.add_argument("--lists", type=int, default=None, help="ivfflat lists (default: rows/1000, min 10)")
+    parser.add_argument("--m", type=int, default=DEFAULT_HNSW_M, help="HNSW max connections per layer")
+    parser.add_argument("--ef-construction", type=int, default=DEFAULT_HNSW_EF_CONSTRUCTION, help="HNSW build candidate list size")
+    parser.add_argument(
+        "--force", action="store_true",
+        help=f"Rebuild even if the index already matches (or its lists is within {LISTS_TOLERANCE:g}x of rows/1000)",
+    )
+    parser.add_argument(
+        "--exclude-general-index", action="store_true",
+        help=f"Also create {NOT_GENERAL_INDEX_NAME} (partial index for RAG_EXCLUDE_GENERAL_CHUNKS)",
+    )
+    parser.add_argument("--benchmark-only", action="store_true", help="Skip the rebuild, only benchmark")
+    parser.add_argument("--no-benchmark", action="store_true", help="Skip the benchmark")
+    parser.add_argument("--k", type=int, default=50, help="Top-k for recall (default: RagQueryEngine's top_k_retrieve)")
+    parser.add_argument("--queries", type=int, default=50, help="Number of benchmark queries")
+    parser.add_argument(
+        "--questions", default=None,
+        help="File of benchmark questions, one per line (encoded with the embedding model; default: stored chunk embeddings)",
+    )
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10, 20], help="ivfflat.probes values to test")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 80, 160], help="hnsw.ef_search values to test")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        if not args.benchmark_only:
+            optimize_index(conn, args.type, args.lists, args.m, args.ef_construction, args.force, args.exclude_general_index)
+        if not args.no_benchmark:
+            benchmark(conn, args.k, args.queries, args.probes, args.ef_search, args.questions)
+    finally:
         conn.close()
 
+
 if __name__ == "__main__":
     print("🚀 אופטימיזציה של אינדקס ה-vector")
     print("=" * 80)
-    optimize_index()
+    main()
     print("=" * 80)
     print("✅ סיום!")
-
@@ -10,9 +10,10 @@ from typing import Dict, List
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from rag.query_improved import RagQueryEngine
+from rag.query_improved import RagQueryEngine, DEFAULT_PREPARED_STATEMENTS, _candidate_from_row
 from rag.model_cache import get_embedding_model, get_rerank_model
-import psycopg2
+from rag.db import get_pool
+from rag.pgvector import to_vector_literal
 import json
 
 # Configuration
@@ -24,6 +25,21 @@ RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 USE_LLAMA_CPP = os.getenv("USE_LLAMA_CPP", "false").lower() == "true"
 LLAMA_CPP_MODEL_PATH = os.getenv("LLAMA_CPP_MODEL_PATH", "models/hebrewllama.Q5_K_M.gguf")
 
+# Same statement as RagQueryEngine's vector retrieval
+RETRIEVE_SQL = """
+    SELECT
+        id,
+        text,
+        metadata,
+        source,
+        "order",
+        embedding <=> %(vector)s::vector AS distance
+    FROM knowledge_chunks
+    WHERE embedding IS NOT NULL
+    ORDER BY distance
+    LIMIT %(top_k)s
+"""
+
 
 class PerformanceProfiler:
     def __init__(self):
@@ -108,43 +124,37 @@ def profile_full_pipeline(question: str):
     print("\n🗄️  שלב 3: חיפוש במסד הנתונים (Database Search)")
     print("-" * 80)
     
-    conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
+    # Process-wide pool: the statement is PREPAREd once per connection, so later
+    # questions only EXECUTE it (the server switches to its cached generic plan after
+    # a few custom-planned executions)
+    pool = get_pool(DATABASE_URL)
+    params = {"vector": to_vector_literal(q_emb), "top_k": 50}
     
-    embedding_str = '[' + ','.join(map(str, q_emb.tolist())) + ']'
+    def search(conn):
+        cursor = conn.cursor()
+        pool.execute(cursor, RETRIEVE_SQL, params, prepare=DEFAULT_PREPARED_STATEMENTS)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
     
     start_db = time.time()
-    cursor.execute("""
-        SELECT 
-            id,
-            text,
-            metadata,
-            source,
-            "order",
-            embedding <=> %s::vector AS distance
-        FROM knowledge_chunks
-        WHERE embedding IS NOT NULL
-        ORDER BY embedding <=> %s::vector
-        LIMIT 50
-    """, (embedding_str, embedding_str,))
-    
-    candidates = []
-    for row in cursor.fetchall():
-        id, text, metadata, source, order, distance = row
-        metadata_dict = metadata if isinstance(metadata, dict) else json.loads(metadata) if metadata else {}
-        candidates.append({
-            "id": id,
-            "text": text,
-            "metadata": metadata_dict,
-            "source": source or "unknown",
-            "chunk_index": order or 0,
-            "order": order or 0,
-            "distance": float(distance)
-        })
-    
+    candidates = [_candidate_from_row(row) for row in pool.run(search)]
     profiler.timings["3. חיפוש במסד הנתונים"] = time.time() - start_db
     print(f"   ✅ נמצאו {len(candidates)} מועמדים")
     
+    # Planning time on the server (separate EXPLAIN round trip, outside the timing above)
+    plan_times: List[float] = []
+    
+    def explain(conn):
+        cursor = conn.cursor()
+        pool.execute(cursor, RETRIEVE_SQL, params, prepare=DEFAULT_PREPARED_STATEMENTS, plan_times=plan_times)
+        cursor.close()
+    
+    pool.run(explain)
+    print(f"   🧮 Planning: {plan_times[0]:.3f}ms "
+          f"({'prepared statement' if DEFAULT_PREPARED_STATEMENTS else 'planned per query'}, "
+          f"pool stats: {pool.stats})")
+    
     # ===== שלב 4: Re-ranking =====
     print("\n📊 שלב 4: Re-ranking (דירוג מחדש)")
     print("-" * 80)
@@ -171,9 +181,6 @@ def profile_full_pipeline(question: str):
         top_chunks = []
         profiler.timings["4. Re-ranking"] = 0.0
     
-    cursor.close()
-    conn.close()
-    
     # ===== שלב 5: בניית Prompt =====
     print("\n📝 שלב 5: בניית Prompt (Prompt Building)")
     print("-" * 80)
@@ -219,7 +226,19 @@ if __name__ == "__main__":
         "מה ההבדל בין תודעה ראקטיבית לתודעה פרואקטיבית?",
     ]
     
-    print("⚠️  הערה: הפעלה ראשונה כוללת טעינת מודלים (איטי יותר)")
+    if "--cold" in sys.argv:
+        print("⚠️  הערה: הפעלה ראשונה כוללת טעינת מודלים (איטי יותר)")
+    else:
+        # Same warm-up the RAG worker runs before serving, so the profile shows steady-state latency
+        print("🔥 Warm-up (models, vector index, few-shot files) - use --cold to profile a cold start")
+        engine = RagQueryEngine(
+            database_url=DATABASE_URL,
+            embedding_model_name=EMBEDDING_MODEL_NAME,
+            rerank_model_name=RERANK_MODEL_NAME,
+        )
+        warmup_report = engine.warmup()
+        print(json.dumps(warmup_report, ensure_ascii=False, indent=2))
+        engine.close()
     print("=" * 80)
     print()
     
@@ -13,6 +13,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from rag.query_improved import RagQueryEngine
 
+# Questions per answer_many() call
+BATCH_SIZE = 32
+
 def generate_questions(num_questions: int = 1000) -> List[str]:
     """Generate diverse questions from the knowledge base"""
     import psycopg2
@@ -64,11 +67,11 @@ def generate_questions(num_questions: int = 1000) -> List[str]:
     
     return questions[:num_questions]
 
-def analyze_question(engine: RagQueryEngine, question: str) -> Dict:
-    """Analyze chunks for a question"""
-    # Retrieve and rerank
-    candidates = engine.retrieve_candidates(question)
-    chunks = engine.rerank(question, candidates)
+def analyze_question(engine: RagQueryEngine, question: str, chunks: List[Dict] = None) -> Dict:
+    """Analyze chunks for a question (retrieves + reranks unless chunks are given)"""
+    if chunks is None:
+        candidates = engine.retrieve_candidates(question)
+        chunks = engine.rerank(question, candidates)
     
     if not chunks:
         return {
@@ -135,10 +138,12 @@ def main():
     
     # Analyze questions
     print("\n🔍 Analyzing questions...")
+    # Batched: one encode, one SQL statement and shared rerank batches per BATCH_SIZE questions
     results = []
-    for question in tqdm(questions, desc="Analyzing"):
-        result = analyze_question(engine, question)
-        results.append(result)
+    for start in tqdm(range(0, len(questions), BATCH_SIZE), desc="Analyzing"):
+        batch = questions[start:start + BATCH_SIZE]
+        for question, (_, chunks, _) in zip(batch, engine.answer_many(batch)):
+            results.append(analyze_question(engine, question, chunks))
     
     # Calculate statistics
     total = len(results)
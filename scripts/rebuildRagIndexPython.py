@@ -4,20 +4,36 @@ Rebuild RAG index from JSONL files using Python
 More efficient than TypeScript for embedding generation
 """
 import os
+import sys
 import json
 import re
 import time
 from pathlib import Path
 from typing import List, Dict, Any
-import psycopg2
 from psycopg2.extras import execute_values
 import numpy as np
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from rag.db import get_pool
+from rag.pgvector import upsert_rows_binary, to_vector_literal
+
 # Database connection
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://tzahimoyal@localhost:5432/talbashanai")
 
+# Columns written by the binary COPY upsert (name, postgres type)
+KNOWLEDGE_CHUNK_COLUMNS = [
+    ("id", "text"),
+    ("text", "text"),
+    ("metadata", "jsonb"),
+    ("source", "text"),
+    ("order", "int4"),
+    ("embedding", "vector"),
+]
+
 # Paths
 RAG_DIR = Path(__file__).parent.parent / "data" / "rag"
 EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"  # 768 dimensions, good for Hebrew
@@ -239,15 +255,13 @@ def index_chunks_to_db(chunks: List[Dict[str, Any]], embed_model: SentenceTransf
         values = []
         for chunk, embedding in zip(batch, embeddings):
             try:
-                embedding_str = '[' + ','.join(map(str, embedding.tolist())) + ']'
-                
                 values.append((
                     chunk['id'],
                     chunk['text'],
                     json.dumps(chunk['metadata']),
                     chunk['metadata']['source'],
                     chunk['metadata']['order'],
-                    embedding_str
+                    embedding
                 ))
             except Exception as e:
                 errors += 1
@@ -255,11 +269,23 @@ def index_chunks_to_db(chunks: List[Dict[str, Any]], embed_model: SentenceTransf
                     print(f"   ❌ Error preparing {chunk['id']}: {e}")
                 continue
         
-        # Insert chunks one by one (pgvector needs explicit casting)
-        # Use savepoint to handle errors without failing entire batch
         if values:
             batch_errors = 0
-            for value in values:
+            # Fast path: whole batch through binary COPY (no float text formatting/parsing)
+            try:
+                cursor.execute("SAVEPOINT sp_batch")
+                upsert_rows_binary(cursor, "knowledge_chunks", KNOWLEDGE_CHUNK_COLUMNS, values)
+                cursor.execute("RELEASE SAVEPOINT sp_batch")
+                indexed += len(values)
+                fallback_values = []
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT sp_batch")
+                print(f"   ⚠️  Batch COPY failed, falling back to row-by-row: {str(e)[:100]}")
+                fallback_values = values
+            
+            # Fallback: insert one by one (pgvector needs explicit casting)
+            # Use savepoint to handle errors without failing entire batch
+            for value in fallback_values:
                 try:
                     # Use savepoint for each insert to avoid transaction failure
                     cursor.execute("SAVEPOINT sp_insert")
@@ -272,7 +298,7 @@ def index_chunks_to_db(chunks: List[Dict[str, Any]], embed_model: SentenceTransf
                             source = EXCLUDED.source,
                             "order" = EXCLUDED."order",
                             embedding = EXCLUDED.embedding
-                    """, value)
+                    """, value[:5] + (to_vector_literal(value[5]),))
                     cursor.execute("RELEASE SAVEPOINT sp_insert")
                     indexed += 1
                 except Exception as e:
@@ -377,15 +403,13 @@ def main():
     embed_model = SentenceTransformer(EMBEDDING_MODEL)
     print("✅ Embedding model loaded")
     
-    # Connect to database
+    # Connect to database (connection from the shared pool)
     print(f"\n🔌 Connecting to database...")
-    conn = psycopg2.connect(DATABASE_URL)
-    print("✅ Connected to database")
-    
-    # Index chunks
-    index_chunks_to_db(all_chunks, embed_model, conn)
-    
-    conn.close()
+    with get_pool(DATABASE_URL).connection() as conn:
+        print("✅ Connected to database")
+        
+        # Index chunks
+        index_chunks_to_db(all_chunks, embed_model, conn)
     print("\n✨ Rebuild complete!")
 
 
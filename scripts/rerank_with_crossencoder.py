@@ -14,6 +14,8 @@ sys.path.insert(0, project_root)
 
 from sentence_transformers import CrossEncoder
 
+from rag.score_cache import get_pair_score_cache
+
 # Default rerank model (fast and good quality)
 # Options for Hebrew support:
 # - "BAAI/bge-reranker-base" - Best for Hebrew (multilingual, 100+ languages)
@@ -62,11 +64,8 @@ def rerank_chunks(query: str, chunks: List[Dict], top_n: int = 8) -> List[Dict]:
     # Get reranker
     reranker = get_reranker()
     
-    # Prepare pairs for CrossEncoder: [query, chunk_text]
-    pairs = [[query, chunk.get("text", "")] for chunk in chunks]
-    
-    # Get scores from CrossEncoder
-    scores = reranker.predict(pairs, show_progress_bar=False, batch_size=32)
+    # Get scores from CrossEncoder (pairs already scored by this model come from the cache)
+    scores = get_pair_score_cache().score(reranker, _rerank_model_name, query, chunks, batch_size=32)
     
     # Add score to each chunk
     for chunk, score in zip(chunks, scores):
@@ -0,0 +1,76 @@
+// Test script for the Python RAG worker client: request timeout, restart and crash recovery
+// Runs against tests/fake_rag_worker.py (no models or database needed)
+process.env.RAG_WORKER_MODULE = 'tests.fake_rag_worker'
+process.env.RAG_WORKER_REQUEST_TIMEOUT_MS = '1000'
+
+type CallRagWorker = <T>(op: string, params: Record<string, unknown>) => Promise<T>
+
+async function expectRejection(promise: Promise<unknown>, message: string): Promise<boolean> {
+  try {
+    await promise
+    console.log(`   ❌ Expected a rejection containing "${message}"`)
+    return false
+  } catch (error) {
+    const text = error instanceof Error ? error.message : String(error)
+    if (!text.includes(message)) {
+      console.log(`   ❌ Rejected with "${text}", expected "${message}"`)
+      return false
+    }
+    return true
+  }
+}
+
+async function testTimeoutRestartsWorker(callRagWorker: CallRagWorker) {
+  console.log('🔍 Testing request timeout and restart...')
+  const { pid: firstPid } = await callRagWorker<{ pid: number }>('ping', {})
+
+  // The ping is queued behind the stuck request; it must run on the replacement worker
+  const hung = callRagWorker('hang', {})
+  const queued = callRagWorker<{ pid: number }>('ping', {})
+  if (!(await expectRejection(hung, 'timed out after 1000ms'))) return false
+
+  const { pid: secondPid } = await queued
+  if (secondPid === firstPid) {
+    console.log(`   ❌ Queued request ran on the stuck worker (pid ${firstPid})`)
+    return false
+  }
+  console.log(`   ✅ Stuck worker ${firstPid} replaced by ${secondPid}, queued request served`)
+  return true
+}
+
+async function testCrashRestartsWorker(callRagWorker: CallRagWorker) {
+  console.log('\n🔍 Testing worker crash recovery...')
+  const { pid: firstPid } = await callRagWorker<{ pid: number }>('ping', {})
+  if (!(await expectRejection(callRagWorker('crash', {}), 'exited with code 3'))) return false
+
+  const { pid: secondPid } = await callRagWorker<{ pid: number }>('ping', {})
+  if (secondPid === firstPid) {
+    console.log('   ❌ Request after the crash did not start a new worker')
+    return false
+  }
+  console.log(`   ✅ Crashed worker ${firstPid} replaced by ${secondPid}`)
+  return true
+}
+
+async function main() {
+  // Imported after the env overrides above: the client reads them at load time
+  const { callRagWorker } = await import('../src/server/vector/pythonRagWorker')
+
+  const results = [
+    await testTimeoutRestartsWorker(callRagWorker),
+    await testCrashRestartsWorker(callRagWorker),
+  ]
+
+  if (results.every(Boolean)) {
+    console.log('\n✅ All RAG worker client tests passed!')
+    process.exit(0)
+  } else {
+    console.log('\n❌ Some tests failed. Please fix the issues above.')
+    process.exit(1)
+  }
+}
+
+main().catch((error) => {
+  console.error('❌ Unhandled error:', error)
+  process.exit(1)
+})
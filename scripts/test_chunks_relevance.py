@@ -100,6 +100,11 @@ def main():
     else:
         print("⚠️  האינדקס צריך שיפור")
     
+    # Repeated runs (or RAG_QUERY_CACHE_DIR set) skip the embedding step for these questions
+    stats = engine.query_cache.get_stats()
+    print(f"🧠 Query embedding cache: {stats['memory_hits']} memory hits, "
+          f"{stats['disk_hits']} disk hits, {stats['misses']} misses")
+    
     engine.close()
 
 if __name__ == "__main__":
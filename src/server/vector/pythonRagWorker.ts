@@ -0,0 +1,202 @@
+/**
+ * Client for the long-lived Python RAG worker (rag/worker.py)
+ * Spawns the worker once and reuses it, so models and the DB connection stay warm
+ * between requests. Requests/responses are newline-delimited JSON over stdio.
+ */
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process'
+import { existsSync } from 'fs'
+import { createInterface } from 'readline'
+
+// Per request, counted from when it is written to the worker (requests are served one at a
+// time, so queued requests wait here in the client and their wait is not counted)
+const REQUEST_TIMEOUT_MS = Number(process.env.RAG_WORKER_REQUEST_TIMEOUT_MS) || 120_000
+// Cold start: model loads + warm-up before the worker sends {"ready": true}
+const STARTUP_TIMEOUT_MS = Number(process.env.RAG_WORKER_STARTUP_TIMEOUT_MS) || 600_000
+// Python module run as the worker (scripts/test-rag-worker.ts swaps in a stub)
+const WORKER_MODULE = process.env.RAG_WORKER_MODULE || 'rag.worker'
+
+interface PendingRequest {
+  id: number
+  op: string
+  params: Record<string, unknown>
+  resolve: (value: any) => void
+  reject: (error: Error) => void
+  timer?: NodeJS.Timeout
+}
+
+let workerProcess: ChildProcessWithoutNullStreams | null = null
+let workerIsReady = false
+// The one request the worker is serving; the rest wait in `queue` until it answers
+let inFlight: PendingRequest | null = null
+const queue: PendingRequest[] = []
+let nextRequestId = 1
+
+/**
+ * Write the next queued request to the worker once it is ready and idle, spawning a
+ * worker first if there is none (first use, or after a crash/restart)
+ */
+function dispatchNext() {
+  if (inFlight || queue.length === 0) return
+  if (!workerProcess) {
+    workerProcess = startWorker()
+    workerIsReady = false
+    return
+  }
+  if (!workerIsReady) return
+
+  const child = workerProcess
+  const request = queue.shift()!
+  inFlight = request
+  request.timer = setTimeout(() => {
+    if (inFlight !== request) return
+    inFlight = null
+    request.reject(new Error(`Python RAG worker timed out after ${REQUEST_TIMEOUT_MS}ms (op: ${request.op})`))
+    // Only the request the worker is actually running can time out, so the worker is stuck:
+    // replace it. Queued requests were never sent and move to the fresh worker.
+    stopWorker(child)
+  }, REQUEST_TIMEOUT_MS)
+  child.stdin.write(JSON.stringify({ id: request.id, op: request.op, params: request.params }) + '\n')
+}
+
+/**
+ * Forget the worker (failing its in-flight request, if any) and start a new one for the
+ * queued requests
+ */
+function workerGone(child: ChildProcessWithoutNullStreams, error: Error) {
+  if (workerProcess !== child) return
+  workerProcess = null
+  workerIsReady = false
+  if (inFlight) {
+    clearTimeout(inFlight.timer)
+    inFlight.reject(error)
+    inFlight = null
+  }
+  dispatchNext()
+}
+
+/**
+ * Detach and kill a worker; its exit does not touch the requests that outlive it
+ */
+function stopWorker(child: ChildProcessWithoutNullStreams) {
+  if (workerProcess === child) {
+    workerProcess = null
+    workerIsReady = false
+  }
+  child.kill('SIGKILL')
+  dispatchNext()
+}
+
+/**
+ * Fail every queued request (the worker cannot start, so retrying would loop)
+ */
+function failQueued(error: Error) {
+  for (const request of queue.splice(0)) {
+    request.reject(error)
+  }
+}
+
+function startWorker(): ChildProcessWithoutNullStreams {
+  const cwd = process.cwd()
+
+  // Use venv Python if available, otherwise use system python3
+  const venvPython = `${cwd}/venv/bin/python3`
+  const pythonPath = existsSync(venvPython) ? venvPython : 'python3'
+
+  const child = spawn(pythonPath, ['-m', WORKER_MODULE], {
+    cwd: cwd,
+    env: {
+      ...process.env,
+      PYTHONUNBUFFERED: '1',
+      USE_LLAMA_CPP: 'true',  // Always use llama.cpp + GGUF
+      PATH: `${cwd}/venv/bin:${process.env.PATH}`, // Add venv to PATH
+    }
+  })
+
+  // Worker logs (model loading, timings) go to stderr
+  child.stderr.on('data', (data) => {
+    process.stderr.write(`[rag-worker] ${data.toString()}`)
+  })
+
+  const startupTimer = setTimeout(() => {
+    if (workerProcess === child) {
+      workerProcess = null
+      workerIsReady = false
+    }
+    child.kill('SIGKILL')
+    failQueued(new Error(`Python RAG worker not ready after ${STARTUP_TIMEOUT_MS}ms`))
+  }, STARTUP_TIMEOUT_MS)
+
+  // A write to a dying worker fails with EPIPE here; unhandled it would crash the server
+  child.stdin.on('error', (error) => {
+    workerGone(child, new Error(`Python RAG worker stdin failed: ${error.message}`))
+    child.kill('SIGKILL')
+  })
+
+  createInterface({ input: child.stdout }).on('line', (line) => {
+    let response: { id: number; ok?: boolean; result?: any; error?: string; event?: unknown; ready?: boolean }
+    try {
+      response = JSON.parse(line)
+    } catch {
+      console.warn(`[rag-worker] Ignoring non-JSON output: ${line.substring(0, 200)}`)
+      return
+    }
+
+    if (response.ready) {
+      clearTimeout(startupTimer)
+      if (workerProcess === child) {
+        workerIsReady = true
+        dispatchNext()
+      }
+      return
+    }
+
+    const request = inFlight
+    if (workerProcess !== child || !request || request.id !== response.id) return
+
+    // Stage events of streaming ops (answer_stream); only the final response is used here
+    if (response.event) return
+
+    inFlight = null
+    clearTimeout(request.timer)
+
+    if (response.ok) {
+      request.resolve(response.result)
+    } else {
+      request.reject(new Error(response.error || 'Python RAG worker request failed'))
+    }
+    dispatchNext()
+  })
+
+  child.on('exit', (code) => {
+    clearTimeout(startupTimer)
+    const wasReady = workerIsReady && workerProcess === child
+    const error = new Error(`Python RAG worker exited with code ${code}`)
+    // A worker that dies before it is ready would die again for the queued requests
+    if (workerProcess === child && !wasReady) {
+      workerProcess = null
+      failQueued(error)
+      return
+    }
+    workerGone(child, error)
+  })
+
+  child.on('error', (error) => {
+    clearTimeout(startupTimer)
+    if (workerProcess !== child) return
+    workerProcess = null
+    workerIsReady = false
+    failQueued(new Error(`Failed to start Python RAG worker: ${error.message}`))
+  })
+
+  return child
+}
+
+/**
+ * Send one request to the worker, starting it on first use (or after a crash)
+ */
+export function callRagWorker<T>(op: string, params: Record<string, unknown>): Promise<T> {
+  return new Promise<T>((resolve, reject) => {
+    queue.push({ id: nextRequestId++, op, params, resolve, reject })
+    dispatchNext()
+  })
+}
@@ -2,8 +2,6 @@
  * RAG Query with OpenAI API
  * Uses Python RAG for retrieval, but OpenAI API for LLM
  */
-import { spawn } from 'child_process'
-import { existsSync } from 'fs'
 import { chatCompletion, chatCompletionStream, embedText } from '../openai'
 import { prisma } from '@/src/server/db/client'
 import { searchUserMemories } from './search'
@@ -11,6 +9,7 @@ import { serializeUserContextSnippet, buildMessagesForModel } from '../memory/pr
 import { loadSystemPrompt } from '../prompts/loadSystemPrompt'
 import type { LongTermMemory } from '@/src/types/longTermMemory'
 import type { ChatMessage } from '../memory/promptHelpers'
+import { callRagWorker } from './pythonRagWorker'
 
 export interface OpenAIRagResult {
   answer: string
@@ -443,7 +442,7 @@ export async function retrieveChunksWithPython(
 }
 
 /**
- * Re-rank chunks using Python CrossEncoder
+ * Re-rank chunks using Python CrossEncoder (via the long-lived Python RAG worker)
  */
 async function rerankWithCrossEncoder(
   query: string,
@@ -464,111 +463,20 @@ async function rerankWithCrossEncoder(
   rerank_score: number
   distance: number
 }>> {
-  return new Promise((resolve, reject) => {
-    const cwd = process.cwd()
-    const pythonCode = `
-import sys
-import os
-import json
-sys.path.insert(0, '${cwd.replace(/'/g, "\\'")}')
-
-from scripts.rerank_with_crossencoder import rerank_chunks
-
-try:
-    # Prepare candidates for re-ranking
-    candidates = ${JSON.stringify(candidates.map(c => ({
+  const result = await callRagWorker<unknown>('rerank', {
+    query: query,
+    candidates: candidates.map(c => ({
       id: c.id,
       text: c.text,
       source: c.source || 'unknown',
       chunk_index: c.order || 0,
       distance: c.distance
-    })))}
-    
-    # Re-rank using CrossEncoder
-    reranked = rerank_chunks('''${query.replace(/'/g, "\\'\\'")}''', candidates, top_n=${topN})
-    
-    result = [
-        {
-            "id": str(s.get("id", "")),
-            "text": s.get("text", ""),
-            "source": s.get("source", "unknown"),
-            "chunk_index": int(s.get("chunk_index", s.get("order", 0))),
-            "rerank_score": float(s.get("rerank_score", 0)),
-            "distance": float(s.get("distance", 0))
-        }
-        for s in reranked
-    ]
-    print(json.dumps(result, ensure_ascii=False))
-except Exception as e:
-    import traceback
-    error_msg = {
-        "error": str(e),
-        "traceback": traceback.format_exc()
-    }
-    print(json.dumps(error_msg, ensure_ascii=False), file=sys.stderr)
-    sys.exit(1)
-    `
-
-    const venvPython = `${cwd}/venv/bin/python3`
-    const pythonPath = existsSync(venvPython) ? venvPython : 'python3'
-    
-    const pythonProcess = spawn(pythonPath, ['-c', pythonCode], {
-      cwd: cwd,
-      env: { 
-        ...process.env, 
-        PYTHONUNBUFFERED: '1',
-        PATH: `${cwd}/venv/bin:${process.env.PATH}`,
-      }
-    })
-
-    let stdout = ''
-    let stderr = ''
-
-    pythonProcess.stdout.on('data', (data) => {
-      stdout += data.toString()
-    })
-
-    pythonProcess.stderr.on('data', (data) => {
-      stderr += data.toString()
-    })
-
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        try {
-          const errorMatch = (stderr || stdout).match(/\{[\s\S]*"error"[\s\S]*\}/)
-          if (errorMatch) {
-            const errorData = JSON.parse(errorMatch[0])
-            reject(new Error(errorData.error || `Python process exited with code ${code}`))
-          } else {
-            reject(new Error(`Python process exited with code ${code}. Error: ${stderr || stdout}`))
-          }
-        } catch {
-          reject(new Error(`Python process exited with code ${code}. Error: ${stderr || stdout}`))
-        }
-        return
-      }
-
-      try {
-        const jsonMatch = stdout.match(/\[[\s\S]*\]/)
-        if (!jsonMatch) {
-          reject(new Error(`No JSON array found in Python output. Output: ${stdout.substring(0, 500)}`))
-          return
-        }
-        
-        const result = JSON.parse(jsonMatch[0])
-        if (Array.isArray(result)) {
-          resolve(result)
-        } else {
-          reject(new Error(`Expected array, got: ${typeof result}`))
-        }
-      } catch (error) {
-        reject(new Error(`Failed to parse Python output: ${error instanceof Error ? error.message : String(error)}\nOutput: ${stdout.substring(0, 500)}`))
-      }
-    })
-
-    pythonProcess.on('error', (error) => {
-      reject(new Error(`Failed to start Python process: ${error.message}`))
-    })
+    })),
+    top_n: topN,
   })
-}
 
+  if (!Array.isArray(result)) {
+    throw new Error(`Expected array, got: ${typeof result}`)
+  }
+  return result
+}
@@ -0,0 +1,133 @@
+"""Fake models and an in-memory knowledge_chunks for the engine tests (no torch, no Postgres)"""
+import hashlib
+import json
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+
+from rag import query_improved
+from rag.pgvector import from_vector_literal, to_vector_literal
+
+DIM = 8
+RRF_K = 60
+rng = np.random.default_rng(7)
+CHUNKS = [
+    {
+        "id": f"chunk-{i}",
+        "text": f"קטע מספר {i}",
+        "metadata": json.dumps({"lesson": i % 3}),
+        "source": f"lesson{i % 3}.md",
+        "order": i,
+        "embedding": rng.normal(size=DIM).astype(np.float32),
+    }
+    for i in range(40)
+]
+
+
+class FakeEmbedder:
+    def encode(self, texts, **kwargs):
+        seed = int(hashlib.md5(texts[0].encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).normal(size=(1, DIM)).astype(np.float32)
+
+
+class FakeReranker:
+    def predict(self, pairs, **kwargs):
+        return np.array([-len(passage) for _, passage in pairs], dtype=np.float32)
+
+
+def _nearest(vector, top_k):
+    def distance(chunk):
+        e = chunk["embedding"]
+        return 1.0 - float(np.dot(e, vector) / (np.linalg.norm(e) * np.linalg.norm(vector)))
+    ranked = sorted(((distance(c), c) for c in CHUNKS), key=lambda pair: pair[0])
+    return ranked[:top_k]
+
+
+def _query(sql, vector, top_k, ids, embedding_out):
+    """knowledge_chunks as the retrieval statements see it (hybrid: vector ranks only)"""
+    with_embeddings = "embedding\n" in sql.split("FROM", 1)[0]
+    if "WHERE id = ANY" in sql:
+        fields = [f.strip('" ') for f in sql.split("SELECT id, ", 1)[1].split(" FROM", 1)[0].split(",")]
+        by_id = {c["id"]: c for c in CHUNKS}
+        return [(i, *(by_id[i][f] for f in fields)) for i in ids if i in by_id]
+    rows = []
+    for rank, (distance, c) in enumerate(_nearest(vector, top_k), start=1):
+        extra = (embedding_out(c["embedding"]),) if with_embeddings else ()
+        if sql.lstrip().startswith("SELECT id, embedding"):
+            rows.append((c["id"], distance, *extra))
+        elif "vector_hits" in sql:
+            rows.append((c["id"], c["text"], c["metadata"], c["source"], c["order"], distance, 1.0 / (RRF_K + rank), *extra))
+        else:
+            rows.append((c["id"], c["text"], c["metadata"], c["source"], c["order"], distance, *extra))
+    return rows
+
+
+class FakeCursor:
+    def __init__(self):
+        self.rows = []
+        self.connection = None
+
+    def execute(self, sql, params=None):
+        # fetch_knowledge_version (payload cache refresh)
+        self.rows = [(len(CHUNKS), None, None, 0)]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConn:
+    def cursor(self):
+        return FakeCursor()
+
+
+class FakeSyncPool:
+    def run(self, func, statement_timeout_ms=None):
+        return func(FakeConn())
+
+    def execute(self, cursor, sql, params, prefix="", prepare=True, plan_times=None):
+        if plan_times is not None:
+            plan_times.append(0.5)
+        vector = from_vector_literal(params["vector"]) if "vector" in params else None
+        cursor.rows = _query(sql, vector, params.get("top_k"), params.get("ids"), to_vector_literal)
+
+
+class FakeAsyncConn:
+    async def fetch(self, sql, *args):
+        vector = next((a for a in args if isinstance(a, np.ndarray)), None)
+        ids = next((a for a in args if isinstance(a, list)), None)
+        ints = [a for a in args if isinstance(a, int)]
+        return _query(sql, vector, ints[-1] if ints else None, ids, lambda e: e)
+
+    async def execute(self, sql):
+        pass
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class FakeAsyncPool:
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeAsyncConn()
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """RagQueryEngine loads FakeEmbedder and queries FakeSyncPool"""
+    monkeypatch.setattr(query_improved, "get_embedding_model", lambda name: FakeEmbedder())
+    monkeypatch.setattr(query_improved, "get_rerank_model", lambda name: FakeReranker())
+    monkeypatch.setattr(query_improved, "get_pool", lambda database_url: FakeSyncPool())
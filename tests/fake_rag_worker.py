@@ -0,0 +1,24 @@
+"""
+Stand-in for rag.worker in scripts/test-rag-worker.ts (same stdio protocol, no models)
+    ping  -> {"pid": ...}   (which worker process answered)
+    hang  -> never answers  (request timeout)
+    crash -> exits with code 3
+"""
+import os
+import sys
+import json
+
+
+def main():
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request["op"] == "hang":
+            continue
+        if request["op"] == "crash":
+            sys.exit(3)
+        print(json.dumps({"id": request["id"], "ok": True, "result": {"pid": os.getpid()}}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import numpy as np
+
+from rag.adaptive_depth import choose_depth
+
+
+def test_tied_distances_keep_full_depth():
+    assert choose_depth([0.3] * 40, floor=10, ceiling=30) == (30, "flat")
+
+
+def test_tied_head_is_not_a_cliff():
+    # Exact ties up to the floor, then an ordinary linear rise: no gap cut at the floor
+    distances = [0.2] * 10 + list(0.2 + 0.01 * np.arange(1, 31))
+    depth, method = choose_depth(distances, floor=10, ceiling=40)
+    assert method != "gap"
+    assert depth > 10
+
+
+def test_cliff_after_close_hits():
+    distances = list(0.20 + 0.005 * np.arange(12)) + list(0.60 + 0.005 * np.arange(28))
+    assert choose_depth(distances, floor=5, ceiling=40) == (12, "gap")
+
+
+def test_fewer_rows_than_floor():
+    assert choose_depth([0.1, 0.2, 0.3], floor=10, ceiling=50) == (3, "all")
@@ -0,0 +1,38 @@
+import pytest
+
+from rag.payload_cache import ChunkPayloadCache
+from rag.query_improved import RagQueryEngine
+
+QUESTION = "מה זה מעגל התודעה?"
+
+
+def _engine():
+    return RagQueryEngine(
+        database_url="postgresql://fake", payload_cache=ChunkPayloadCache(),
+        local_index_dir=None, semantic_cache_threshold=None, plan_timing=True,
+    )
+
+
+def test_abandoned_answer_stream_resets_plan_timing(fake_backend):
+    engine = _engine()
+    stream = engine.answer_stream(QUESTION)
+    assert next(stream)["type"] == "candidates"
+    stream.close()  # client disconnect after retrieval
+    assert engine._plan_times.values is None
+
+    # A full run on the same thread times only its own statements
+    top_chunks = list(engine.answer_stream(QUESTION))[-1]
+    assert top_chunks["timing"]["retrieve_plan_ms"] == 0.5
+
+
+def test_failed_retrieval_resets_plan_timing(fake_backend, monkeypatch):
+    engine = _engine()
+
+    def lost_connection(question):
+        engine._plan_times.values.append(0.5)
+        raise ConnectionError("connection lost")
+
+    monkeypatch.setattr(engine, "retrieve_candidates", lost_connection)
+    with pytest.raises(ConnectionError):
+        next(engine.answer_stream(QUESTION))
+    assert engine._plan_times.values is None
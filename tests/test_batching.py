@@ -0,0 +1,33 @@
+import numpy as np
+
+from rag.batching import make_batches, predict_pairs
+
+
+class ScoreByPassage:
+    """Scores each pair by the number its passage starts with; records the batches"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, show_progress_bar=False, batch_size=32):
+        self.batches.append(len(pairs))
+        return [float(passage.split()[0]) for _, passage in pairs]
+
+
+PAIRS = [["שאלה", f"{i} " + "מילה " * (i * 37 % 50)] for i in range(40)]
+
+
+def test_scores_come_back_in_input_order():
+    model = ScoreByPassage()
+    scores = predict_pairs(model, PAIRS, token_budget=256, max_batch_size=8)
+    np.testing.assert_array_equal(scores, np.arange(40, dtype=np.float32))
+    assert len(model.batches) > 1 and max(model.batches) <= 8
+
+
+def test_batches_stay_under_the_token_budget():
+    lengths = np.array([10, 200, 30, 90, 90, 5, 400, 60])
+    batches = make_batches(lengths, token_budget=300, max_batch_size=64)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        # A single pair over the budget still gets its own batch
+        assert len(batch) * lengths[batch].max() <= 300 or len(batch) == 1
@@ -0,0 +1,23 @@
+import os
+
+from rag.bm25_index import BM25Index, analyze
+
+
+def test_maqaf_separates_words():
+    assert analyze("בית־ספר") == analyze("בית ספר")
+    # Niqqud is still dropped
+    assert analyze("שָׁלוֹם") == analyze("שלום")
+
+
+def test_save_keeps_previous_generation_until_the_next_one(tmp_path):
+    directory = str(tmp_path / "bm25")
+    docs = [{"id": "a", "text": "מעגל התודעה"}, {"id": "b", "text": "בית ספר"}]
+    generations = []
+    for text in ("במעגל", "בבית", "מהמעגל"):
+        BM25Index.from_documents(docs + [{"id": "c", "text": text}]).save(directory)
+        generations.append(open(os.path.join(directory, "CURRENT")).read())
+
+    # Live and previous generations stay on disk, older ones are removed
+    assert sorted(n for n in os.listdir(directory) if n.startswith("gen-")) == sorted(generations[1:])
+    loaded = BM25Index.load(directory)
+    assert {d["id"] for d in loaded.search("מעגל", k=3)} == {"a", "c"}
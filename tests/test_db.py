@@ -0,0 +1,114 @@
+from contextlib import ExitStack
+
+import pytest
+from psycopg2 import extensions as pg_extensions
+
+from rag import db
+from rag.db import ConnectionPool, PoolClosedError, prepared_form
+
+
+class FakeCursor:
+    def __init__(self, connection=None):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        if self.connection is not None:
+            self.connection.statements.append(sql)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.statements = []
+
+    def get_transaction_status(self):
+        return pg_extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def test_connections_opened_under_load_stay_idle(monkeypatch):
+    opened = []
+    monkeypatch.setattr(db.psycopg2, "connect", lambda url: opened.append(FakeConnection()) or opened[-1])
+    pool = ConnectionPool("postgresql://fake", min_size=1, max_size=4)
+
+    with ExitStack() as stack:
+        conns = [stack.enter_context(pool.connection()) for _ in range(4)]
+        stats = pool.get_stats()
+        # Checked-out connections are counted as open
+        assert (stats["open"], stats["idle"], stats["in_use"]) == (4, 0, 4)
+
+    stats = pool.get_stats()
+    assert (stats["open"], stats["idle"], stats["in_use"]) == (4, 4, 0)
+    assert not any(conn.closed for conn in opened)
+
+    # Reused, not reconnected
+    with pool.connection() as conn:
+        assert conn in conns
+    assert len(opened) == 4
+
+    pool.close()
+    assert all(conn.closed for conn in opened)
+    assert pool.get_stats()["open"] == 0
+
+
+def test_closed_pool_refuses_checkouts(monkeypatch):
+    monkeypatch.setattr(db.psycopg2, "connect", lambda url: FakeConnection())
+    pool = ConnectionPool("postgresql://fake", min_size=1, max_size=2)
+    pool.close()
+
+    with pytest.raises(PoolClosedError):
+        with pool.connection():
+            pass
+    # The failed checkout gave its slot back and opened nothing
+    stats = pool.get_stats()
+    assert (stats["open"], stats["in_use"]) == (0, 0)
+    assert pool._slots.acquire(blocking=False) and pool._slots.acquire(blocking=False)
+
+
+def test_prepared_form_numbers_each_named_parameter_once():
+    name, text, names = prepared_form("SELECT %(a)s, %(b)s WHERE x = %(a)s")
+    assert text == "SELECT $1, $2 WHERE x = $1"
+    assert names == ("a", "b")
+    assert name == prepared_form("SELECT %(a)s, %(b)s WHERE x = %(a)s")[0] != prepared_form("SELECT %(a)s")[0]
+
+
+def test_statements_are_prepared_once_per_connection(monkeypatch):
+    opened = []
+    monkeypatch.setattr(db.psycopg2, "connect", lambda url: opened.append(FakeConnection()) or opened[-1])
+    pool = ConnectionPool("postgresql://fake", min_size=1, max_size=2)
+    sql = "SELECT id FROM knowledge_chunks WHERE id = %(id)s"
+    name = prepared_form(sql)[0]
+
+    for _ in range(3):
+        with pool.connection() as conn:
+            pool.execute(conn.cursor(), sql, {"id": "chunk-1"})
+    assert opened[0].statements.count(f"PREPARE {name} AS SELECT id FROM knowledge_chunks WHERE id = $1") == 1
+    assert opened[0].statements.count(f"EXECUTE {name}(%(id)s)") == 3
+
+    # A replacement connection starts without the statement
+    with pool.connection() as conn:
+        conn.closed = 1
+    with pool.connection() as conn:
+        pool.execute(conn.cursor(), sql, {"id": "chunk-1"}, prefix="SET LOCAL hnsw.ef_search = 40;")
+    assert opened[1].statements[-2:] == [
+        f"PREPARE {name} AS SELECT id FROM knowledge_chunks WHERE id = $1",
+        f"SET LOCAL hnsw.ef_search = 40; EXECUTE {name}(%(id)s)",
+    ]
+    assert pool.get_stats()["prepares"] == 2
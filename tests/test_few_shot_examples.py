@@ -0,0 +1,48 @@
+from rag import few_shot_examples
+from rag.bm25_index import token_variants
+
+QNA = [
+    {"question": "איך אני יודע מה השאלה הנכונה?", "answer_style": "זה מתחיל בשאלה פשוטה", "metadata": {}},
+    {"question": "מה זה מעגל התודעה?", "answer_style": "מעגל התודעה הוא", "metadata": {"key_term": "מעגל התודעה"}},
+    {"question": "איך שומרים על גבול?", "answer_style": "גבול הוא", "metadata": {"key_term": "גבול"}},
+]
+
+
+def _selected(monkeypatch, question):
+    monkeypatch.setattr(few_shot_examples, "_qna_examples", QNA)
+    monkeypatch.setattr(few_shot_examples, "_few_shot_examples", "")
+    return few_shot_examples.get_relevant_examples(question, max_examples=2)
+
+
+def test_prefix_stripping_keeps_four_letter_stems():
+    assert token_variants("במעגל") == ["במעגל", "מעגל"]
+    assert token_variants("השאלה") == ["השאלה", "שאלה"]
+    assert token_variants("שלום") == ["שלום"]
+
+
+def test_unrelated_question_selects_no_examples(monkeypatch):
+    assert _selected(monkeypatch, "מה שלומך היום, אלה?") == ""
+
+
+def test_examples_ranked_by_overlap(monkeypatch):
+    result = _selected(monkeypatch, "מה המשמעות של מעגל התודעה במעגל?")
+    assert "מה זה מעגל התודעה?" in result
+    assert "גבול" not in result
+    assert "השאלה הנכונה" not in result
+
+
+def _selected_from_qna_file(monkeypatch, question):
+    monkeypatch.setattr(few_shot_examples, "_qna_examples", None)
+    monkeypatch.setattr(few_shot_examples, "_few_shot_examples", "")
+    result = few_shot_examples.get_relevant_examples(question, max_examples=3)
+    return [line[len("שאלה: "):] for line in result.splitlines() if line.startswith("שאלה: ")]
+
+
+def test_lesson_examples_matched_across_inflections(monkeypatch):
+    # data/rag/qna.jsonl, the examples shipped with the app
+    assert _selected_from_qna_file(monkeypatch, "איך אני משחררת את המראה?")[0] == "איך אני משחרר את המראה?"
+    assert _selected_from_qna_file(monkeypatch, "למה אני לא מסוגל להתחנף?")[0] == "למה אני לא מסוגלת להתחנף?"
+    assert _selected_from_qna_file(monkeypatch, "מה הקשר בין הסרגלים לריאקטיביות?")[0].startswith(
+        "מהו הקשר בין סט קבוע של סרגלים לבין ריאקטיביות?"
+    )
+    assert _selected_from_qna_file(monkeypatch, "מה זה מתכון לעוגת שוקולד?") == []
@@ -0,0 +1,60 @@
+import weakref
+
+from rag import model_cache
+from rag.model_cache import ModelRegistry
+
+
+class _Model:
+    def __init__(self, size_mb):
+        self.size_bytes = size_mb * 1024 * 1024
+
+
+def test_budget_stops_when_eviction_does_not_lower_rss(monkeypatch):
+    # RSS stays over budget whatever is unloaded (index mmap, caches, allocator slack)
+    monkeypatch.setattr(model_cache, "_current_rss_bytes", lambda: 4096 * 1024 * 1024)
+    registry = ModelRegistry(budget_mb=0)
+    for key in ("a", "b", "c"):
+        registry.get(key, lambda: _Model(100))
+    registry.budget_bytes = 1024 * 1024 * 1024
+    registry.get("d", lambda: _Model(100))
+
+    # The first eviction shows no RSS drop, so the other models stay loaded
+    assert registry.stats["lru_evictions"] == 1
+    assert list(registry.get_stats()["models"]) == ["b", "c", "d"]
+
+
+def test_budget_evicts_while_rss_drops(monkeypatch):
+    registry = ModelRegistry(budget_mb=250)
+
+    def rss():
+        return sum(e.size_bytes for e in registry._entries.values())
+
+    monkeypatch.setattr(model_cache, "_current_rss_bytes", rss)
+    for key in ("a", "b", "c"):
+        registry.get(key, lambda: _Model(100))
+    registry.get("big", lambda: _Model(200))
+
+    assert list(registry.get_stats()["models"]) == ["big"]
+
+
+class _CyclicModel(_Model):
+    """Freed only by the garbage collector, like a torch module graph"""
+    live = weakref.WeakSet()
+
+    def __init__(self, size_mb):
+        super().__init__(size_mb)
+        self.self_ref = self
+        _CyclicModel.live.add(self)
+
+
+def test_budget_eviction_frees_the_evicted_model(monkeypatch):
+    # RSS follows the models still alive, so it drops only once the evicted one is collected
+    monkeypatch.setattr(model_cache, "_current_rss_bytes", lambda: sum(m.size_bytes for m in _CyclicModel.live))
+    registry = ModelRegistry(budget_mb=0)
+    for key in ("a", "b", "c"):
+        registry.get(key, lambda: _CyclicModel(100))
+    registry.budget_bytes = 150 * 1024 * 1024
+    registry.get("d", lambda: _CyclicModel(100))
+
+    assert list(registry.get_stats()["models"]) == ["d"]
+    assert registry.stats["lru_evictions"] == 3
@@ -0,0 +1,71 @@
+"""ONNX exports against the torch models they replace (tiny random-weight BERTs built locally)"""
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+pytest.importorskip("sentence_transformers")
+
+from rag.onnx_backend import load_onnx_embedding_model, load_onnx_rerank_model
+
+TEXTS = ["מה זה מעגל התודעה?", "מעגל התודעה הוא מודל לשינוי", "איך שומרים על גבול?", "short text"]
+PAIRS = [[TEXTS[0], text] for text in TEXTS[1:]] + [["גבול", TEXTS[2]]]
+
+
+def _tiny_bert(directory, model_class):
+    """Save a 2-layer BERT with a character vocabulary covering TEXTS"""
+    from transformers import BertConfig, BertTokenizerFast
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted({ch for text in TEXTS for ch in text if not ch.isspace()})
+    directory.mkdir()
+    (directory / "vocab.txt").write_text("\n".join(vocab), encoding="utf-8")
+    tokenizer = BertTokenizerFast(str(directory / "vocab.txt"), tokenize_chinese_chars=False)
+    tokenizer.model_max_length = 64
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=64, num_labels=1,
+    )
+    model_class(config).save_pretrained(str(directory))
+    tokenizer.save_pretrained(str(directory))
+    return str(directory)
+
+
+@pytest.fixture
+def embedding_model(tmp_path):
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertModel
+
+    transformer = models.Transformer(_tiny_bert(tmp_path / "bert", BertModel), max_seq_length=64)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), pooling_mode="mean")
+    model = SentenceTransformer(modules=[transformer, pooling], device="cpu")
+    model.save(str(tmp_path / "embedding"))
+    return str(tmp_path / "embedding")
+
+
+@pytest.fixture
+def rerank_model(tmp_path):
+    from transformers import BertForSequenceClassification
+
+    return _tiny_bert(tmp_path / "rerank", BertForSequenceClassification)
+
+
+def test_onnx_embeddings_match_sentence_transformer(embedding_model, tmp_path):
+    from sentence_transformers import SentenceTransformer
+
+    expected = SentenceTransformer(embedding_model, device="cpu").encode(TEXTS, normalize_embeddings=True)
+    onnx_model = load_onnx_embedding_model(embedding_model, onnx_dir=str(tmp_path / "onnx"))
+
+    np.testing.assert_allclose(onnx_model.encode(TEXTS, batch_size=2, normalize_embeddings=True), expected, atol=1e-5)
+    np.testing.assert_allclose(onnx_model.encode(TEXTS[0], normalize_embeddings=True), expected[0], atol=1e-5)
+
+
+def test_onnx_rerank_scores_match_cross_encoder(rerank_model, tmp_path):
+    from sentence_transformers import CrossEncoder
+
+    expected = CrossEncoder(rerank_model, device="cpu").predict(PAIRS)
+    onnx_model = load_onnx_rerank_model(rerank_model, onnx_dir=str(tmp_path / "onnx"))
+
+    np.testing.assert_allclose(onnx_model.predict(PAIRS, batch_size=2), expected, atol=1e-5)
+    # int8 weights shift the scores; they stay on the same scale
+    quantized = load_onnx_rerank_model(rerank_model, quantize=True, onnx_dir=str(tmp_path / "onnx"))
+    np.testing.assert_allclose(quantized.predict(PAIRS), expected, atol=0.1)
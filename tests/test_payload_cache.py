@@ -0,0 +1,34 @@
+import threading
+
+from rag.payload_cache import ChunkPayloadCache
+
+
+def test_concurrent_refreshes_poll_the_version_once():
+    cache = ChunkPayloadCache(version_check_interval=60)
+    polls = []
+    barrier = threading.Barrier(8)
+
+    def fetch_version():
+        polls.append(1)
+        return (1,)
+
+    def refresh():
+        barrier.wait()
+        cache.refresh(fetch_version)
+
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(polls) == 1
+
+
+def test_zero_interval_sees_a_reingest_on_the_next_fetch():
+    cache = ChunkPayloadCache(version_check_interval=0)
+    cache.refresh(lambda: (1,))
+    cache.store({"chunk-1": {"text": "ישן"}})
+    cache.refresh(lambda: (2,))
+
+    assert cache.lookup(["chunk-1"], ("text",)) == ({}, ["chunk-1"])
+    assert cache.get_stats()["invalidations"] == 1
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from rag.pgvector import decode_vector, encode_vector, from_vector_literal, to_vector_literal
+
+
+@pytest.mark.parametrize("vector", [
+    np.random.default_rng(3).normal(size=384).astype(np.float32),
+    np.array([0.0, -0.0, 1e-38, 3.4028235e38, -1.17549435e-38, 0.1], dtype=np.float32),
+    np.zeros(0, dtype=np.float32),
+])
+def test_vector_literal_round_trip_is_exact(vector):
+    parsed = from_vector_literal(to_vector_literal(vector))
+    assert parsed.dtype == np.float32
+    np.testing.assert_array_equal(parsed, vector)
+    np.testing.assert_array_equal(decode_vector(encode_vector(vector)), vector)
+
+
+def test_parses_pgvector_text_output():
+    np.testing.assert_array_equal(from_vector_literal("[1,-2.5,3e-05]"), np.array([1, -2.5, 3e-05], dtype=np.float32))
+    assert from_vector_literal("[]").shape == (0,)
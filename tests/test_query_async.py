@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from conftest import RRF_K, FakeAsyncPool
+from rag.payload_cache import ChunkPayloadCache
+from rag.query_async import AsyncRagQueryEngine
+from rag.query_improved import RagQueryEngine
+
+SETTINGS = [
+    {},
+    {"hybrid": True},
+    {"two_phase_fetch": True},
+    {"adaptive_depth": True, "depth_floor": 5, "depth_ceiling": 30},
+    {"mmr_pool_size": 10},
+    {"two_phase_fetch": True, "mmr_pool_size": 10},
+]
+
+
+@pytest.mark.parametrize("settings", SETTINGS)
+def test_async_engine_retrieves_like_sync_engine(fake_backend, settings):
+    common = dict(top_k_retrieve=20, rrf_k=RRF_K, local_index_dir=None, semantic_cache_threshold=None, **settings)
+    sync_engine = RagQueryEngine(database_url="postgresql://fake", payload_cache=ChunkPayloadCache(), **common)
+    async_engine = AsyncRagQueryEngine(**common)
+    async_engine.pool = FakeAsyncPool()
+    question = "מה זה מעגל התודעה?"
+
+    expected = sync_engine.retrieve_candidates(question)
+    actual = asyncio.run(async_engine.retrieve_candidates(question))
+    async_engine.executor.shutdown(wait=False)
+
+    # Two-phase fetch defers metadata to the final top-N in the sync engine only
+    for chunks in (expected, actual):
+        for c in chunks:
+            c.pop("metadata", None)
+    assert actual == expected
+    assert actual
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from rag import rerank_pool
+from rag.rerank_pool import MIN_PAIRS_PER_SHARD, RerankProcessPool
+
+
+class ScoreByPassage:
+    def predict(self, pairs, show_progress_bar=False, batch_size=32):
+        return [float(passage.split()[0]) for _, passage in pairs]
+
+
+PAIRS = [["שאלה", f"{i} " + "מילה " * (i * 37 % 50)] for i in range(30)]
+
+
+@pytest.fixture
+def pool(monkeypatch, request):
+    """RerankProcessPool scoring on threads with a stub model (no worker processes, no torch)"""
+    monkeypatch.setattr(rerank_pool, "_worker_model", ScoreByPassage())
+    pool = RerankProcessPool("stub", processes=3, threads_per_process=1, sharding=request.param)
+    pool._executor.shutdown()
+    pool._executor = ThreadPoolExecutor(max_workers=3)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize("pool", ["balanced", "contiguous", "none"], indirect=True)
+def test_shards_partition_the_pairs(pool):
+    shards = pool.shard(PAIRS)
+    assert sorted(np.concatenate(shards).tolist()) == list(range(len(PAIRS)))
+    assert len(shards) == (1 if pool.sharding == "none" else 3)
+
+
+@pytest.mark.parametrize("pool", ["balanced", "contiguous", "none"], indirect=True)
+def test_sharded_scores_come_back_in_input_order(pool):
+    scores = pool.predict_pairs(PAIRS, max_batch_size=4)
+    np.testing.assert_array_equal(scores, np.arange(len(PAIRS), dtype=np.float32))
+    assert pool.predict([]).shape == (0,)
+
+
+@pytest.mark.parametrize("pool", ["balanced"], indirect=True)
+def test_balanced_shards_carry_similar_lengths(pool):
+    lengths = np.array([len(q) + len(t) for q, t in PAIRS])
+    loads = [lengths[shard].sum() for shard in pool.shard(PAIRS)]
+    assert max(loads) - min(loads) <= lengths.max()
+
+
+@pytest.mark.parametrize("pool", ["balanced"], indirect=True)
+def test_small_calls_are_not_split(pool):
+    assert len(pool.shard(PAIRS[:MIN_PAIRS_PER_SHARD + 1])) == 1
@@ -0,0 +1,83 @@
+import json
+import os
+
+import psycopg2
+import pytest
+
+from rag.retrieval_filter import NOT_GENERAL_SQL, RetrievalFilter
+from scripts.optimize_database_index import _normalize_predicate
+
+
+@pytest.mark.parametrize("value", [True, "true", "True", "TRUE"])
+def test_exclude_general_is_case_insensitive_in_python_and_sql(value):
+    retrieval_filter = RetrievalFilter(exclude_general=True)
+    assert not retrieval_filter.matches({"metadata": {"is_general": value}})
+    # The SQL side lower()s the text value the same way
+    sql, _ = retrieval_filter.sql()
+    assert "lower(metadata->>'is_general')" in sql
+    assert NOT_GENERAL_SQL in sql
+
+
+@pytest.mark.parametrize("metadata", [{}, {"is_general": False}, {"is_general": "false"}, {"is_general": None}])
+def test_exclude_general_keeps_other_chunks(metadata):
+    assert RetrievalFilter(exclude_general=True).matches({"metadata": metadata})
+
+
+def test_aliased_sql_prefixes_columns():
+    sql, _ = RetrievalFilter(exclude_general=True).sql(alias="c.")
+    assert "lower(c.metadata->>'is_general')" in sql
+
+
+# (metadata, is general) - what ingest and hand-edited rows put into metadata.is_general
+IS_GENERAL_FIXTURES = [
+    ({"is_general": True}, True),
+    ({"is_general": "true"}, True),
+    ({"is_general": "True"}, True),
+    ({"is_general": "TRUE"}, True),
+    ({"is_general": False}, False),
+    ({"is_general": "false"}, False),
+    ({"is_general": "False"}, False),
+    ({"is_general": None}, False),
+    ({}, False),
+]
+
+
+@pytest.fixture
+def postgres():
+    """Connection to RAG_TEST_DATABASE_URL (no tables are created); skipped when it is not set"""
+    database_url = os.getenv("RAG_TEST_DATABASE_URL")
+    if not database_url:
+        pytest.skip("RAG_TEST_DATABASE_URL not set")
+    conn = psycopg2.connect(database_url)
+    yield conn
+    conn.close()
+
+
+def test_not_general_sql_agrees_with_matches(postgres):
+    rows = [(i, json.dumps(metadata)) for i, (metadata, _) in enumerate(IS_GENERAL_FIXTURES)]
+    with postgres.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id FROM (VALUES {", ".join(["(%s, %s::jsonb)"] * len(rows))}) AS chunks (id, metadata)
+            WHERE {NOT_GENERAL_SQL}
+            ORDER BY id
+            """,
+            [value for row in rows for value in row],
+        )
+        kept_by_sql = [row[0] for row in cursor.fetchall()]
+
+    retrieval_filter = RetrievalFilter(exclude_general=True)
+    kept_by_python = [
+        i for i, (metadata, _) in enumerate(IS_GENERAL_FIXTURES) if retrieval_filter.matches({"metadata": metadata})
+    ]
+    assert kept_by_sql == kept_by_python
+    assert kept_by_python == [i for i, (_, is_general) in enumerate(IS_GENERAL_FIXTURES) if not is_general]
+
+
+def test_not_general_predicate_matches_its_indexdef_form():
+    # pg_indexes.indexdef of an index built WHERE NOT_GENERAL_SQL (PostgreSQL 16)
+    indexdef_predicate = "(lower((metadata ->> 'is_general'::text)) IS DISTINCT FROM 'true'::text)"
+    assert _normalize_predicate(indexdef_predicate) == _normalize_predicate(NOT_GENERAL_SQL)
+    # The pre-lower() predicate is a different index and must be rebuilt
+    old_predicate = "((metadata ->> 'is_general'::text) IS DISTINCT FROM 'true'::text)"
+    assert _normalize_predicate(old_predicate) != _normalize_predicate(NOT_GENERAL_SQL)